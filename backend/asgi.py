@@ -3,6 +3,18 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through ASGI switches the read endpoints to async views, so slow
+requests such as image uploads no longer hold up reads. Run it with uvicorn:
+
+    uvicorn backend.asgi:application --host 0.0.0.0 --port 8000 --workers 3
+
+or with gunicorn managing uvicorn workers:
+
+    gunicorn backend.asgi:application -k uvicorn_worker.UvicornWorker --workers 3
+
+Persistent database connections are off unless DB_CONN_MAX_AGE is set, as Django
+advises for ASGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +24,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+# Sync ORM work of async views runs in a new thread per request, and every thread would
+# keep a persistent connection of its own open, so connections close after each request
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
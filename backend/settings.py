@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import json
 from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
@@ -64,11 +65,18 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'semelVoter.middleware.StaticFilesMiddleware',
+    'semelVoter.middleware.SnapshotMiddleware',
+    'semelVoter.middleware.MetricsMiddleware',
+    'semelVoter.middleware.ServerTimingMiddleware',
+    'semelVoter.middleware.PeakMemoryMiddleware',
+    'semelVoter.middleware.CacheControlMiddleware',
+    'semelVoter.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'semelVoter.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -109,6 +117,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Serve the read endpoints with async views. Enabled by backend/asgi.py, which is
+# the entry point for uvicorn deployments.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -121,9 +133,51 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
         'PORT': os.getenv('DB_PORT', ''),
+        # Keep connections open between requests instead of reconnecting every time.
+        # Seconds to reuse a connection, 0 closes it after each request.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        # Check a reused connection before the first query of a request so a
+        # connection dropped by the server is replaced instead of failing the request
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True').lower() == 'true',
     }
 }
 
+# SQLite tuning for deployments running several gunicorn workers on one database file.
+# WAL lets reads run alongside the single writer, busy_timeout makes a writer wait for
+# the lock instead of failing with "database is locked", and BEGIN IMMEDIATE takes the
+# write lock when a transaction starts so it never fails upgrading a read lock.
+SQLITE_TUNING = os.getenv('SQLITE_TUNING', 'True').lower() == 'true'
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' and SQLITE_TUNING:
+    DATABASES['default']['OPTIONS'] = {
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join([
+            'PRAGMA journal_mode=WAL',
+            # Durable at checkpoints; a power loss can only drop the last commits, never corrupt
+            'PRAGMA synchronous=NORMAL',
+            f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}",
+            f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)))}",
+            # Negative values are KiB, so this is a 20 MB page cache per connection
+            f"PRAGMA cache_size={int(os.getenv('SQLITE_CACHE_SIZE', '-20000'))}",
+        ]),
+    }
+
+# Optional read replica. Setting DB_REPLICA_NAME or DB_REPLICA_HOST adds a 'replica'
+# alias with the primary's settings, overridden by the DB_REPLICA_* variables.
+# Reads are routed to it by semelVoter.routers.PrimaryReplicaRouter.
+if os.getenv('DB_REPLICA_NAME') or os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        # Tests read and write the same test database through both aliases
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['semelVoter.routers.PrimaryReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -165,6 +219,105 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = os.getenv('MEDIA_URL', '/media/')
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Cache-Control of the public read endpoints, per URL name. Browsers revalidate
+# (max_age), shared caches like a CDN keep responses for s_maxage seconds and may
+# serve them stale while refetching for stale_while_revalidate seconds more.
+# API_CACHE_POLICIES takes a JSON object of per-view overrides, {} for a view disables it.
+API_CACHE_POLICY = {
+    'max_age': int(os.getenv('API_CACHE_MAX_AGE', '0')),
+    's_maxage': int(os.getenv('API_CACHE_S_MAXAGE', '10')),
+    'stale_while_revalidate': int(os.getenv('API_CACHE_STALE_WHILE_REVALIDATE', '60')),
+}
+API_CACHE_POLICIES = {
+    name: API_CACHE_POLICY
+    for name in ('get_semla_list', 'search_semla', 'nearby_semla', 'semla_detail', 'semla_stats', 'comment_list')
+}
+API_CACHE_POLICIES.update(json.loads(os.getenv('API_CACHE_POLICIES', '{}')))
+
+# Uploaded images are stored under new UUIDs and never change
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Resized images served by /api/images/<id> and /api/semlor/<pk>/picture, cached on
+# local disk up to THUMBNAIL_CACHE_BYTES. Only these widths are served.
+THUMBNAIL_WIDTHS = [int(width) for width in os.getenv('THUMBNAIL_WIDTHS', '160,320,640,1280').split(',')]
+THUMBNAIL_CACHE_ROOT = Path(os.getenv('THUMBNAIL_CACHE_ROOT', BASE_DIR / 'thumbnails'))
+THUMBNAIL_CACHE_BYTES = int(os.getenv('THUMBNAIL_CACHE_BYTES', 512 * 1024 * 1024))
+# Folder of the files named in the legacy Semla.picture field
+LEGACY_PICTURE_ROOT = Path(os.getenv('LEGACY_PICTURE_ROOT', BASE_DIR / 'frontend' / 'public' / 'images'))
+LEGACY_PICTURE_CACHE_CONTROL = 'public, max-age=86400'
+
+# Server-Timing header and per-request timing log line, see semelVoter.timing
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True').lower() == 'true'
+
+# /api/metrics only answers scrapers sending "Authorization: Bearer <METRICS_TOKEN>" or
+# connecting from METRICS_ALLOWED_IPS, comma separated addresses or networks. Behind a
+# proxy in IPWARE_TRUSTED_PROXY_LIST the address it appended to X-Forwarded-For is used.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [
+    network.strip() for network in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if network.strip()
+]
+
+# Statements slower than this are logged and aggregated per fingerprint, see
+# semelVoter.slow_queries and /api/slow-queries. Empty turns it off.
+SLOW_QUERY_THRESHOLD_MS = os.getenv('SLOW_QUERY_THRESHOLD_MS', '100')
+SLOW_QUERY_THRESHOLD_MS = float(SLOW_QUERY_THRESHOLD_MS) if SLOW_QUERY_THRESHOLD_MS else None
+
+# Staff can profile a single request with ?profile or an X-Profile header,
+# the newest PROFILE_KEEP profiles are kept in PROFILE_ROOT
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True').lower() == 'true'
+PROFILE_ROOT = Path(os.getenv('PROFILE_ROOT', BASE_DIR / 'profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '20'))
+
+# View classes whose requests are traced with tracemalloc for their peak memory,
+# comma separated, e.g. SelmaViewList,SemlaCommentView
+MEMORY_TRACED_VIEWS = [view for view in os.getenv('MEMORY_TRACED_VIEWS', '').split(',') if view]
+# Peak bytes one GET /api/semlor of 10,000 semlor may allocate when rendering the list
+# and when serving it from the snapshot, checked by the test suite
+LIST_RENDER_MEMORY_BUDGET = int(os.getenv('LIST_RENDER_MEMORY_BUDGET', 32 * 2 ** 20))
+LIST_SNAPSHOT_MEMORY_BUDGET = int(os.getenv('LIST_SNAPSHOT_MEMORY_BUDGET', 12 * 2 ** 20))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'semelVoter.timing': {
+            'handlers': ['console'],
+            'level': os.getenv('TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'semelVoter.memory': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'semelVoter.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'semelVoter.timing.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Pre-rendered catalogue snapshot, regenerated when semlor change and served by WhiteNoise
+SNAPSHOT_ENABLED = os.getenv('SNAPSHOT_ENABLED', 'True').lower() == 'true'
+SNAPSHOT_ROOT = Path(os.getenv('SNAPSHOT_ROOT', BASE_DIR / 'snapshots'))
+SNAPSHOT_URL = '/snapshots/'
+# Seconds to gather changes before a background thread rewrites the snapshot,
+# 0 rewrites it when the changing transaction commits
+SNAPSHOT_DELAY = float(os.getenv('SNAPSHOT_DELAY', '1'))
+# Cache lifetime of the unversioned semlor.json; versioned files are cached forever
+SNAPSHOT_MAX_AGE = int(os.getenv('SNAPSHOT_MAX_AGE', '10'))
+
 # S3-compatible storage settings
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
@@ -175,12 +328,29 @@ AWS_S3_CUSTOM_DOMAIN = os.getenv('AWS_S3_CUSTOM_DOMAIN')
 AWS_S3_FILE_OVERWRITE = False
 AWS_DEFAULT_ACL = None
 AWS_QUERYSTRING_AUTH = False
+# Client and transfer settings applied by semelVoter.storage.S3Storage. The pool should
+# hold one connection per gunicorn thread times AWS_S3_MAX_CONCURRENCY.
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_S3_MAX_POOL_CONNECTIONS', '10'))
+AWS_S3_CONNECT_TIMEOUT = float(os.getenv('AWS_S3_CONNECT_TIMEOUT', '5'))
+AWS_S3_READ_TIMEOUT = float(os.getenv('AWS_S3_READ_TIMEOUT', '20'))
+# Attempts per request, including the first
+AWS_S3_MAX_ATTEMPTS = int(os.getenv('AWS_S3_MAX_ATTEMPTS', '3'))
+AWS_S3_RETRY_MODE = os.getenv('AWS_S3_RETRY_MODE', 'standard')
+# Images below the threshold are uploaded with a single PUT. Parts of larger ones are sent
+# by AWS_S3_MAX_CONCURRENCY threads; 1 uploads without extra threads, which is fastest for
+# images (see benchmarks/bench_storage.py)
+AWS_S3_MULTIPART_THRESHOLD = int(os.getenv('AWS_S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+AWS_S3_MULTIPART_CHUNKSIZE = int(os.getenv('AWS_S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+AWS_S3_MAX_CONCURRENCY = int(os.getenv('AWS_S3_MAX_CONCURRENCY', '1'))
+# Set either to a botocore Config / boto3 TransferConfig to replace the settings above
+AWS_S3_CLIENT_CONFIG = None
+AWS_S3_TRANSFER_CONFIG = None
 
 # Configure storage backends (Django 4.2+)
 if AWS_STORAGE_BUCKET_NAME:
     STORAGES = {
         "default": {
-            "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+            "BACKEND": "semelVoter.storage.S3Storage",
         },
         "staticfiles": {
             "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
@@ -190,11 +360,25 @@ if AWS_STORAGE_BUCKET_NAME:
         MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/"
 else:
     STORAGES = {
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
         "staticfiles": {
             "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
         },
     }
 
+# Direct image uploads, see semelVoter/uploads.py: largest accepted image, lifetime of an
+# upload target and how long an upload can be confirmed after it was issued (seconds)
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+UPLOAD_URL_EXPIRES = int(os.getenv('UPLOAD_URL_EXPIRES', '300'))
+UPLOAD_CONFIRM_WINDOW = int(os.getenv('UPLOAD_CONFIRM_WINDOW', '3600'))
+# Upload targets issued per IP and user agent and day
+UPLOAD_DAILY_LIMIT = int(os.getenv('UPLOAD_DAILY_LIMIT', '10'))
+# Stored images without a SemlaImage are deleted by reconcile_storage once they are
+# older than this (seconds). Must be longer than UPLOAD_CONFIRM_WINDOW.
+ORPHAN_GRACE_PERIOD = int(os.getenv('ORPHAN_GRACE_PERIOD', 24 * 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -16,8 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from semelVoter.admin import profile_detail_view, profile_list_view
 
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(profile_list_view), name='admin_profiles'),
+    path('admin/profiles/<str:name>', admin.site.admin_view(profile_detail_view), name='admin_profile_detail'),
     path('admin/', admin.site.urls),
     path('api/', include('semelVoter.urls')),
 ]
@@ -0,0 +1,112 @@
+"""
+Performance benchmarks for the SemelRater API.
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_serializers``.
+Benchmarks run against a throwaway test database and never touch data/db.sqlite3.
+"""
+import os
+import statistics
+import time
+
+
+def setup_django(on_disk=False):
+    """
+    Configure Django and create an empty test database for the benchmark run.
+    SQLite test databases live in memory unless on_disk is set.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    from django.db import connection
+    if on_disk and connection.vendor == 'sqlite':
+        import tempfile
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def setup_server_database(path):
+    """
+    Configure Django on a fresh SQLite file at path and migrate it.
+    Used by benchmarks that start servers, which are pointed at the same file.
+    """
+    os.environ.update(DB_ENGINE='django.db.backends.sqlite3', DB_NAME=str(path))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+    # Allows the test client to be used on the same database, e.g. to count queries
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+
+
+def seed_semlor(count, images_per_semla=1, start=0):
+    """Insert count semlor with images using bulk_create. Returns the semlor."""
+    from decimal import Decimal
+    from semelVoter.models import Semla
+
+    semlor = []
+    for i in range(start, start + count):
+        semla = Semla(
+            bakery=f'Bageri {i}', city=f'Stad {i % 50}', kind='Classic',
+            price=Decimal('45.00') + i % 20, rating=Decimal(i % 500) / 100,
+            latitude=55 + (i % 1000) / 100, longitude=12 + (i % 700) / 100,
+        )
+        semla.refresh_derived_fields()
+        semlor.append(semla)
+    semlor = Semla.objects.bulk_create(semlor, batch_size=500)
+    seed_images(semlor, count * images_per_semla)
+    return semlor
+
+
+def seed_images(semlor, count):
+    """Insert count images spread round-robin over semlor."""
+    import uuid
+    from semelVoter.models import SemlaImage
+
+    images = []
+    for i in range(count):
+        image_id = uuid.uuid4()
+        images.append(SemlaImage(
+            id=image_id, semla=semlor[i % len(semlor)],
+            image_url=f'https://bucket.example.com/semlor/{image_id}.jpg',
+        ))
+    SemlaImage.objects.bulk_create(images, batch_size=500)
+
+
+def seed_ratings(semlor, count):
+    """Insert count category ratings spread round-robin over semlor, then rebuild the rollups."""
+    from semelVoter.models import Ratings, SemlaDailyRating
+
+    ratings = []
+    for i in range(count):
+        value = i % 5 + 1
+        ratings.append(Ratings(
+            semla=semlor[i % len(semlor)], rating=value,
+            comment=f'Kommentar {i}' if i % 3 else None, name=f'Namn {i % 40}',
+            gradde=value, mandelmassa=(i + 1) % 5 + 1, lock=(i + 2) % 5 + 1, helhet=value, bulle=value,
+        ))
+    Ratings.objects.bulk_create(ratings, batch_size=500)
+    SemlaDailyRating.rebuild()
+
+
+def seed_catalogue(semlor, ratings=0, images=0):
+    """Seed semlor with ratings and images in total, spread over them. Returns the semlor."""
+    created = seed_semlor(semlor, images_per_semla=0)
+    if images:
+        seed_images(created, images)
+    if ratings:
+        seed_ratings(created, ratings)
+    return created
+
+
+def measure(func, repeat=5):
+    """Run func repeat times and return the median wall time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
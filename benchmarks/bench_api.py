@@ -0,0 +1,183 @@
+"""
+Load test of the API endpoints with throughput, latency percentiles and query counts.
+
+Seeds --semlor semlor with --ratings ratings and --images images in total, then
+loads each endpoint in turn with --concurrency parallel clients for --duration
+seconds. Requests go through the Django test client in this process
+(--mode client) or to gunicorn started with a gunicorn.conf.py profile
+(--mode server). Query counts are taken from one request per endpoint
+through the test client in either mode.
+
+    python -m benchmarks.bench_api [--mode client|server] [--concurrency 8]
+                                   [--endpoints list comments rate create]
+                                   [--output results.json]
+    python -m benchmarks.bench_api --compare before.json after.json
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import tempfile
+import uuid
+
+from benchmarks import seed_catalogue, setup_django, setup_server_database
+from benchmarks.load import gunicorn_server, multipart, run_load, run_scenarios, server_env
+
+CATEGORY_FIELDS = ('gradde', 'mandelmassa', 'lock', 'helhet', 'bulle')
+
+
+def endpoints(semla_ids):
+    """Request builders per endpoint, see run_scenarios(). Writes vary the user agent to stay under rate limits."""
+    def semla_id(worker, count):
+        return semla_ids[(worker * 7919 + count) % len(semla_ids)]
+
+    def list_semlor(worker, count):
+        return 'GET', '/api/semlor', None, {}
+
+    def comments(worker, count):
+        return 'GET', f'/api/comments/{semla_id(worker, count)}', None, {}
+
+    def rate(worker, count):
+        fields = {field: (worker + count) % 5 + 1 for field in CATEGORY_FIELDS}
+        fields['comment'] = f'Benchmark {worker}-{count}'
+        body, content_type = multipart(fields, [])
+        headers = {'Content-Type': content_type, 'User-Agent': f'bench-rate-{worker}-{count}-{uuid.uuid4()}'}
+        return 'POST', f'/api/rate/{semla_id(worker, count)}', body, headers
+
+    def create(worker, count):
+        body = json.dumps({
+            'bakery': f'Bench {uuid.uuid4()}', 'city': 'Benchstad', 'price': '49.00', 'kind': 'Classic',
+        }).encode()
+        headers = {'Content-Type': 'application/json', 'User-Agent': f'bench-create-{worker}-{count}-{uuid.uuid4()}'}
+        return 'POST', '/api/semlor/create', body, headers
+
+    return {'list': list_semlor, 'comments': comments, 'rate': rate, 'create': create}
+
+
+def client_sender():
+    """make_sender for run_scenarios() sending requests through the Django test client."""
+    from django.db import close_old_connections
+    from django.test import Client
+
+    def make_sender():
+        client = Client()
+
+        def send(method, path, body, headers):
+            headers = dict(headers)
+            content_type = headers.pop('Content-Type', 'application/octet-stream')
+            response = client.generic(method, path, data=body or b'', content_type=content_type, headers=headers)
+            close_old_connections()
+            return response.status_code
+        return send
+    return make_sender
+
+
+def count_queries(request):
+    """Number of queries one request to the endpoint makes after the load, through the test client."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    send = client_sender()()
+    with CaptureQueriesContext(connection) as queries:
+        send(*request(0, 10 ** 6))
+    return len(queries)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'endpoint':<9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for name, summary in results['endpoints'].items():
+        print(f"{name:<9} {summary['rps']:>8} {summary['p50_ms']:>8} {summary['p95_ms']:>8} "
+              f"{summary['p99_ms']:>8} {summary['queries']:>8} {summary['errors']:>7}")
+
+
+def compare(before_path, after_path):
+    """Print the change per endpoint between two result files."""
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    print(f"{before.get('revision')} -> {after.get('revision')}")
+    print(f"{'endpoint':<9} {'metric':<8} {'before':>10} {'after':>10} {'change':>8}")
+    for name, summary in after['endpoints'].items():
+        old = before['endpoints'].get(name)
+        if old is None:
+            continue
+        for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries'):
+            if old[metric] is None or summary[metric] is None:
+                continue
+            change = f"{(summary[metric] - old[metric]) / old[metric] * 100:+.1f}%" if old[metric] else ''
+            print(f"{name:<9} {metric:<8} {old[metric]:>10} {summary[metric]:>10} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['client', 'server'], default='client')
+    parser.add_argument('--profile', default='gthread', help='gunicorn.conf.py profile for --mode server')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn workers for --mode server')
+    parser.add_argument('--endpoints', nargs='+', default=['list', 'comments', 'rate', 'create'])
+    parser.add_argument('--semlor', type=int, default=500)
+    parser.add_argument('--ratings', type=int, default=2000)
+    parser.add_argument('--images', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--no-snapshots', action='store_true', help='Serve the list without the snapshot cache')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='semla-bench-')
+    os.environ['SNAPSHOT_ROOT'] = os.path.join(workdir, 'snapshots')
+    os.environ['SNAPSHOT_ENABLED'] = str(not args.no_snapshots)
+    if args.mode == 'server':
+        setup_server_database(os.path.join(workdir, 'db.sqlite3'))
+    else:
+        setup_django(on_disk=True)
+    semlor = seed_catalogue(args.semlor, ratings=args.ratings, images=args.images)
+    if not args.no_snapshots:
+        from semelVoter.snapshot import write_snapshot
+        write_snapshot()
+    requests = endpoints([semla.pk for semla in semlor])
+
+    if args.mode == 'server':
+        env = {**server_env(workdir, 0), 'SNAPSHOT_ENABLED': str(not args.no_snapshots)}
+        with gunicorn_server(args.profile, args.workers, env) as server:
+            load = {
+                name: run_load('127.0.0.1', server.port, {name: (args.concurrency, requests[name])}, args.duration)
+                for name in args.endpoints
+            }
+    else:
+        load = {
+            name: run_scenarios(client_sender(), {name: (args.concurrency, requests[name])}, args.duration)
+            for name in args.endpoints
+        }
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'endpoints': {
+            name: {**load[name][name], 'queries': count_queries(requests[name])}
+            for name in args.endpoints
+        },
+    }
+    print(f"{args.mode} mode, {args.semlor} semlor, {args.ratings} ratings, {args.images} images, "
+          f"concurrency {args.concurrency}, {args.duration}s per endpoint")
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Sync vs async serving of the read endpoints under mixed read and upload traffic.
+
+Starts the API twice on a seeded SQLite file with the sync and async profiles
+of gunicorn.conf.py: sync workers on backend.wsgi and uvicorn workers on
+backend.asgi with the async read views. Readers fetch the semla and comment
+lists while uploaders post ratings with an image to a storage that takes
+--upload-delay seconds per save.
+
+    python -m benchmarks.bench_async [--workers 3] [--readers 16] [--uploaders 4]
+                                     [--duration 10] [--upload-delay 0.5]
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks import seed_semlor, setup_server_database
+from benchmarks.load import gunicorn_server, mixed_traffic, print_results, run_load, server_env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--semlor', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--uploaders', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--upload-delay', type=float, default=0.5)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='semla-bench-')
+    setup_server_database(os.path.join(workdir, 'db.sqlite3'))
+    pk = seed_semlor(args.semlor)[0].pk
+    env = server_env(workdir, args.upload_delay)
+
+    results = {}
+    for profile in ('sync', 'async'):
+        with gunicorn_server(profile, args.workers, env) as server:
+            results[profile] = run_load(
+                '127.0.0.1', server.port, mixed_traffic(pk, args.readers, args.uploaders), args.duration
+            )
+
+    print(f"{args.workers} workers, {args.readers} readers, {args.uploaders} uploaders, "
+          f"{args.upload_delay}s per upload, {args.duration}s per server")
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
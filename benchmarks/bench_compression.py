@@ -0,0 +1,66 @@
+"""
+Bytes on the wire and CPU per request for GET /api/semlor in each encoding.
+
+Compares rendering every request (uncompressed, or gzipped per request the way
+GZipMiddleware would) with the cached entry holding precompressed variants.
+
+    python -m benchmarks.bench_compression [--semlor 2000] [--requests 50]
+"""
+import argparse
+import gzip
+import tempfile
+import time
+
+from benchmarks import seed_semlor, setup_django
+
+
+def cpu_per_request(func, requests):
+    """Run func requests times and return (CPU seconds per call, last result)."""
+    start = time.process_time()
+    for _ in range(requests):
+        result = func()
+    return (time.process_time() - start) / requests, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--semlor', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    from semelVoter.compression import GZIP_LEVEL
+    from semelVoter.snapshot import write_snapshot
+
+    settings.SNAPSHOT_ROOT = tempfile.mkdtemp(prefix='semla-snapshots-')
+    seed_semlor(args.semlor)
+    write_snapshot()
+    client = Client()
+
+    def get(encoding):
+        return lambda: client.get('/api/semlor', HTTP_ACCEPT_ENCODING=encoding)
+
+    def gzip_per_request():
+        response = client.get('/api/semlor')
+        return gzip.compress(response.content, compresslevel=GZIP_LEVEL)
+
+    # (name, serve from the cache, request)
+    cases = [
+        ('render, identity', False, get('')),
+        ('render + gzip each request', False, gzip_per_request),
+    ]
+    cases += [(f'cached, {encoding}', True, get(encoding)) for encoding in ('identity', 'gzip', 'br')]
+
+    print(f"{args.semlor} semlor, {args.requests} requests per case")
+    print(f"{'case':<28} {'bytes':>10} {'cpu ms/req':>11}")
+    for name, cached, func in cases:
+        settings.SNAPSHOT_ENABLED = cached
+        func()  # warm up, which fills the cache entry and its variant
+        cpu, result = cpu_per_request(func, args.requests)
+        size = len(result) if isinstance(result, bytes) else len(result.content)
+        print(f"{name:<28} {size:>10} {cpu * 1000:>11.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Per-request latency of GET /api/semlor with and without persistent DB connections.
+
+Requests go through Django's WSGI handler, so connections are closed or kept
+at the end of each request exactly as under gunicorn. SQLite uses an on-disk
+file; point the DB_* variables at MariaDB to measure a networked database.
+
+    python -m benchmarks.bench_connections [--semlor 50] [--requests 500]
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import seed_semlor, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--semlor', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django(on_disk=True)
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    from django.test import RequestFactory
+
+    # Measure the database round trips, not the response cache
+    settings.SNAPSHOT_ENABLED = False
+    seed_semlor(args.semlor)
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    connects = []
+    connection_created.connect(lambda **kwargs: connects.append(1))
+
+    def request():
+        response = handler(factory.get('/api/semlor').environ, lambda status, headers: None)
+        response.close()  # sends request_finished, which closes or keeps the connection
+
+    print(f"{connection.vendor}, {args.semlor} semlor, {args.requests} requests per case")
+    print(f"{'CONN_MAX_AGE':>12} {'health checks':>14} {'connects':>9} {'p50 ms':>8} {'mean ms':>8}")
+    for max_age, health_checks in ((0, False), (60, False), (60, True)):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+        request()
+        connects.clear()
+        timings = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            request()
+            timings.append(time.perf_counter() - start)
+        print(f"{max_age:>12} {str(health_checks):>14} {len(connects):>9} "
+              f"{statistics.median(timings) * 1000:>8.2f} {statistics.mean(timings) * 1000:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Requests/sec and latency percentiles for each gunicorn.conf.py profile.
+
+Every profile is started with ``gunicorn -c gunicorn.conf.py`` on a seeded SQLite
+file and loaded with mixed read and upload traffic, like bench_async. Profiles
+whose worker class is not installed (gevent, uvicorn_worker) are skipped.
+
+    python -m benchmarks.bench_gunicorn [--profiles sync gthread gevent async]
+                                        [--workers 3] [--duration 10] [--json results.json]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import tempfile
+
+from benchmarks import seed_semlor, setup_server_database
+from benchmarks.load import gunicorn_server, mixed_traffic, print_results, run_load, server_env
+
+# Modules a profile's worker class needs
+REQUIRES = {'gevent': 'gevent', 'async': 'uvicorn_worker'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=['sync', 'gthread', 'gevent', 'async'])
+    parser.add_argument('--semlor', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--uploaders', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--upload-delay', type=float, default=0.5)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='semla-bench-')
+    setup_server_database(os.path.join(workdir, 'db.sqlite3'))
+    pk = seed_semlor(args.semlor)[0].pk
+
+    results = {}
+    for profile in args.profiles:
+        module = REQUIRES.get(profile)
+        if module and importlib.util.find_spec(module) is None:
+            print(f"Skipping {profile}: {module} is not installed")
+            continue
+        env = server_env(workdir, args.upload_delay)
+        if profile == 'gevent':
+            env['DB_CONN_MAX_AGE'] = '0'
+        with gunicorn_server(profile, args.workers, env) as server:
+            results[profile] = run_load(
+                '127.0.0.1', server.port, mixed_traffic(pk, args.readers, args.uploaders), args.duration
+            )
+
+    print(f"{args.workers} workers, {args.readers} readers, {args.uploaders} uploaders, "
+          f"{args.upload_delay}s per upload, {args.duration}s per profile")
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
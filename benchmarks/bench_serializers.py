@@ -0,0 +1,34 @@
+"""
+Per-row cost of the semla list payload: DRF SemlaSerializer vs the hand-written read path.
+
+    python -m benchmarks.bench_serializers [--sizes 1000 10000] [--repeat 5]
+"""
+import argparse
+
+from benchmarks import measure, seed_semlor, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from semelVoter.models import Semla
+    from semelVoter.serializers import SemlaSerializer, semla_list_payload
+
+    seeded = 0
+    print(f"{'semlor':>8} {'drf us/row':>11} {'fast us/row':>12} {'speedup':>8}")
+    for size in sorted(args.sizes):
+        seed_semlor(size - seeded, start=seeded)
+        seeded = size
+        semlor = Semla.objects.all()
+        # Both variants include loading the rows, like the list view does
+        drf = measure(lambda: SemlaSerializer(semlor.prefetch_related('images'), many=True).data, args.repeat)
+        fast = measure(lambda: semla_list_payload(semlor), args.repeat)
+        print(f"{size:>8} {drf / size * 1e6:>11.1f} {fast / size * 1e6:>12.1f} {drf / fast:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
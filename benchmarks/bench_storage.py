@@ -0,0 +1,98 @@
+"""
+Upload throughput of the S3 storage for different image sizes and client settings.
+
+Uploads go to a local moto S3 server (``pip install 'moto[server]'``, not in
+requirements.txt) from --threads threads at once, as from one gthread worker.
+Compares a new storage and connection per upload, the stock S3Boto3Storage with a
+connection per thread and semelVoter.storage.S3Storage with its process-wide
+connection, with and without multipart uploads.
+
+    python -m benchmarks.bench_storage [--sizes 100 1000 8000] [--uploads 16] [--threads 4]
+"""
+import argparse
+import os
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.load import Server, free_port, percentile, python_command
+
+BUCKET = 'semlor-bench'
+
+
+def run_uploads(make_storage, payload, uploads, threads):
+    """Upload payload uploads times from threads threads. Returns (seconds, latencies)."""
+    from django.core.files.base import ContentFile
+
+    def upload(_):
+        storage = make_storage()
+        start = time.perf_counter()
+        storage.save(f'semlor/{uuid.uuid4()}.jpg', ContentFile(payload))
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = list(pool.map(upload, range(uploads)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 8000], help='image sizes in KB')
+    parser.add_argument('--uploads', type=int, default=16)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    port = free_port()
+    endpoint = f'http://127.0.0.1:{port}'
+    os.environ.update(
+        AWS_ACCESS_KEY_ID='bench', AWS_SECRET_ACCESS_KEY='bench', AWS_STORAGE_BUCKET_NAME=BUCKET,
+        AWS_S3_ENDPOINT_URL=endpoint, AWS_S3_REGION_NAME='us-east-1',
+        DJANGO_SETTINGS_MODULE='backend.settings',
+    )
+    import django
+    django.setup()
+    import boto3
+    from django.conf import settings
+    from storages.backends.s3boto3 import S3Boto3Storage
+    from semelVoter.storage import S3Storage
+
+    def pooled(threshold, concurrency):
+        def configure():
+            settings.AWS_S3_MULTIPART_THRESHOLD = threshold
+            settings.AWS_S3_MULTIPART_CHUNKSIZE = 5 * 1024 * 1024
+            settings.AWS_S3_MAX_CONCURRENCY = concurrency
+            settings.AWS_S3_MAX_POOL_CONNECTIONS = args.threads * concurrency
+            storage = S3Storage()
+            return lambda: storage
+        return configure
+
+    def stock():
+        storage = S3Boto3Storage()
+        return lambda: storage
+
+    cases = [
+        ('new storage per upload', lambda: S3Boto3Storage),
+        ('S3Boto3Storage', stock),
+        ('S3Storage, single PUT', pooled(threshold=1024 ** 3, concurrency=1)),
+        ('S3Storage, 5MB parts x4', pooled(threshold=5 * 1024 * 1024, concurrency=4)),
+    ]
+
+    with Server(python_command('moto.server', '-p', str(port)), port, {}):
+        boto3.client('s3', endpoint_url=endpoint, region_name='us-east-1').create_bucket(Bucket=BUCKET)
+        print(f"moto S3, {args.uploads} uploads per case from {args.threads} threads")
+        print(f"{'size':>8}  {'storage':<26} {'uploads/s':>9} {'MB/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for size_kb in args.sizes:
+            payload = os.urandom(size_kb * 1024)
+            for name, configure in cases:
+                make_storage = configure()
+                run_uploads(make_storage, payload, args.threads, args.threads)  # warm up
+                elapsed, latencies = run_uploads(make_storage, payload, args.uploads, args.threads)
+                print(f"{size_kb:>6}KB  {name:<26} {args.uploads / elapsed:>9.1f} "
+                      f"{args.uploads * size_kb / 1024 / elapsed:>8.1f} "
+                      f"{statistics.median(latencies) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+A small threaded HTTP load generator and server helpers for the benchmarks.
+"""
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+
+def percentile(values, percent):
+    """Get the nearest-rank percentile of values, or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, duration):
+    """Summarize request latencies in seconds as requests/sec and millisecond percentiles."""
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / duration, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        **{
+            f'p{p}_ms': round(percentile(latencies, p) * 1000, 2) if latencies else None
+            for p in (50, 95, 99)
+        },
+    }
+
+
+def multipart(fields, files):
+    """Encode form fields and (name, filename, content_type, data) files as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, content_type, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def run_scenarios(make_sender, scenarios, duration):
+    """
+    Run scenarios concurrently for duration seconds, one thread per concurrent worker.
+
+    Args:
+        make_sender: Called once per thread, returns send(method, path, body, headers)
+            which performs a request and returns its status code
+        scenarios: Dict of name -> (concurrency, request), where request(worker, count)
+            returns (method, path, body, headers) for the count-th request of a worker
+        duration: Seconds to run
+
+    Returns:
+        Dict of name -> summary as returned by summarize(), plus the error count
+    """
+    deadline = time.monotonic() + duration
+    latencies = {name: [] for name in scenarios}
+    errors = {name: 0 for name in scenarios}
+    lock = threading.Lock()
+
+    def worker(name, worker_index, request):
+        send = make_sender()
+        count = 0
+        while time.monotonic() < deadline:
+            method, path, body, headers = request(worker_index, count)
+            count += 1
+            start = time.perf_counter()
+            try:
+                ok = send(method, path, body, headers) < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies[name].append(elapsed)
+                else:
+                    errors[name] += 1
+
+    threads = [
+        threading.Thread(target=worker, args=(name, index, request))
+        for name, (concurrency, request) in scenarios.items()
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {name: {**summarize(latencies[name], duration), 'errors': errors[name]} for name in scenarios}
+
+
+def http_sender(host, port):
+    """make_sender for run_scenarios() sending requests over one kept-alive HTTP connection."""
+    def make_sender():
+        state = {'connection': http.client.HTTPConnection(host, port, timeout=60)}
+
+        def send(method, path, body, headers):
+            try:
+                state['connection'].request(method, path, body=body, headers=headers)
+                response = state['connection'].getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                state['connection'].close()
+                state['connection'] = http.client.HTTPConnection(host, port, timeout=60)
+                raise
+        return send
+    return make_sender
+
+
+def run_load(host, port, scenarios, duration):
+    """Run scenarios against a server, see run_scenarios()."""
+    return run_scenarios(http_sender(host, port), scenarios, duration)
+
+
+def mixed_traffic(semla_id, readers, uploaders):
+    """
+    Scenarios for run_load(): readers alternate between the semla and comment lists,
+    uploaders rate semla_id with an image.
+    """
+    fields = {field: 4 for field in ('gradde', 'mandelmassa', 'lock', 'helhet', 'bulle')}
+    body, content_type = multipart(fields, [('image', 'semla.jpg', 'image/jpeg', b'\xff\xd8' + b'0' * 20000)])
+
+    def read(worker, count):
+        path = '/api/semlor' if count % 2 else f'/api/comments/{semla_id}'
+        return 'GET', path, None, {}
+
+    def upload(worker, count):
+        # Each request gets its own user agent so the daily rating limit is not hit
+        headers = {'Content-Type': content_type, 'User-Agent': f'bench-{worker}-{count}'}
+        return 'POST', f'/api/rate/{semla_id}', body, headers
+
+    return {'read': (readers, read), 'upload': (uploaders, upload)}
+
+
+def server_env(workdir, upload_delay):
+    """Environment for benchmark servers using benchmarks.settings and the database in workdir."""
+    return {
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+        'DEBUG': 'False',
+        # Reads should reach the database, not the precompressed response cache
+        'SNAPSHOT_ENABLED': 'False',
+        'BENCH_MEDIA_ROOT': os.path.join(workdir, 'media'),
+        'BENCH_UPLOAD_DELAY': str(upload_delay),
+    }
+
+
+def print_results(results):
+    """Print run_load() results per server and traffic type."""
+    print(f"{'server':<8} {'traffic':<7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, scenarios in results.items():
+        for traffic, summary in scenarios.items():
+            print(f"{name:<8} {traffic:<7} {summary['rps']:>7} {summary['p50_ms']:>8} "
+                  f"{summary['p95_ms']:>8} {summary['p99_ms']:>8} {summary['errors']:>7}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """Run a server command from the repository root until the context exits."""
+
+    def __init__(self, command, port, env):
+        self.command = command
+        self.port = port
+        self.env = {**os.environ, **env}
+
+    def __enter__(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen(
+            self.command, cwd=root, env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited: {self.process.stderr.read().decode()}")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                connection.request('GET', '/api/semlor/0/stats')
+                connection.getresponse().read()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f"Server did not start: {' '.join(self.command)}")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def python_command(*args):
+    return [sys.executable, '-m', *args]
+
+
+def gunicorn_server(profile, workers, env):
+    """Server running gunicorn.conf.py with the given GUNICORN_PROFILE on a free port."""
+    port = free_port()
+    env = {
+        **env,
+        'GUNICORN_PROFILE': profile,
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_ACCESSLOG': '',
+    }
+    return Server(python_command('gunicorn', '-c', 'gunicorn.conf.py'), port, env)
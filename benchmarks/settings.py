@@ -0,0 +1,18 @@
+"""
+Settings for benchmark servers: the project settings with a slow upload storage.
+"""
+import os
+
+from backend.settings import *  # noqa: F401,F403
+from backend.settings import STORAGES
+
+STORAGES = {
+    **STORAGES,
+    'default': {
+        'BACKEND': 'benchmarks.storage.SlowFileSystemStorage',
+        'OPTIONS': {
+            'location': os.getenv('BENCH_MEDIA_ROOT', '/tmp/semla-bench-media'),
+            'delay': float(os.getenv('BENCH_UPLOAD_DELAY', '0.5')),
+        },
+    },
+}
@@ -0,0 +1,15 @@
+import time
+
+from django.core.files.storage import FileSystemStorage
+
+
+class SlowFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage that waits on every save, standing in for a remote object store."""
+
+    def __init__(self, delay=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+
+    def _save(self, name, content):
+        time.sleep(self.delay)
+        return super()._save(name, content)
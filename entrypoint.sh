@@ -11,6 +11,9 @@ echo "Database is ready!"
 # Run migrations
 python manage.py migrate --noinput
 
+# Pre-render the catalogue snapshot so it is served from the first request
+python manage.py generate_snapshot
+
 # Create superuser if env vars are set
 if [ -n "$DJANGO_SUPERUSER_USERNAME" ] && [ -n "$DJANGO_SUPERUSER_PASSWORD" ]; then
     python manage.py shell -c "
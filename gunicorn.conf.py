@@ -0,0 +1,88 @@
+"""
+Gunicorn configuration, used as ``gunicorn -c gunicorn.conf.py``.
+
+GUNICORN_PROFILE picks the worker model:
+
+    sync     One request at a time per process. A slow storage upload blocks the worker.
+    gthread  GUNICORN_THREADS threads per process (the default). Uploads and database
+             waits overlap with other requests in the same process.
+    gevent   Green threads, requires ``pip install gevent``. Only helps with pure Python
+             I/O like boto3 uploads; mysqlclient still blocks the whole worker. Every
+             greenlet keeps its own database connection, consider DB_CONN_MAX_AGE=0.
+    async    Uvicorn workers serving backend.asgi with the async read views. backend.asgi
+             defaults DB_CONN_MAX_AGE to 0, as every request's sync work runs in a new
+             thread that would keep its own database connection.
+
+Every setting below can be overridden through its GUNICORN_* environment variable.
+"""
+import multiprocessing
+import os
+import tempfile
+
+PROFILES = {
+    'sync': {'worker_class': 'sync', 'app': 'backend.wsgi:application'},
+    'gthread': {'worker_class': 'gthread', 'app': 'backend.wsgi:application'},
+    'gevent': {'worker_class': 'gevent', 'app': 'backend.wsgi:application'},
+    'async': {'worker_class': 'uvicorn_worker.UvicornWorker', 'app': 'backend.asgi:application'},
+}
+
+
+def env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+profile = os.getenv('GUNICORN_PROFILE', 'gthread')
+if profile not in PROFILES:
+    raise RuntimeError(f"Unknown GUNICORN_PROFILE {profile!r}, use one of {', '.join(PROFILES)}")
+
+wsgi_app = PROFILES[profile]['app']
+worker_class = PROFILES[profile]['worker_class']
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Sync workers are one request each, so they need the classic 2 * CPU + 1. Threaded and
+# async workers overlap I/O within a process and need fewer processes.
+cpus = multiprocessing.cpu_count()
+workers = env_int('GUNICORN_WORKERS', cpus * 2 + 1 if profile == 'sync' else cpus + 1)
+threads = env_int('GUNICORN_THREADS', 4 if profile == 'gthread' else 1)
+# Concurrent greenlets per gevent worker
+worker_connections = env_int('GUNICORN_WORKER_CONNECTIONS', 100)
+
+# Kill workers stuck for longer than this, e.g. on a hung upload
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+# Keep client connections from the proxy open between requests
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# Restart workers now and then to bound memory growth; the jitter keeps them from
+# restarting at the same time
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+# Loading the app before forking shares its memory between workers. gevent must
+# patch the standard library before the app is imported, so it never preloads.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true' and profile != 'gevent'
+
+# '-' logs requests to stdout, an empty value turns the access log off
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-') or None
+
+# Workers keep their Prometheus metrics in files here so /api/metrics reports all of them,
+# see semelVoter/metrics.py. Must be set before the app is loaded.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'semla-metrics')
+)
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # Values left over from a previous run would be added to the new ones. The preloaded
+    # app may already have opened its own files, named after this process.
+    os.makedirs(metrics_dir, exist_ok=True)
+    own_suffix = f'_{os.getpid()}.db'
+    for name in os.listdir(metrics_dir):
+        if not name.endswith(own_suffix):
+            os.unlink(os.path.join(metrics_dir, name))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
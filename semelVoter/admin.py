@@ -1,6 +1,11 @@
 from django.contrib import admin
 from django.contrib import messages
-from .models import Semla, SemlaImage, Ratings, RatingTracker, SemlaCreationTracker
+from django.db.models import F
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from .models import Semla, SemlaImage, Ratings, RatingTracker, SemlaCreationTracker, ImageUploadTracker
+from .snapshot import schedule_snapshot
+from .profiling import PROFILE_PARAM, list_profiles, profile_path, profile_summary
 
 
 class SemlaImageInline(admin.TabularInline):
@@ -82,8 +87,9 @@ class RatingsAdmin(admin.ModelAdmin):
         """Delete all ratings and reset semla ratings"""
         count = Ratings.objects.count()
         Ratings.objects.all().delete()
-        # Reset all semla ratings to 0
-        Semla.objects.update(rating=0.00)
+        # Reset all semla ratings to 0, bumping the versions the list and detail caches are keyed on
+        Semla.objects.update(rating=0.00, version=F('version') + 1)
+        schedule_snapshot()
         self.message_user(
             request,
             f"Deleted all {count} ratings and reset semla ratings to 0.",
@@ -131,3 +137,61 @@ class SemlaCreationTrackerAdmin(admin.ModelAdmin):
             f"Cleared {count} creation trackers.",
             messages.SUCCESS
         )
+
+
+@admin.register(ImageUploadTracker)
+class ImageUploadTrackerAdmin(admin.ModelAdmin):
+    list_display = ('ip_address', 'date', 'count')
+    list_filter = ('date',)
+    search_fields = ('ip_address',)
+    ordering = ('-date',)
+    
+    actions = ['clear_all_upload_trackers']
+    
+    @admin.action(description='Clear all image upload trackers')
+    def clear_all_upload_trackers(self, request, queryset):
+        """Clear all image upload trackers"""
+        count = ImageUploadTracker.objects.count()
+        ImageUploadTracker.objects.all().delete()
+        self.message_user(
+            request,
+            f"Cleared {count} image upload trackers.",
+            messages.SUCCESS
+        )
+
+
+# Request profiles written by ProfilerMiddleware, routed in backend/urls.py
+
+PROFILE_SORTS = ('cumulative', 'tottime', 'calls')
+
+
+def profile_list_view(request):
+    """List the most recent request profiles"""
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': list_profiles(),
+        'profile_param': PROFILE_PARAM,
+    }
+    return TemplateResponse(request, 'admin/semelVoter/profiles.html', context)
+
+
+def profile_detail_view(request, name):
+    """Show the pstats report of one profile, or download it with ?download"""
+    path = profile_path(name)
+    if path is None:
+        raise Http404('Profile not found')
+    if 'download' in request.GET:
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+    sort = request.GET.get('sort', PROFILE_SORTS[0])
+    if sort not in PROFILE_SORTS:
+        sort = PROFILE_SORTS[0]
+    context = {
+        **admin.site.each_context(request),
+        'title': name,
+        'name': name,
+        'sort': sort,
+        'sorts': PROFILE_SORTS,
+        'summary': profile_summary(path, sort=sort),
+    }
+    return TemplateResponse(request, 'admin/semelVoter/profile_detail.html', context)
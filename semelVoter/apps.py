@@ -5,3 +5,10 @@ class SemelvoterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'semelVoter'
 
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401
+        from .slow_queries import install_slow_query_logger
+        from .timing import install_query_timer
+        connection_created.connect(install_query_timer, dispatch_uid='semelVoter.timing')
+        connection_created.connect(install_slow_query_logger, dispatch_uid='semelVoter.slow_queries')
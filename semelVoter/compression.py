@@ -0,0 +1,123 @@
+import gzip
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from .metrics import record_cache_lookup
+
+try:
+    import brotli
+except ImportError:  # Without Brotli only gzip is offered
+    brotli = None
+
+# Bodies smaller than this are not worth the compression overhead
+MIN_COMPRESS_SIZE = 200
+# Variants are compressed once per cache entry, so levels favour size over speed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding: str):
+    """
+    Pick the content coding for an Accept-Encoding header value.
+
+    Prefers brotli over gzip at equal quality and respects q=0.
+
+    Returns:
+        'br', 'gzip' or None for an uncompressed response
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in supported_encodings():
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _negotiated_response(request, entry):
+    """
+    Build the response for a cache entry in the encoding the client accepts.
+
+    Returns:
+        (response, whether a new variant was added to the entry)
+    """
+    body = entry['identity']
+    encoding = None
+    if len(body) >= MIN_COMPRESS_SIZE:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+    added = False
+    if encoding is not None:
+        if encoding not in entry:
+            entry[encoding] = _compress(body, encoding)
+            added = True
+        body = entry[encoding]
+
+    response = HttpResponse(body, content_type='application/json')
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response, added
+
+
+def cached_json_response(request, cache_key, render):
+    """
+    Serve a JSON body from the cache in the encoding the client accepts.
+
+    The cache entry holds the identity body and, once requested, its gzip and
+    brotli variants, so a cache hit is served without rendering or compressing.
+    cache_key must change whenever the body would, e.g. by including a version.
+
+    Args:
+        request: The incoming request
+        cache_key: Key of the cache entry
+        render: Callable returning the JSON body as bytes, called on a cache miss
+
+    Returns:
+        HttpResponse with Content-Encoding and Vary set
+    """
+    entry = cache.get(cache_key)
+    missing = entry is None
+    record_cache_lookup(cache_key, hit=not missing)
+    if missing:
+        entry = {'identity': render()}
+    response, added = _negotiated_response(request, entry)
+    if missing or added:
+        cache.set(cache_key, entry)
+    return response
+
+
+async def acached_json_response(request, cache_key, render):
+    """Async version of cached_json_response, render is awaited on a cache miss."""
+    entry = await cache.aget(cache_key)
+    missing = entry is None
+    record_cache_lookup(cache_key, hit=not missing)
+    if missing:
+        entry = {'identity': await render()}
+    response, added = _negotiated_response(request, entry)
+    if missing or added:
+        await cache.aset(cache_key, entry)
+    return response
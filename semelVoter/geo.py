@@ -0,0 +1,102 @@
+import math
+
+# Geohash alphabet, see https://en.wikipedia.org/wiki/Geohash
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precision stored on Semla, ~4.8m x 4.8m cells
+GEOHASH_PRECISION = 8
+
+# Upper bound on cells looked up for a single nearby query
+MAX_CELLS = 16
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encode a coordinate as a geohash string."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def prefix_end(cell: str) -> str | None:
+    """
+    Get the smallest geohash after every geohash starting with cell, or None if there is none.
+    Increments the last character in BASE32 order, carrying over 'z', so the bound holds in
+    any collation that orders digits before letters, unlike appending a high ASCII character.
+    """
+    for i in range(len(cell) - 1, -1, -1):
+        index = BASE32.index(cell[i])
+        if index + 1 < len(BASE32):
+            return cell[:i] + BASE32[index + 1]
+    return None
+
+
+def cell_size(precision: int) -> tuple[float, float]:
+    """Get the (height, width) in degrees of a geohash cell."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _steps(start: float, stop: float, step: float):
+    """Yield points from start to stop, one per step, always including stop."""
+    value = start
+    while value < stop:
+        yield value
+        value += step
+    yield stop
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> set[str]:
+    """
+    Get the geohash prefixes covering a circle around a coordinate.
+    Uses the finest precision that needs at most MAX_CELLS cells.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    min_lon, max_lon = longitude - lon_delta, longitude + lon_delta
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.ceil((max_lat - min_lat) / height) + 1
+        cols = math.ceil((max_lon - min_lon) / width) + 1
+        if rows * cols <= MAX_CELLS or precision == 1:
+            break
+
+    cells = set()
+    for lat in _steps(min_lat, max_lat, height):
+        for lon in _steps(min_lon, max_lon, width):
+            wrapped_lon = (lon + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, wrapped_lon, precision))
+    return cells
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two coordinates in kilometers."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from semelVoter.snapshot import write_snapshot
+
+class Command(BaseCommand):
+    help = 'Write the pre-compressed catalogue snapshot served under SNAPSHOT_URL'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Writing catalogue snapshot...')
+        manifest = write_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {manifest['version']} with {manifest['count']} semlor at {manifest['url']}"
+        ))
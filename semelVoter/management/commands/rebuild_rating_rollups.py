@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from semelVoter.models import SemlaDailyRating
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-semla daily rating rollups from all ratings'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding rating rollups...')
+        SemlaDailyRating.rebuild()
+        count = SemlaDailyRating.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {count} daily rollups'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from semelVoter.search import rebuild_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the trigram search index for all semlor'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding search index...')
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Successfully indexed {count} semlor'))
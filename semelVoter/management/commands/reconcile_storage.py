@@ -0,0 +1,45 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from semelVoter.reconcile import PAGE_SIZE, reconcile_images
+
+class Command(BaseCommand):
+    help = 'Delete stored images that no SemlaImage points at'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.ORPHAN_GRACE_PERIOD,
+            help='Keep orphans younger than this many seconds (default: ORPHAN_GRACE_PERIOD)',
+        )
+        parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='Objects listed per page')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the orphans, delete nothing')
+
+    def handle(self, *args, **options):
+        if options['grace'] < settings.UPLOAD_CONFIRM_WINDOW:
+            raise CommandError(
+                f"--grace must be at least UPLOAD_CONFIRM_WINDOW ({settings.UPLOAD_CONFIRM_WINDOW}s), "
+                "or unconfirmed uploads would be deleted"
+            )
+        if not 1 <= options['page_size'] <= PAGE_SIZE:
+            raise CommandError(f'--page-size must be between 1 and {PAGE_SIZE}')
+
+        dry_run = options['dry_run']
+        self.stdout.write('Reconciling stored images' + (' (dry run)...' if dry_run else '...'))
+        counts = reconcile_images(
+            datetime.timedelta(seconds=options['grace']),
+            dry_run=dry_run,
+            page_size=options['page_size'],
+            progress=lambda counts: self.stdout.write(
+                f"Scanned {counts['scanned']} objects, {counts['orphaned']} orphaned"
+            ),
+        )
+        action = 'Would delete' if dry_run else 'Deleted'
+        deleted = counts['orphaned'] if dry_run else counts['deleted']
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {deleted} of {counts['scanned']} objects, "
+            f"kept {counts['recent']} recent orphans and skipped {counts['skipped']} unknown names"
+        ))
+        if not dry_run and counts['deleted'] < counts['orphaned']:
+            self.stdout.write(self.style.WARNING(
+                f"{counts['orphaned'] - counts['deleted']} orphans could not be deleted"
+            ))
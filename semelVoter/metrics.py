@@ -0,0 +1,107 @@
+"""
+Prometheus metrics, scraped from /api/metrics.
+
+Under gunicorn every worker has its own counters. Set PROMETHEUS_MULTIPROC_DIR to an
+empty, writable directory before the workers start and prometheus_client keeps the
+values in files there, which the scrape endpoint of any worker then adds up.
+
+Only scrapers sending METRICS_TOKEN as a bearer token or connecting from
+METRICS_ALLOWED_IPS may read the endpoint.
+"""
+import hmac
+import ipaddress
+import os
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest,
+)
+from prometheus_client import multiprocess
+
+REQUEST_LATENCY = Histogram(
+    'semla_request_duration_seconds',
+    'Time spent handling a request, per view',
+    ['view', 'method'],
+)
+RATE_LIMITED = Counter(
+    'semla_rate_limited_total',
+    'Requests rejected with 429 by the daily trackers',
+    ['tracker'],
+)
+UPLOAD_DURATION = Histogram(
+    'semla_upload_duration_seconds',
+    'Time spent uploading an image to storage',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+UPLOAD_FAILURES = Counter(
+    'semla_upload_failures_total',
+    'Image uploads that failed',
+)
+PEAK_MEMORY = Histogram(
+    'semla_request_peak_memory_bytes',
+    'Peak memory allocated by Python while handling a request, for MEMORY_TRACED_VIEWS',
+    ['view'],
+    buckets=(2 ** 16, 2 ** 18, 2 ** 20, 2 ** 22, 2 ** 24, 2 ** 26, 2 ** 28),
+)
+CACHE_REQUESTS = Counter(
+    'semla_cache_requests_total',
+    'Response cache lookups, hit ratio is hit / (hit + miss)',
+    ['cache', 'result'],
+)
+
+
+def record_cache_lookup(cache_key, hit):
+    """Count a cache lookup under the prefix of its key, e.g. semla-list."""
+    CACHE_REQUESTS.labels(cache_key.split(':', 1)[0], 'hit' if hit else 'miss').inc()
+
+
+def view_name(request):
+    """Label for the view that handled the request, the view class name where there is one."""
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+    view_class = getattr(match.func, 'view_class', None)
+    return view_class.__name__ if view_class else match.func.__name__
+
+
+def multiprocess_enabled():
+    return bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def _in_networks(address, networks):
+    return any(address in ipaddress.ip_network(network, strict=False) for network in networks)
+
+
+def _client_address(request):
+    """
+    REMOTE_ADDR, or the hop a trusted proxy appended to X-Forwarded-For. Hops further
+    left are set by the client and never trusted.
+    """
+    remote = ipaddress.ip_address(request.META['REMOTE_ADDR'])
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded and _in_networks(remote, settings.IPWARE_TRUSTED_PROXY_LIST):
+        return ipaddress.ip_address(forwarded.rsplit(',', 1)[-1].strip())
+    return remote
+
+
+def scrape_allowed(request):
+    """Whether request may read the metrics, by bearer token or client address."""
+    token = settings.METRICS_TOKEN
+    if token:
+        authorization = request.META.get('HTTP_AUTHORIZATION', '').encode()
+        if hmac.compare_digest(authorization, f'Bearer {token}'.encode()):
+            return True
+    try:
+        address = _client_address(request)
+    except (KeyError, ValueError):
+        return False
+    return _in_networks(address, settings.METRICS_ALLOWED_IPS)
+
+
+def render_metrics():
+    """Get (body, content type) of all metrics in the text exposition format."""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,374 @@
+import cProfile
+import json
+import logging
+import re
+import threading
+import time
+import tracemalloc
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_cache_control
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .metrics import PEAK_MEMORY, REQUEST_LATENCY, view_name
+from .profiling import save_profile, wants_profile
+from .routers import routing_scope
+from .snapshot import SNAPSHOT_NAME
+from .timing import CATEGORIES, request_scope
+
+timing_logger = logging.getLogger('semelVoter.timing')
+memory_logger = logging.getLogger('semelVoter.memory')
+
+
+class AsyncWhiteNoiseMixin:
+    """
+    Lets a WhiteNoise middleware run in an async middleware chain.
+
+    WhiteNoiseMiddleware is sync only, so under ASGI Django would run it, and the
+    whole request behind it, through a thread. Finding a file is a dict lookup
+    (or a stat with autorefresh), which is cheap enough to do on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class StaticFilesMiddleware(AsyncWhiteNoiseMixin, WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware for STATIC_ROOT that also runs natively under ASGI."""
+
+
+class SnapshotMiddleware(AsyncWhiteNoiseMixin, WhiteNoiseMiddleware):
+    """
+    Serves the catalogue snapshots in SNAPSHOT_ROOT through WhiteNoise.
+
+    The regular WhiteNoiseMiddleware indexes its files once at startup, but snapshots
+    are rewritten while the app runs, so this instance looks them up per request
+    (autorefresh) and only for URLs under SNAPSHOT_URL. Pre-compressed .gz/.br
+    variants are negotiated by WhiteNoise as usual.
+    """
+    VERSIONED_SNAPSHOT = re.compile(rf'^{SNAPSHOT_NAME}\.[0-9a-f]+\.json$')
+
+    def __init__(self, get_response=None, settings=settings):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Skip WhiteNoiseMiddleware.__init__, which would index STATIC_ROOT a second time
+        WhiteNoise.__init__(
+            self,
+            application=None,
+            autorefresh=True,
+            max_age=settings.SNAPSHOT_MAX_AGE,
+        )
+        self.use_finders = False
+        self.static_prefix = settings.SNAPSHOT_URL
+        self.add_files(settings.SNAPSHOT_ROOT, prefix=settings.SNAPSHOT_URL)
+
+    def immutable_file_test(self, path, url):
+        """Versioned snapshots never change once written."""
+        return bool(self.VERSIONED_SNAPSHOT.match(url.rsplit('/', 1)[-1]))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Give every request its own primary/replica routing state.
+
+    Requests that change data read from the primary from the start, so checks made
+    before a write see current data; other requests use the replica until they write.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_scope(pinned=request.method not in self.SAFE_METHODS):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with routing_scope(pinned=request.method not in self.SAFE_METHODS):
+            return await self.get_response(request)
+
+
+class ServerTimingMiddleware:
+    """
+    Report where the time of a request went.
+
+    Adds a Server-Timing header with database, storage and render time (visible in the
+    browser devtools) and logs the same numbers as one JSON line to semelVoter.timing.
+    Disabled with SERVER_TIMING=False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_scope() as timings:
+            response = self.get_response(request)
+        self.report(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        with request_scope() as timings:
+            response = await self.get_response(request)
+        self.report(request, response, timings)
+        return response
+
+    def report(self, request, response, timings):
+        total = timings.total_milliseconds()
+        metrics = [f'db;dur={timings.milliseconds("db")};desc="{timings.queries} queries"']
+        metrics += [f'{category};dur={timings.milliseconds(category)}' for category in CATEGORIES[1:]]
+        metrics.append(f'total;dur={total}')
+        response['Server-Timing'] = ', '.join(metrics)
+
+        match = request.resolver_match
+        timing_logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': match.view_name if match else None,
+            'duration_ms': total,
+            'queries': timings.queries,
+            **{f'{category}_ms': timings.milliseconds(category) for category in CATEGORIES},
+        }))
+
+
+class MetricsMiddleware:
+    """Record the latency of every request in a histogram per view, see semelVoter.metrics."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, started)
+        return response
+
+    def observe(self, request, started):
+        REQUEST_LATENCY.labels(view_name(request), request.method).observe(time.perf_counter() - started)
+
+
+class ProfilerMiddleware:
+    """
+    Run a single request under cProfile when staff ask for it with ?profile or an
+    X-Profile header. The user comes from the session, so this must come after
+    AuthenticationMiddleware. Profiles are listed in the admin under /admin/profiles/.
+    Other requests only pay for the check; PROFILING_ENABLED=False removes it entirely.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not (wants_profile(request) and request.user.is_staff):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        response['X-Profile'] = save_profile(profiler, request)
+        return response
+
+    async def __acall__(self, request):
+        if not wants_profile(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not user.is_staff:
+            return await self.get_response(request)
+        # Other requests running on the event loop meanwhile end up in the profile too
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        response['X-Profile'] = save_profile(profiler, request)
+        return response
+
+
+class PeakMemoryMiddleware:
+    """
+    Record the peak memory allocated while handling requests to MEMORY_TRACED_VIEWS,
+    given as view class names, with tracemalloc.
+
+    tracemalloc traces the whole process and slows it down while on, so it only runs
+    during a traced request and only for one request at a time; others are not traced.
+    As every allocation of the process counts, a peak is only recorded when no other
+    request passed this middleware while it was traced. Under gthread or async workers
+    busy processes therefore report few peaks; the sync profile reports all of them.
+    Peaks go to the semla_request_peak_memory_bytes histogram and the semelVoter.memory log.
+    """
+    sync_capable = True
+    async_capable = True
+
+    _tracing = threading.Lock()
+
+    def __init__(self, get_response):
+        self.views = set(settings.MEMORY_TRACED_VIEWS)
+        if not self.views:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # Set when another request ran during the traced one, whose peak is then discarded
+        self._overlapped = False
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.enter()
+        try:
+            return self.get_response(request)
+        finally:
+            self.leave(request)
+
+    async def __acall__(self, request):
+        self.enter()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.leave(request)
+
+    def enter(self):
+        with self._lock:
+            self._in_flight += 1
+            if self._in_flight > 1:
+                self._overlapped = True
+
+    def leave(self, request):
+        with self._lock:
+            self._in_flight -= 1
+        self.stop(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = view_name(request)
+        if view not in self.views or tracemalloc.is_tracing() or not self._tracing.acquire(blocking=False):
+            return None
+        with self._lock:
+            if self._in_flight > 1:
+                self._tracing.release()
+                return None
+            self._overlapped = False
+        request._traced_view = view
+        tracemalloc.start()
+        return None
+
+    def stop(self, request):
+        view = getattr(request, '_traced_view', None)
+        if view is None:
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with self._lock:
+            overlapped = self._overlapped
+        self._tracing.release()
+        del request._traced_view
+        if overlapped:
+            return
+        PEAK_MEMORY.labels(view).observe(peak)
+        memory_logger.info(json.dumps({'view': view, 'path': request.path, 'peak_bytes': peak}))
+
+
+class CacheControlMiddleware:
+    """
+    Let a CDN or reverse proxy cache public API reads.
+
+    Successful anonymous GET/HEAD JSON responses of the views in API_CACHE_POLICIES,
+    keyed by URL name, get Cache-Control: public plus the max_age, s_maxage and
+    stale_while_revalidate of their policy. Responses that set Cache-Control
+    themselves are left alone.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.policies = settings.API_CACHE_POLICIES
+        if not self.policies:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        policy = self.policy(request, response)
+        if policy and not self.authenticated(getattr(request, 'user', None)):
+            patch_cache_control(response, public=True, **policy)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        policy = self.policy(request, response)
+        # request.user would load the session synchronously on the event loop
+        if policy and not self.authenticated(await request.auser() if hasattr(request, 'auser') else None):
+            patch_cache_control(response, public=True, **policy)
+        return response
+
+    @staticmethod
+    def authenticated(user):
+        return user is not None and user.is_authenticated
+
+    def policy(self, request, response):
+        """Cache policy of a response if it may be cached by shared caches, checked before the user is loaded."""
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return None
+        if response.has_header('Cache-Control') or not response.get('Content-Type', '').startswith('application/json'):
+            return None
+        match = request.resolver_match
+        return self.policies.get(match.url_name) if match else None
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_search_index(apps, schema_editor):
+    """Index the semlor that existed before the trigram table."""
+    from semelVoter.search import SEARCH_FIELDS, trigrams
+
+    Semla = apps.get_model('semelVoter', 'Semla')
+    SemlaSearchTrigram = apps.get_model('semelVoter', 'SemlaSearchTrigram')
+    rows = []
+    for semla in Semla.objects.all():
+        text = ' '.join(getattr(semla, field) for field in SEARCH_FIELDS)
+        rows.extend(SemlaSearchTrigram(semla=semla, trigram=gram) for gram in trigrams(text))
+    SemlaSearchTrigram.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('semelVoter', '0017_add_category_ratings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SemlaSearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('semla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_trigrams', to='semelVoter.semla')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'semla'], name='semelVoter__trigram_a96869_idx')],
+                'unique_together': {('semla', 'trigram')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
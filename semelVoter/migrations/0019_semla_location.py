@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('semelVoter', '0018_semla_search_trigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semla',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='semla',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='semla',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('semelVoter', '0019_semla_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semla',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+CATEGORY_FIELDS = ['gradde', 'mandelmassa', 'lock', 'helhet', 'bulle']
+
+
+def build_rollups(apps, schema_editor):
+    """Backfill the daily rollups from existing ratings."""
+    Ratings = apps.get_model('semelVoter', 'Ratings')
+    SemlaDailyRating = apps.get_model('semelVoter', 'SemlaDailyRating')
+    has_categories = Q(**{f'{field}__isnull': False for field in CATEGORY_FIELDS})
+    aggregates = {
+        'count': Count('id'),
+        'category_count': Count('id', filter=has_categories),
+        'legacy_rating_sum': Sum('rating', filter=~has_categories, default=0),
+    }
+    for field in CATEGORY_FIELDS:
+        aggregates[f'sum_{field}'] = Sum(field, filter=has_categories, default=0)
+    for value in range(1, 6):
+        aggregates[f'histogram_{value}'] = Count('id', filter=Q(rating=value))
+    rows = Ratings.objects.order_by().values('semla_id', 'date').annotate(**aggregates)
+    SemlaDailyRating.objects.bulk_create([SemlaDailyRating(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('semelVoter', '0020_semla_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SemlaDailyRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('category_count', models.PositiveIntegerField(default=0)),
+                ('sum_gradde', models.PositiveIntegerField(default=0)),
+                ('sum_mandelmassa', models.PositiveIntegerField(default=0)),
+                ('sum_lock', models.PositiveIntegerField(default=0)),
+                ('sum_helhet', models.PositiveIntegerField(default=0)),
+                ('sum_bulle', models.PositiveIntegerField(default=0)),
+                ('legacy_rating_sum', models.PositiveIntegerField(default=0)),
+                ('histogram_1', models.PositiveIntegerField(default=0)),
+                ('histogram_2', models.PositiveIntegerField(default=0)),
+                ('histogram_3', models.PositiveIntegerField(default=0)),
+                ('histogram_4', models.PositiveIntegerField(default=0)),
+                ('histogram_5', models.PositiveIntegerField(default=0)),
+                ('semla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_ratings', to='semelVoter.semla')),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('semla', 'date')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2 on 2026-10-19 18:05
+
+import hashlib
+from collections import defaultdict
+from django.db import migrations, models
+from django.db.models import F
+
+CATEGORY_FIELDS = ['gradde', 'mandelmassa', 'lock', 'helhet', 'bulle']
+
+ROLLUP_FIELDS = (
+    ['count', 'category_count', 'legacy_rating_sum']
+    + [f'sum_{field}' for field in CATEGORY_FIELDS]
+    + [f'histogram_{value}' for value in range(1, 6)]
+)
+
+
+def make_natural_key(bakery, city, kind):
+    """Frozen copy of semelVoter.models.make_natural_key as it was when this migration was written."""
+    parts = (' '.join(str(value).split()).casefold() for value in (bakery, city, kind))
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Fill in natural keys and merge semlor that share one.
+    The oldest semla survives and takes over ratings, images and rollups of the others.
+    """
+    Semla = apps.get_model('semelVoter', 'Semla')
+    Ratings = apps.get_model('semelVoter', 'Ratings')
+    SemlaImage = apps.get_model('semelVoter', 'SemlaImage')
+    SemlaDailyRating = apps.get_model('semelVoter', 'SemlaDailyRating')
+
+    groups = defaultdict(list)
+    for semla in Semla.objects.order_by('pk'):
+        groups[make_natural_key(semla.bakery, semla.city, semla.kind)].append(semla)
+
+    for key, semlor in groups.items():
+        survivor, duplicates = semlor[0], semlor[1:]
+        if duplicates:
+            duplicate_ids = [semla.pk for semla in duplicates]
+            Ratings.objects.filter(semla_id__in=duplicate_ids).update(semla=survivor)
+            SemlaImage.objects.filter(semla_id__in=duplicate_ids).update(semla=survivor)
+            for rollup in SemlaDailyRating.objects.filter(semla_id__in=duplicate_ids):
+                target, created = SemlaDailyRating.objects.get_or_create(
+                    semla=survivor, date=rollup.date,
+                    defaults={field: getattr(rollup, field) for field in ROLLUP_FIELDS},
+                )
+                if not created:
+                    SemlaDailyRating.objects.filter(pk=target.pk).update(
+                        **{field: F(field) + getattr(rollup, field) for field in ROLLUP_FIELDS}
+                    )
+            if not survivor.picture:
+                survivor.picture = next((semla.picture for semla in duplicates if semla.picture), '')
+
+            total = 0
+            count = 0
+            for rating in Ratings.objects.filter(semla=survivor):
+                scores = [getattr(rating, field) for field in CATEGORY_FIELDS]
+                total += sum(scores) / 5 if all(scores) else rating.rating
+                count += 1
+            survivor.rating = total / count if count else 0
+            survivor.version += 1
+            Semla.objects.filter(pk__in=duplicate_ids).delete()
+        survivor.natural_key = key
+        survivor.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('semelVoter', '0021_semla_daily_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semla',
+            name='natural_key',
+            field=models.CharField(editable=False, max_length=40, null=True),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('semelVoter', '0022_semla_natural_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='semla',
+            name='natural_key',
+            field=models.CharField(editable=False, max_length=40, unique=True),
+        ),
+    ]
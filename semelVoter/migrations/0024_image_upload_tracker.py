@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('semelVoter', '0023_alter_semla_natural_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUploadTracker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', models.CharField(max_length=45)),
+                ('user_agent', models.TextField()),
+                ('date', models.DateField(default=django.utils.timezone.now)),
+                ('count', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('ip_address', 'user_agent', 'date')},
+            },
+        ),
+    ]
@@ -1,7 +1,21 @@
 import django
+import hashlib
 import uuid
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
 from django.utils.timezone import localdate
+from . import geo
+
+
+def make_natural_key(bakery, city, kind):
+    """
+    Build the natural key of a Semla from bakery, city and kind.
+    Case-folded with whitespace trimmed and collapsed, hashed to fit a unique index.
+    """
+    parts = (' '.join(str(value).split()).casefold() for value in (bakery, city, kind))
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
 # Create your models here.
 class Semla(models.Model):
     bakery = models.CharField(max_length=255)
@@ -11,8 +25,80 @@ class Semla(models.Model):
     price = models.DecimalField(max_digits=5, decimal_places=2)
     kind = models.CharField(max_length=255)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    # Bumped on every change to the semla, its ratings or images; used as cache key
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # Normalized (bakery, city, kind), see make_natural_key
+    natural_key = models.CharField(max_length=40, unique=True, editable=False)
     def __str__(self):
         return f"{self.bakery} - {self.city} - {self.kind}"
+    def refresh_derived_fields(self):
+        """Set the geohash bucket and natural key. Needed before bulk_create."""
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        self.natural_key = make_natural_key(self.bakery, self.city, self.kind)
+    def save(self, *args, **kwargs):
+        """Keep derived fields in sync and bump the version."""
+        self.refresh_derived_fields()
+        if not self._state.adding:
+            self.version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = {*update_fields, 'version'}
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            if {'bakery', 'city', 'kind'} & update_fields:
+                update_fields.add('natural_key')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+    @classmethod
+    def create_or_get(cls, **fields):
+        """
+        Insert a Semla or return the existing one with the same natural key.
+        The unique index makes concurrent inserts of the same semla safe.
+
+        Returns:
+            (semla, created) tuple
+        """
+        key = make_natural_key(fields['bakery'], fields['city'], fields['kind'])
+        existing = cls.objects.filter(natural_key=key).first()
+        if existing is not None:
+            return existing, False
+        try:
+            with transaction.atomic():
+                return cls.objects.create(**fields), True
+        except IntegrityError:
+            return cls.objects.get(natural_key=key), False
+    @classmethod
+    def bump_version(cls, semla_id):
+        """Invalidate cached representations after a related row changed."""
+        cls.objects.filter(pk=semla_id).update(version=models.F('version') + 1)
+    @classmethod
+    def nearby(cls, latitude, longitude, radius_km):
+        """
+        Get semlor within radius_km of a coordinate, closest first.
+        Only rows in the geohash cells covering the radius are loaded.
+
+        Returns:
+            List of (semla, distance_km) tuples
+        """
+        cells = geo.covering_cells(latitude, longitude, radius_km)
+        # Range lookups instead of startswith so the geohash index is used on SQLite too
+        in_cells = Q()
+        for cell in cells:
+            end = geo.prefix_end(cell)
+            in_cells |= Q(geohash__gte=cell, geohash__lt=end) if end else Q(geohash__gte=cell)
+        results = []
+        for semla in cls.objects.filter(in_cells).prefetch_related('images'):
+            distance = geo.haversine_km(latitude, longitude, semla.latitude, semla.longitude)
+            if distance <= radius_km:
+                results.append((semla, distance))
+        results.sort(key=lambda result: result[1])
+        return results
     def update_rating(self, new_rating):
         """
         Update the Semla rating based on the old and new ratings.
@@ -39,7 +125,7 @@ class Semla(models.Model):
                 new_avg = int(new_rating)
             
             self.rating = (total + new_avg) / (len(old_ratings) + 1)
-            self.save()
+            self.save(update_fields=['rating'])
         except Exception as e:
             print(f"Error updating rating: {e}")
 
@@ -57,6 +143,18 @@ class SemlaImage(models.Model):
     def __str__(self):
         return f"Image {self.id} for {self.semla.bakery}"
 
+class SemlaSearchTrigram(models.Model):
+    """Trigram index over the searchable Semla fields, maintained on save."""
+    semla = models.ForeignKey(Semla, on_delete=models.CASCADE, related_name='search_trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ('semla', 'trigram')
+        indexes = [models.Index(fields=['trigram', 'semla'])]
+
+    def __str__(self):
+        return f"{self.trigram} -> {self.semla_id}"
+
 class Ratings(models.Model):
     semla = models.ForeignKey(Semla, on_delete=models.CASCADE, related_name='ratings')
     rating = models.IntegerField()  # Legacy field, kept for backward compatibility
@@ -70,6 +168,8 @@ class Ratings(models.Model):
     helhet = models.IntegerField(null=True, blank=True)  # Overall
     bulle = models.IntegerField(null=True, blank=True)  # Bun
 
+    CATEGORY_FIELDS = ['gradde', 'mandelmassa', 'lock', 'helhet', 'bulle']
+
     def __str__(self):
         return f"{self.semla.bakery} - {self.rating}"
 
@@ -87,6 +187,127 @@ class Ratings(models.Model):
         return cls.objects.filter(semla_id=semla_id).order_by('-date').exclude(comment__isnull=True)
 
 
+class SemlaDailyRating(models.Model):
+    """
+    Per-semla, per-day rollup of ratings.
+    Updated incrementally on every rating write so stats never scan Ratings.
+    """
+    semla = models.ForeignKey(Semla, on_delete=models.CASCADE, related_name='daily_ratings')
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    # Ratings that have all five category scores
+    category_count = models.PositiveIntegerField(default=0)
+    sum_gradde = models.PositiveIntegerField(default=0)
+    sum_mandelmassa = models.PositiveIntegerField(default=0)
+    sum_lock = models.PositiveIntegerField(default=0)
+    sum_helhet = models.PositiveIntegerField(default=0)
+    sum_bulle = models.PositiveIntegerField(default=0)
+    # Sum of the legacy single rating for ratings without category scores
+    legacy_rating_sum = models.PositiveIntegerField(default=0)
+    histogram_1 = models.PositiveIntegerField(default=0)
+    histogram_2 = models.PositiveIntegerField(default=0)
+    histogram_3 = models.PositiveIntegerField(default=0)
+    histogram_4 = models.PositiveIntegerField(default=0)
+    histogram_5 = models.PositiveIntegerField(default=0)
+
+    # Columns that add up when combining days, e.g. into weeks
+    SUMMED_FIELDS = (
+        ['count', 'category_count', 'legacy_rating_sum']
+        + [f'sum_{field}' for field in Ratings.CATEGORY_FIELDS]
+    )
+
+    class Meta:
+        unique_together = ('semla', 'date')
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.semla_id} - {self.date}: {self.count}"
+
+    @staticmethod
+    def _deltas(rating, sign):
+        """Get the column increments a single rating contributes."""
+        deltas = {'count': sign}
+        if all(getattr(rating, field) for field in Ratings.CATEGORY_FIELDS):
+            deltas['category_count'] = sign
+            for field in Ratings.CATEGORY_FIELDS:
+                deltas[f'sum_{field}'] = sign * getattr(rating, field)
+        else:
+            deltas['legacy_rating_sum'] = sign * rating.rating
+        if 1 <= rating.rating <= 5:
+            deltas[f'histogram_{rating.rating}'] = sign
+        return deltas
+
+    @classmethod
+    def record(cls, rating, sign=1):
+        """
+        Add (sign=1) or remove (sign=-1) a rating from its day's rollup.
+        Uses F() increments so concurrent rating writes don't lose updates.
+        """
+        day = Ratings._meta.get_field('date').to_python(rating.date)
+        deltas = cls._deltas(rating, sign)
+        increments = {column: models.F(column) + delta for column, delta in deltas.items()}
+        if cls.objects.filter(semla_id=rating.semla_id, date=day).update(**increments):
+            return
+        if sign < 0:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(semla_id=rating.semla_id, date=day, **deltas)
+        except IntegrityError:
+            # Another request created today's row first
+            cls.objects.filter(semla_id=rating.semla_id, date=day).update(**increments)
+
+    @classmethod
+    def rebuild(cls, semla_id=None):
+        """Recompute rollups from Ratings, for one semla or all of them."""
+        ratings = Ratings.objects.all()
+        rollups = cls.objects.all()
+        if semla_id is not None:
+            ratings = ratings.filter(semla_id=semla_id)
+            rollups = rollups.filter(semla_id=semla_id)
+        has_categories = Q(**{f'{field}__isnull': False for field in Ratings.CATEGORY_FIELDS})
+        aggregates = {
+            'count': models.Count('id'),
+            'category_count': models.Count('id', filter=has_categories),
+            'legacy_rating_sum': models.Sum('rating', filter=~has_categories, default=0),
+        }
+        for field in Ratings.CATEGORY_FIELDS:
+            aggregates[f'sum_{field}'] = models.Sum(field, filter=has_categories, default=0)
+        for value in range(1, 6):
+            aggregates[f'histogram_{value}'] = models.Count('id', filter=Q(rating=value))
+        rows = ratings.order_by().values('semla_id', 'date').annotate(**aggregates)
+        with transaction.atomic():
+            rollups.delete()
+            cls.objects.bulk_create([cls(**row) for row in rows], batch_size=500)
+
+    @classmethod
+    def get_stats(cls, semla_id):
+        """
+        Get rating count, category averages and a 1-5 histogram for a Semla in one query.
+        """
+        columns = ['count', 'category_count'] + [f'sum_{field}' for field in Ratings.CATEGORY_FIELDS]
+        columns += [f'histogram_{value}' for value in range(1, 6)]
+        result = cls.objects.filter(semla_id=semla_id).aggregate(
+            **{column: models.Sum(column, default=0) for column in columns}
+        )
+        return {
+            'rating_count': result['count'],
+            'category_averages': {
+                field: round(result[f'sum_{field}'] / result['category_count'], 2)
+                if result['category_count'] else None
+                for field in Ratings.CATEGORY_FIELDS
+            },
+            'histogram': {str(value): result[f'histogram_{value}'] for value in range(1, 6)},
+        }
+
+    def average(self):
+        """Average rating for the day, matching Ratings.get_average_rating."""
+        if not self.count:
+            return None
+        category_total = sum(getattr(self, f'sum_{field}') for field in Ratings.CATEGORY_FIELDS)
+        return (category_total / 5 + self.legacy_rating_sum) / self.count
+
+
 class BaseTracker(models.Model):
     """Abstract base class for IP/user-agent rate limiting trackers"""
     ip_address = models.CharField(max_length=45)  # IPv6 can be long
@@ -139,4 +360,10 @@ class SemlaCreationTracker(BaseTracker):
     """Tracks semla creation attempts per IP/user-agent to enforce rate limiting"""
 
     class Meta(BaseTracker.Meta):
-        pass
\ No newline at end of file
+        pass
+
+class ImageUploadTracker(BaseTracker):
+    """Tracks presigned image uploads per IP/user-agent to enforce rate limiting"""
+
+    class Meta(BaseTracker.Meta):
+        pass
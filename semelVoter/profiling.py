@@ -0,0 +1,79 @@
+import io
+import os
+import pstats
+import re
+import uuid
+from datetime import datetime, timezone
+from django.conf import settings
+
+# Staff ask for a profile with ?profile=1 or an X-Profile header
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+PROFILE_NAME = re.compile(r'^[\w.-]+\.prof$')
+
+
+def wants_profile(request):
+    return PROFILE_PARAM in request.GET or PROFILE_HEADER in request.META
+
+
+def _slug(path):
+    return re.sub(r'[^\w]+', '-', path).strip('-')[:60] or 'root'
+
+
+def save_profile(profiler, request):
+    """
+    Write the stats of a profiled request to PROFILE_ROOT and prune the oldest
+    beyond PROFILE_KEEP. Returns the file name.
+    """
+    root = str(settings.PROFILE_ROOT)
+    os.makedirs(root, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    name = f"{stamp}-{uuid.uuid4().hex[:6]}-{request.method}-{_slug(request.path)}.prof"
+    profiler.dump_stats(os.path.join(root, name))
+    _prune_profiles(root)
+    return name
+
+
+def _prune_profiles(root):
+    profiles = [entry for entry in os.scandir(root) if PROFILE_NAME.match(entry.name)]
+    profiles.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in profiles[settings.PROFILE_KEEP:]:
+        try:
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles():
+    """Get name, size and time of the saved profiles, newest first."""
+    try:
+        entries = [entry for entry in os.scandir(settings.PROFILE_ROOT) if PROFILE_NAME.match(entry.name)]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for entry in entries:
+        stat = entry.stat()
+        profiles.append({
+            'name': entry.name,
+            'size': stat.st_size,
+            'created': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        })
+    profiles.sort(key=lambda profile: profile['created'], reverse=True)
+    return profiles
+
+
+def profile_path(name):
+    """Get the path of a saved profile, or None if name is not one."""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(settings.PROFILE_ROOT, name)
+    return path if os.path.isfile(path) else None
+
+
+def profile_summary(path, sort='cumulative', limit=40):
+    """Get the pstats report of a profile as text."""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
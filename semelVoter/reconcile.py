@@ -0,0 +1,124 @@
+import datetime
+import os
+import uuid
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from .models import SemlaImage
+from .uploads import is_s3
+from .utils import IMAGE_PREFIX
+
+# S3 lists and deletes at most 1000 keys per request
+PAGE_SIZE = 1000
+
+
+def image_id(name):
+    """SemlaImage id of a stored image name, or None if the name is not an image id."""
+    stem = os.path.basename(name).split('.', 1)[0]
+    try:
+        return uuid.UUID(stem)
+    except ValueError:
+        return None
+
+
+def _s3_pages(storage, page_size):
+    client = storage.connection.meta.client
+    paginator = client.get_paginator('list_objects_v2')
+    pages = paginator.paginate(
+        Bucket=storage.bucket_name,
+        Prefix=storage._normalize_name(IMAGE_PREFIX),
+        PaginationConfig={'PageSize': page_size},
+    )
+    for page in pages:
+        yield [(item['Key'], item['LastModified']) for item in page.get('Contents', [])]
+
+
+def _s3_delete(storage, keys):
+    client = storage.connection.meta.client
+    deleted = 0
+    for start in range(0, len(keys), PAGE_SIZE):
+        batch = keys[start:start + PAGE_SIZE]
+        response = client.delete_objects(
+            Bucket=storage.bucket_name,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+        )
+        deleted += len(batch) - len(response.get('Errors', []))
+    return deleted
+
+
+def _filesystem_pages(storage, page_size):
+    try:
+        entries = os.scandir(storage.path(IMAGE_PREFIX))
+    except FileNotFoundError:
+        return
+    page = []
+    with entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            modified = datetime.datetime.fromtimestamp(entry.stat().st_mtime, tz=datetime.timezone.utc)
+            page.append((IMAGE_PREFIX + entry.name, modified))
+            if len(page) >= page_size:
+                yield page
+                page = []
+    if page:
+        yield page
+
+
+def _filesystem_delete(storage, names):
+    for name in names:
+        storage.delete(name)
+    return len(names)
+
+
+def reconcile_images(grace, dry_run=False, page_size=PAGE_SIZE, storage=None, progress=None):
+    """
+    Delete stored images under IMAGE_PREFIX that no SemlaImage points at.
+
+    The listing is streamed page by page and each page is checked against the
+    database with one query, so memory stays bounded by page_size whatever the
+    size of the bucket. Objects newer than grace are kept, as they may be
+    uploads that are still waiting to be confirmed.
+
+    Args:
+        grace: Minimum age of deleted objects as a timedelta
+        dry_run: Only count the orphans, delete nothing
+        page_size: Objects listed and looked up per page
+        storage: Storage to reconcile, default_storage if None
+        progress: Optional callable receiving the counts after every page
+
+    Returns:
+        Dict of scanned, orphaned, recent (orphans kept for the grace period),
+        skipped (names that are not image ids) and deleted counts
+    """
+    storage = storage or default_storage
+    pages, delete = (_s3_pages, _s3_delete) if is_s3(storage) else (_filesystem_pages, _filesystem_delete)
+    cutoff = timezone.now() - grace
+    counts = {'scanned': 0, 'orphaned': 0, 'recent': 0, 'skipped': 0, 'deleted': 0}
+
+    for page in pages(storage, page_size):
+        ids = {}
+        for name, modified in page:
+            stored_id = image_id(name)
+            if stored_id is None:
+                counts['skipped'] += 1
+            else:
+                ids[name] = (stored_id, modified)
+        known = set(
+            SemlaImage.objects.filter(id__in={stored_id for stored_id, _ in ids.values()})
+            .values_list('id', flat=True)
+        )
+        orphans = []
+        for name, (stored_id, modified) in ids.items():
+            if stored_id in known:
+                continue
+            if modified > cutoff:
+                counts['recent'] += 1
+            else:
+                orphans.append(name)
+        counts['scanned'] += len(page)
+        counts['orphaned'] += len(orphans)
+        if orphans and not dry_run:
+            counts['deleted'] += delete(storage, orphans)
+        if progress:
+            progress(counts)
+    return counts
@@ -0,0 +1,69 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import connections, DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Models whose reads must see the latest writes, e.g. rate limit counters
+PRIMARY_MODELS = {'ratingtracker', 'semlacreationtracker', 'imageuploadtracker'}
+# Apps read right after they were written to, like a session after logging in
+PRIMARY_APPS = {'auth', 'sessions', 'admin'}
+
+# Set once the current request wrote, or is expected to write, to the primary
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+def pin_to_primary():
+    """Send all further reads of the current request to the primary."""
+    _pinned.set(True)
+
+
+@contextmanager
+def use_primary():
+    """Send reads inside the block to the primary."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextmanager
+def routing_scope(pinned=False):
+    """Start a fresh routing state, e.g. for one request."""
+    token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Route reads to the replica database and everything else to the primary.
+
+    Reads stay on the primary for rate limit trackers, auth and sessions, inside a
+    transaction and once the current request has written, so a request always
+    reads its own writes. Without a replica configured every query uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if REPLICA_DB_ALIAS not in connections.settings or _pinned.get():
+            return DEFAULT_DB_ALIAS
+        if model._meta.model_name in PRIMARY_MODELS or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema through replication
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,107 @@
+import re
+import unicodedata
+from django.db.models import Count
+from .models import Semla, SemlaSearchTrigram
+
+# Fields that are indexed for the public search endpoint
+SEARCH_FIELDS = ('bakery', 'city', 'kind')
+
+# Minimum share of the query trigrams a semla must contain to be returned
+MIN_SIMILARITY = 0.3
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize text for indexing and querying.
+    Case-folds and strips diacritics so that 'Linköping' and 'linkoping' match.
+    """
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'[^\W_]+', text))
+
+
+def trigrams(text: str) -> set[str]:
+    """Split normalized text into padded word trigrams."""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def semla_trigrams(semla) -> set[str]:
+    """Get all trigrams for the searchable fields of a Semla."""
+    return trigrams(' '.join(getattr(semla, field) or '' for field in SEARCH_FIELDS))
+
+
+def index_semla(semla):
+    """
+    Bring the trigram rows for a Semla in line with its current fields.
+    Only the difference is written, so re-saving an unchanged Semla is a single read.
+    """
+    wanted = semla_trigrams(semla)
+    existing = set(
+        SemlaSearchTrigram.objects.filter(semla=semla).values_list('trigram', flat=True)
+    )
+    stale = existing - wanted
+    if stale:
+        SemlaSearchTrigram.objects.filter(semla=semla, trigram__in=stale).delete()
+    missing = wanted - existing
+    if missing:
+        SemlaSearchTrigram.objects.bulk_create(
+            [SemlaSearchTrigram(semla=semla, trigram=gram) for gram in missing]
+        )
+
+
+def index_new_semlor(semlor, batch_size=500):
+    """Index freshly bulk-created semlor, which bypass the post_save signal."""
+    rows = [
+        SemlaSearchTrigram(semla=semla, trigram=gram)
+        for semla in semlor
+        for gram in semla_trigrams(semla)
+    ]
+    SemlaSearchTrigram.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def rebuild_index(batch_size=500):
+    """Rebuild the whole trigram index. Returns the number of indexed semlor."""
+    SemlaSearchTrigram.objects.all().delete()
+    count = 0
+    rows = []
+    for semla in Semla.objects.only(*SEARCH_FIELDS).iterator(chunk_size=batch_size):
+        rows.extend(SemlaSearchTrigram(semla=semla, trigram=gram) for gram in semla_trigrams(semla))
+        count += 1
+        if len(rows) >= batch_size:
+            SemlaSearchTrigram.objects.bulk_create(rows, batch_size=batch_size)
+            rows = []
+    SemlaSearchTrigram.objects.bulk_create(rows, batch_size=batch_size)
+    return count
+
+
+def search_semlor(query: str, limit: int = 20):
+    """
+    Search semlor by bakery, city and kind.
+
+    Candidates are found through the indexed trigram table and ranked by the
+    share of query trigrams they contain, which tolerates typos and diacritics.
+
+    Returns:
+        List of (semla, score) tuples, best match first
+    """
+    grams = trigrams(query)
+    if not grams:
+        return []
+
+    min_hits = max(1, round(len(grams) * MIN_SIMILARITY))
+    hits = (
+        SemlaSearchTrigram.objects.filter(trigram__in=grams)
+        .values('semla_id')
+        .annotate(hits=Count('id'))
+        .filter(hits__gte=min_hits)
+        .order_by('-hits', 'semla_id')[:limit]
+    )
+    scores = {row['semla_id']: row['hits'] / len(grams) for row in hits}
+    semlor = Semla.objects.filter(pk__in=scores).prefetch_related('images')
+    ranked = sorted(semlor, key=lambda semla: (-scores[semla.pk], -semla.rating, semla.pk))
+    return [(semla, round(scores[semla.pk], 3)) for semla in ranked]
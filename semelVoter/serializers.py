@@ -1,6 +1,8 @@
+from collections import defaultdict
 from rest_framework import serializers
-from decimal import Decimal
+from decimal import Decimal, localcontext
 from .models import Semla, Ratings, SemlaImage
+from .timing import TimedDataMixin, TimedListSerializer, timed_function
 
 
 class SemlaImageSerializer(serializers.ModelSerializer):
@@ -11,13 +13,14 @@ class SemlaImageSerializer(serializers.ModelSerializer):
         model = SemlaImage
         fields = ['id', 'image_url']
 
-class SemlaSerializer(serializers.ModelSerializer):
+class SemlaSerializer(TimedDataMixin, serializers.ModelSerializer):
     rating = serializers.DecimalField(max_digits=3, decimal_places=2, coerce_to_string=False)
     images = SemlaImageSerializer(many=True, read_only=True)
     
     class Meta:
         model = Semla
-        fields = '__all__'
+        exclude = ['geohash', 'version', 'natural_key']
+        list_serializer_class = TimedListSerializer
 
 
 class CreateSemlaSerializer(serializers.ModelSerializer):
@@ -25,13 +28,15 @@ class CreateSemlaSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Semla
-        fields = ['bakery', 'city', 'vegan', 'price', 'kind']
+        fields = ['bakery', 'city', 'vegan', 'price', 'kind', 'latitude', 'longitude']
         extra_kwargs = {
             'bakery': {'required': True},
             'city': {'required': True},
             'price': {'required': True},
             'kind': {'required': True},
             'vegan': {'required': False, 'default': False},
+            'latitude': {'min_value': -90, 'max_value': 90},
+            'longitude': {'min_value': -180, 'max_value': 180},
         }
 
     def validate_price(self, value):
@@ -40,8 +45,124 @@ class CreateSemlaSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Price must be greater than zero.")
         return value
 
+    def create(self, validated_data):
+        """
+        Create the Semla, or return the existing one with the same bakery, city and kind.
+        Sets self.created so callers can tell the two apart.
+        """
+        semla, self.created = Semla.create_or_get(**validated_data)
+        return semla
 
-class CommentSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        """Ensure latitude and longitude are given together"""
+        if (attrs.get('latitude') is None) != (attrs.get('longitude') is None):
+            raise serializers.ValidationError("Latitude and longitude must be provided together.")
+        return attrs
+
+
+class CommentSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Ratings
-        fields = ['comment', "rating", "date", "name", "gradde", "mandelmassa", "lock", "helhet", "bulle"]
\ No newline at end of file
+        fields = ['comment', "rating", "date", "name", "gradde", "mandelmassa", "lock", "helhet", "bulle"]
+        list_serializer_class = TimedListSerializer
+
+
+# Hand-written read path for the hot list endpoints.
+# Builds the same payload as SemlaSerializer/CommentSerializer straight from
+# .values_list() tuples, skipping per-row field introspection and model instances.
+# Any field change in those serializers must be mirrored here; the equivalence
+# tests in tests.py enforce it.
+
+SEMLA_VALUE_FIELDS = (
+    'id', 'rating', 'bakery', 'city', 'picture', 'vegan', 'price', 'kind', 'latitude', 'longitude',
+)
+COMMENT_VALUE_FIELDS = (
+    'comment', 'rating', 'date', 'name', 'gradde', 'mandelmassa', 'lock', 'helhet', 'bulle',
+)
+TWO_PLACES = Decimal('0.01')
+
+
+def _quantize(value, max_digits):
+    """Round a decimal the way serializers.DecimalField does."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value).strip())
+    with localcontext() as context:
+        context.prec = max_digits
+        return value.quantize(TWO_PLACES, context=context)
+
+
+def images_by_semla(images):
+    """Group (semla_id, id, image_url) rows into SemlaImageSerializer dicts per semla."""
+    grouped = defaultdict(list)
+    for semla_id, image_id, image_url in images:
+        grouped[semla_id].append({'id': str(image_id), 'image_url': image_url})
+    return grouped
+
+
+def semla_row_to_dict(row, images):
+    """Build a SemlaSerializer-equivalent dict from a SEMLA_VALUE_FIELDS tuple."""
+    pk, rating, bakery, city, picture, vegan, price, kind, latitude, longitude = row
+    return {
+        'id': pk,
+        'rating': _quantize(rating, 3),
+        'images': images.get(pk, []),
+        'bakery': bakery,
+        'city': city,
+        'picture': picture,
+        'vegan': vegan,
+        'price': '{:f}'.format(_quantize(price, 5)),
+        'kind': kind,
+        'latitude': latitude,
+        'longitude': longitude,
+    }
+
+
+def comment_row_to_dict(row):
+    """Build a CommentSerializer-equivalent dict from a COMMENT_VALUE_FIELDS tuple."""
+    comment, rating, date, name, gradde, mandelmassa, lock, helhet, bulle = row
+    return {
+        'comment': comment,
+        'rating': rating,
+        'date': date.isoformat() if date is not None else None,
+        'name': name,
+        'gradde': gradde,
+        'mandelmassa': mandelmassa,
+        'lock': lock,
+        'helhet': helhet,
+        'bulle': bulle,
+    }
+
+
+def _semla_images(semlor):
+    return (
+        SemlaImage.objects.filter(semla_id__in=semlor.values('pk'))
+        .order_by('created_at')
+        .values_list('semla_id', 'id', 'image_url')
+    )
+
+
+@timed_function('render')
+def semla_list_payload(semlor):
+    """
+    Serialize a Semla queryset like SemlaSerializer(semlor, many=True).data.
+    Uses two queries regardless of the number of semlor or images.
+    """
+    images = images_by_semla(_semla_images(semlor))
+    return [semla_row_to_dict(row, images) for row in semlor.values_list(*SEMLA_VALUE_FIELDS)]
+
+
+@timed_function('render')
+def comment_list_payload(comments):
+    """Serialize a Ratings queryset like CommentSerializer(comments, many=True).data."""
+    return [comment_row_to_dict(row) for row in comments.values_list(*COMMENT_VALUE_FIELDS)]
+
+
+async def asemla_list_payload(semlor):
+    """Async version of semla_list_payload using the async ORM."""
+    images = images_by_semla([row async for row in _semla_images(semlor)])
+    return [semla_row_to_dict(row, images) async for row in semlor.values_list(*SEMLA_VALUE_FIELDS)]
+
+
+async def acomment_list_payload(comments):
+    """Async version of comment_list_payload using the async ORM."""
+    return [comment_row_to_dict(row) async for row in comments.values_list(*COMMENT_VALUE_FIELDS)]
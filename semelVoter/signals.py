@@ -0,0 +1,62 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Semla, Ratings, SemlaImage, SemlaDailyRating
+from .search import SEARCH_FIELDS, index_semla
+from .snapshot import schedule_snapshot
+
+
+@receiver(post_save, sender=Semla)
+def update_search_index(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Keep the trigram search index in sync when searchable fields change."""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    index_semla(instance)
+
+
+@receiver(post_save, sender=Ratings)
+@receiver(post_save, sender=SemlaImage)
+@receiver(post_delete, sender=Ratings)
+@receiver(post_delete, sender=SemlaImage)
+def bump_semla_version(sender, instance, raw=False, origin=None, **kwargs):
+    """Invalidate cached semla representations when a rating or image changes."""
+    if raw or _deleted_with_semla(origin):
+        return
+    Semla.bump_version(instance.semla_id)
+
+
+@receiver(post_save, sender=Semla)
+@receiver(post_save, sender=SemlaImage)
+@receiver(post_delete, sender=Semla)
+@receiver(post_delete, sender=SemlaImage)
+def refresh_snapshot(sender, instance, raw=False, origin=None, **kwargs):
+    """Rewrite the catalogue snapshot after semlor, their ratings or images change."""
+    if raw or (sender is SemlaImage and _deleted_with_semla(origin)):
+        return
+    schedule_snapshot()
+
+
+@receiver(post_save, sender=Ratings)
+def add_rating_to_rollup(sender, instance, created, raw=False, **kwargs):
+    """Count a new rating in its daily rollup; edited ratings rebuild the semla's rollups."""
+    if raw:
+        return
+    if created:
+        SemlaDailyRating.record(instance)
+    else:
+        SemlaDailyRating.rebuild(instance.semla_id)
+
+
+@receiver(post_delete, sender=Ratings)
+def remove_rating_from_rollup(sender, instance, origin=None, **kwargs):
+    """Take a deleted rating out of its daily rollup."""
+    if _deleted_with_semla(origin):
+        return
+    SemlaDailyRating.record(instance, sign=-1)
+
+
+def _deleted_with_semla(origin):
+    """Rows removed by deleting their Semla have nothing left to update."""
+    return isinstance(origin, Semla) or (isinstance(origin, QuerySet) and origin.model is Semla)
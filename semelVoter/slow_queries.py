@@ -0,0 +1,93 @@
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+import sqlparse
+from django.conf import settings
+from sqlparse import tokens as T
+
+logger = logging.getLogger(__name__)
+
+# Distinct fingerprints kept per process, later ones are only logged
+MAX_FINGERPRINTS = 500
+
+LITERALS = (T.Literal.Number, T.Literal.String.Single, T.Name.Placeholder)
+VALUE_LIST = re.compile(r'\(\?(?:, \?)*\)(?:, \(\?(?:, \?)*\))*')
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql: str) -> str:
+    """
+    Normalize a statement so that queries differing only in their values group together.
+    Literals and placeholders become ?, and lists of them, as in IN (...) or VALUES, (...).
+    """
+    parts = []
+    for token in sqlparse.parse(sql)[0].flatten():
+        if token.ttype in T.Comment:
+            continue
+        if token.is_whitespace:
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        elif any(token.ttype in literal for literal in LITERALS):
+            parts.append('?')
+        elif token.is_keyword:
+            parts.append(token.normalized)
+        else:
+            parts.append(token.value)
+    return VALUE_LIST.sub('(...)', ''.join(parts).strip())
+
+
+def record(sql: str, duration_ms: float):
+    """Add a slow statement to the per-fingerprint totals."""
+    key = fingerprint(sql)
+    logger.warning(f"Slow query ({duration_ms:.1f} ms): {key}")
+    with _stats_lock:
+        entry = _stats.get(key)
+        if entry is None:
+            if len(_stats) >= MAX_FINGERPRINTS:
+                return
+            entry = _stats[key] = {'fingerprint': key, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+        entry['count'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+
+
+def slow_query_stats(limit=None):
+    """Get the recorded fingerprints of this process, most total time first."""
+    with _stats_lock:
+        entries = [dict(entry) for entry in _stats.values()]
+    entries.sort(key=lambda entry: entry['total_ms'], reverse=True)
+    for entry in entries:
+        entry['total_ms'] = round(entry['total_ms'], 2)
+        entry['max_ms'] = round(entry['max_ms'], 2)
+        entry['mean_ms'] = round(entry['total_ms'] / entry['count'], 2)
+    return entries[:limit]
+
+
+def reset_slow_query_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def slow_query_logger(execute, sql, params, many, context):
+    """Database execute_wrapper recording statements slower than SLOW_QUERY_THRESHOLD_MS."""
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= threshold:
+            record(sql, duration_ms)
+
+
+def install_slow_query_logger(sender, connection, **kwargs):
+    """connection_created receiver adding slow_query_logger to new database connections."""
+    if slow_query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_logger)
@@ -0,0 +1,239 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from .models import Semla
+from .routers import use_primary
+from .serializers import semla_list_payload
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always written
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = 'semlor'
+MANIFEST_NAME = 'manifest.json'
+# Versioned snapshots kept on disk so clients holding an older URL can finish downloading
+KEEP_VERSIONS = 3
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+
+def _atomic_write(path, data: bytes):
+    """Write data to a temp file in the same directory, then rename it over path."""
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _write_with_variants(path, body: bytes):
+    """Write a file plus its .gz/.br variants. Variants go first so WhiteNoise always finds them."""
+    _atomic_write(path + '.gz', gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))
+    if brotli is not None:
+        _atomic_write(path + '.br', brotli.compress(body, quality=BROTLI_QUALITY))
+    _atomic_write(path, body)
+
+
+# Changes with every commit that changes the list payload: saves of a semla and its
+# ratings and images bump Semla.version, creates raise the highest id, deletes lower the count
+_CATALOGUE_AGGREGATES = {'count': Count('id'), 'last': Max('id'), 'versions': Sum('version')}
+
+
+def _catalogue_key(row):
+    return f"{row['count']}.{row['last'] or 0}.{row['versions'] or 0}"
+
+
+def catalogue_version():
+    """
+    Get the version of the catalogue in the database, shared by all workers.
+    Unlike the snapshot version it is current as soon as a change commits.
+    """
+    return _catalogue_key(Semla.objects.aggregate(**_CATALOGUE_AGGREGATES))
+
+
+async def acatalogue_version():
+    """Async version of catalogue_version."""
+    return _catalogue_key(await Semla.objects.aaggregate(**_CATALOGUE_AGGREGATES))
+
+
+def snapshot_url(version):
+    return f"{settings.SNAPSHOT_URL}{SNAPSHOT_NAME}.{version}.json"
+
+
+def read_manifest():
+    """Get the manifest of the current snapshot, or None if none was written yet."""
+    try:
+        with open(os.path.join(settings.SNAPSHOT_ROOT, MANIFEST_NAME), 'rb') as manifest:
+            return json.load(manifest)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def current_version():
+    """Get the version of the current snapshot, or None if snapshots are disabled or missing."""
+    if not settings.SNAPSHOT_ENABLED:
+        return None
+    manifest = read_manifest()
+    return manifest['version'] if manifest else None
+
+
+def read_snapshot(version):
+    """Get the body of a versioned snapshot, or None if it was pruned."""
+    try:
+        with open(os.path.join(settings.SNAPSHOT_ROOT, f"{SNAPSHOT_NAME}.{version}.json"), 'rb') as snapshot:
+            return snapshot.read()
+    except FileNotFoundError:
+        return None
+
+
+def read_current_snapshot(catalogue):
+    """
+    Get the snapshot body if it was rendered from this catalogue version, or None if
+    snapshots are disabled or the background writer has not caught up yet.
+    """
+    if not settings.SNAPSHOT_ENABLED:
+        return None
+    manifest = read_manifest()
+    if not manifest or manifest.get('catalogue') != catalogue:
+        return None
+    return read_snapshot(manifest['version'])
+
+
+def write_snapshot():
+    """
+    Render the full catalogue, exactly as GET /api/semlor returns it, to SNAPSHOT_ROOT.
+
+    Writes an immutable semlor.<version>.json, a stable semlor.json pointing at the
+    latest data and manifest.json, each pre-compressed with gzip and brotli.
+    Unchanged catalogues are detected by content hash and not rewritten.
+
+    Returns:
+        The manifest dict
+    """
+    root = str(settings.SNAPSHOT_ROOT)
+    os.makedirs(root, exist_ok=True)
+
+    # Read from the primary, a lagging replica would hash a missing change into the snapshot.
+    # The catalogue version is read first, so it is never newer than the rendered body.
+    with use_primary():
+        catalogue = catalogue_version()
+        payload = semla_list_payload(Semla.objects.all())
+    body = JSONRenderer().render(payload)
+    version = hashlib.sha256(body).hexdigest()[:16]
+
+    current = read_manifest()
+    if current and current.get('version') == version and current.get('catalogue') == catalogue:
+        return current
+
+    if not current or current.get('version') != version:
+        _write_with_variants(os.path.join(root, f"{SNAPSHOT_NAME}.{version}.json"), body)
+        _write_with_variants(os.path.join(root, f"{SNAPSHOT_NAME}.json"), body)
+    manifest = {
+        'version': version,
+        'catalogue': catalogue,
+        'url': snapshot_url(version),
+        'latest_url': f"{settings.SNAPSHOT_URL}{SNAPSHOT_NAME}.json",
+        'count': len(payload),
+        'generated_at': timezone.now().isoformat(),
+    }
+    _atomic_write(os.path.join(root, MANIFEST_NAME), json.dumps(manifest).encode('utf-8'))
+    _prune_versions(root)
+    return manifest
+
+
+def _prune_versions(root):
+    """Delete all but the newest KEEP_VERSIONS versioned snapshots."""
+    prefix = f"{SNAPSHOT_NAME}."
+    versioned = [
+        entry for entry in os.scandir(root)
+        if entry.name.startswith(prefix) and entry.name.endswith('.json')
+        and entry.name != f"{SNAPSHOT_NAME}.json"
+    ]
+    versioned.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versioned[KEEP_VERSIONS:]:
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.unlink(entry.path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+# Set when a change was scheduled, so the many callbacks of one commit render only once
+_dirty = threading.Event()
+_writer_lock = threading.Lock()
+_writer = None
+
+
+def _write_pending():
+    if not _dirty.is_set():
+        return
+    _dirty.clear()
+    try:
+        write_snapshot()
+    except Exception as e:
+        logger.error(f"Failed to write catalogue snapshot: {e}")
+
+
+def _write_in_background():
+    """Rewrite the snapshot every SNAPSHOT_DELAY seconds until no more changes come in."""
+    global _writer
+    try:
+        while True:
+            time.sleep(settings.SNAPSHOT_DELAY)
+            with _writer_lock:
+                if not _dirty.is_set():
+                    _writer = None
+                    return
+            _write_pending()
+    finally:
+        connection.close()
+
+
+def _regenerate():
+    global _writer
+    if settings.SNAPSHOT_DELAY <= 0:
+        _write_pending()
+        return
+    # Rendering the catalogue takes long on a big catalogue, so writes are gathered and
+    # rendered by one thread per process instead of inside every write request
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_in_background, name='snapshot-writer', daemon=True)
+            _writer.start()
+
+
+def schedule_snapshot():
+    """Regenerate the snapshot once the current transaction commits."""
+    if settings.SNAPSHOT_ENABLED:
+        _dirty.set()
+        transaction.on_commit(_regenerate)
+
+
+def refresh_stale_snapshot(manifest):
+    """
+    Regenerate the snapshot if it is behind the database, e.g. because the worker that
+    scheduled the rewrite exited first.
+    """
+    if settings.SNAPSHOT_ENABLED and manifest.get('catalogue') != catalogue_version():
+        _dirty.set()
+        _regenerate()
@@ -0,0 +1,99 @@
+import os
+import threading
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from django.conf import settings
+from storages.backends.s3boto3 import S3Boto3Storage
+from .utils import CONTENT_TYPE_TO_EXT, IMAGE_PREFIX
+
+# One S3 client per process, shared by all threads and requests. The botocore client is
+# thread safe and owns the connection pool, which is then sized once for the whole process
+# instead of once per thread. boto3 resources are not thread safe, so every thread wraps
+# the shared client in a resource of its own.
+_clients = {}
+_clients_lock = threading.Lock()
+
+EXT_TO_CONTENT_TYPE = {ext: content_type for content_type, ext in CONTENT_TYPE_TO_EXT.items()}
+
+
+def client_config(addressing_style=None, signature_version=None, proxies=None):
+    """botocore Config with the pool size, timeouts and retries from the AWS_S3_* settings."""
+    return Config(
+        s3={'addressing_style': addressing_style},
+        signature_version=signature_version,
+        proxies=proxies,
+        max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.AWS_S3_CONNECT_TIMEOUT,
+        read_timeout=settings.AWS_S3_READ_TIMEOUT,
+        retries={'total_max_attempts': settings.AWS_S3_MAX_ATTEMPTS, 'mode': settings.AWS_S3_RETRY_MODE},
+    )
+
+
+def transfer_config():
+    """TransferConfig deciding when and how uploads are split into multipart uploads."""
+    return TransferConfig(
+        multipart_threshold=settings.AWS_S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=settings.AWS_S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=settings.AWS_S3_MAX_CONCURRENCY,
+        use_threads=settings.AWS_S3_MAX_CONCURRENCY > 1,
+    )
+
+
+class S3Storage(S3Boto3Storage):
+    """
+    S3Boto3Storage configured from the AWS_S3_* settings that reuses one client and its
+    connection pool per worker process. Explicit client_config/transfer_config options still win.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if 'client_config' not in kwargs and settings.AWS_S3_CLIENT_CONFIG is None:
+            self.client_config = client_config(self.addressing_style, self.signature_version, self.proxies)
+        if 'transfer_config' not in kwargs and settings.AWS_S3_TRANSFER_CONFIG is None:
+            self.transfer_config = transfer_config()
+
+    def _client(self):
+        # Keyed by pid, as connections must not be inherited by forked gunicorn workers
+        key = (os.getpid(), self.endpoint_url, self.region_name, self.access_key)
+        client = _clients.get(key)
+        if client is None:
+            with _clients_lock:
+                client = _clients.get(key)
+                if client is None:
+                    client = _clients[key] = self._create_session().client(
+                        's3',
+                        region_name=self.region_name,
+                        use_ssl=self.use_ssl,
+                        endpoint_url=self.endpoint_url,
+                        config=self.client_config,
+                        verify=self.verify,
+                    )
+        return client
+
+    @property
+    def connection(self):
+        client = self._client()
+        resource = getattr(self._connections, 'connection', None)
+        if resource is None or resource.meta.client is not client:
+            resource = self._create_session().resource(
+                's3', region_name=self.region_name, endpoint_url=self.endpoint_url, config=self.client_config,
+            )
+            resource.meta.client = client
+            self._connections.connection = resource
+        return resource
+
+    def get_object_parameters(self, name):
+        """
+        Images are stored under a new UUID and never change, so caches may keep them forever.
+        Their content type follows from the extension, never from what the client sent.
+        """
+        params = super().get_object_parameters(name)
+        if name.startswith(IMAGE_PREFIX):
+            params.setdefault('CacheControl', settings.IMAGE_CACHE_CONTROL)
+            params.setdefault('ContentType', EXT_TO_CONTENT_TYPE.get(name.rsplit('.', 1)[-1], 'image/jpeg'))
+        return params
+
+    @property
+    def bucket(self):
+        # Not cached on the storage like in S3Boto3Storage, so it always uses this thread's resource
+        return self.connection.Bucket(self.bucket_name)
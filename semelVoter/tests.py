@@ -6,6 +6,23 @@ from semelVoter.serializers import CreateSemlaSerializer
 from semelVoter.models import Semla, SemlaImage, Ratings
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Primary keys are reused between tests, so cached responses must not leak"""
+    from django.core.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def snapshot_root(settings, tmp_path):
+    """Keep catalogue snapshots of a local run out of the tests, and write them on commit"""
+    settings.SNAPSHOT_ROOT = tmp_path / 'snapshots'
+    settings.SNAPSHOT_DELAY = 0
+    return settings.SNAPSHOT_ROOT
+
+
 @pytest.mark.django_db
 class TestCreateSemlaSerializer:
     """Test suite for CreateSemlaSerializer validation"""
@@ -61,8 +78,9 @@ class TestCreateSemlaSerializer:
         semla = serializer.save()
         assert semla.vegan is False
         
-        # With vegan=True
+        # With vegan=True (a different bakery, the same one would return the existing semla)
         data['vegan'] = True
+        data['bakery'] = 'Test Vegan'
         serializer = CreateSemlaSerializer(data=data)
         assert serializer.is_valid()
         semla = serializer.save()
@@ -251,7 +269,9 @@ class TestCreateSemlaEndpoint:
         
         # First 5 should succeed
         for i in range(5):
-            response = client.post('/api/semlor/create', data, content_type='application/json')
+            response = client.post(
+                '/api/semlor/create', {**data, 'bakery': f'Test Bakery {i}'}, content_type='application/json'
+            )
             assert response.status_code == 201, f"Request {i+1} should succeed"
         
         # 6th should be rate limited
@@ -1108,11 +1128,1839 @@ class TestRatingsNameField:
 
     def test_ratings_name_max_length(self):
         """Test that name field has reasonable max length"""
-        semla = Semla.objects.create(
+        Semla.objects.create(
             bakery='Test Bakery',
             city='Stockholm',
             price='45.00',
             kind='Traditional'
         )
         name_field = Ratings._meta.get_field('name')
-        assert name_field.max_length >= 100
\ No newline at end of file
+        assert name_field.max_length >= 100
+
+@pytest.mark.django_db
+class TestSemlaSearch:
+    """Test suite for the trigram search index and GET /api/semlor/search"""
+
+    def test_normalize_strips_diacritics_and_case(self):
+        """Test that Swedish diacritics and case are folded away"""
+        from semelVoter.search import normalize
+        assert normalize('Linköping') == 'linkoping'
+        assert normalize('  Åhléns  KONDITORI ') == 'ahlens konditori'
+
+    def test_index_maintained_on_save(self):
+        """Test that trigram rows follow the searchable fields"""
+        from semelVoter.models import SemlaSearchTrigram
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        assert SemlaSearchTrigram.objects.filter(semla=semla, trigram='mel').exists()
+
+        semla.bakery = 'Lanemos'
+        semla.save()
+        assert not SemlaSearchTrigram.objects.filter(semla=semla, trigram='mel').exists()
+        assert SemlaSearchTrigram.objects.filter(semla=semla, trigram='lan').exists()
+
+    def test_search_handles_diacritics_and_typos(self, client):
+        """Test that 'linkopng' finds semlor in Linköping"""
+        Semla.objects.create(bakery='Melins Café', city='Linköping', price='43.00', kind='Classic')
+        Semla.objects.create(bakery='Petrus', city='Stockholm', price='55.00', kind='Vegan')
+
+        response = client.get('/api/semlor/search', {'q': 'linkopng'})
+
+        assert response.status_code == 200
+        results = response.json()
+        assert [r['bakery'] for r in results] == ['Melins Café']
+        assert 0 < results[0]['score'] <= 1
+
+    def test_search_ranks_best_match_first(self, client):
+        """Test that the closest match is ranked first"""
+        Semla.objects.create(bakery='Bageri Normandie', city='Linköping', price='55.00', kind='Classic')
+        Semla.objects.create(bakery='Normans Bageri', city='Malmö', price='45.00', kind='Classic')
+
+        response = client.get('/api/semlor/search', {'q': 'normandie'})
+
+        assert response.status_code == 200
+        assert response.json()[0]['bakery'] == 'Bageri Normandie'
+
+    def test_search_requires_query(self, client):
+        """Test that a missing or too short query returns 400"""
+        assert client.get('/api/semlor/search').status_code == 400
+        assert client.get('/api/semlor/search', {'q': 'a'}).status_code == 400
+
+    def test_rating_update_does_not_reindex(self, django_assert_num_queries):
+        """Test that saving only the rating skips the search index"""
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        semla.rating = Decimal('4.00')
+        with django_assert_num_queries(1):
+            semla.save(update_fields=['rating'])
+
+
+@pytest.mark.django_db
+class TestSemlaNearby:
+    """Test suite for geohash buckets and GET /api/semlor/nearby"""
+
+    def test_geohash_encode(self):
+        """Test geohash encoding against a known reference value"""
+        from semelVoter.geo import encode
+        assert encode(57.64911, 10.40744, precision=11) == 'u4pruydqqvj'
+
+    def test_geohash_set_on_save(self):
+        """Test that the geohash follows latitude/longitude and is cleared without them"""
+        semla = Semla.objects.create(
+            bakery='Melins', city='Linköping', price='43.00', kind='Classic',
+            latitude=58.4108, longitude=15.6214,
+        )
+        assert len(semla.geohash) == 8
+        assert semla.geohash.startswith('u6')
+
+        semla.latitude = None
+        semla.longitude = None
+        semla.save()
+        semla.refresh_from_db()
+        assert semla.geohash == ''
+
+    def test_nearby_sorted_by_distance_within_radius(self, client):
+        """Test that only semlor inside the radius are returned, closest first"""
+        Semla.objects.create(bakery='Far', city='Linköping', price='45.00', kind='Classic',
+                             latitude=58.4200, longitude=15.6214)
+        Semla.objects.create(bakery='Near', city='Linköping', price='45.00', kind='Classic',
+                             latitude=58.4110, longitude=15.6214)
+        Semla.objects.create(bakery='Stockholm', city='Stockholm', price='45.00', kind='Classic',
+                             latitude=59.3293, longitude=18.0686)
+        Semla.objects.create(bakery='Nowhere', city='Linköping', price='45.00', kind='Classic')
+
+        response = client.get('/api/semlor/nearby', {'lat': 58.4108, 'lon': 15.6214, 'radius': 2})
+
+        assert response.status_code == 200
+        results = response.json()
+        assert [r['bakery'] for r in results] == ['Near', 'Far']
+        assert results[0]['distance_km'] < results[1]['distance_km']
+        assert 'geohash' not in results[0]
+
+    def test_nearby_finds_semla_across_cell_border(self):
+        """Test that a semla just across a geohash cell border is found"""
+        from semelVoter.geo import cell_size
+        height, _ = cell_size(5)
+        border = 58.0 + height * 2  # Exact cell boundary at precision 5
+        Semla.objects.create(bakery='Other side', city='X', price='45.00', kind='Classic',
+                             latitude=border + 0.001, longitude=15.0)
+
+        results = Semla.nearby(border - 0.001, 15.0, radius_km=1)
+        assert [semla.bakery for semla, _ in results] == ['Other side']
+
+    def test_prefix_range_independent_of_collation(self):
+        """Test that the cell ranges match prefixes when punctuation sorts before letters, as in MariaDB"""
+        import itertools
+        from semelVoter.geo import BASE32, prefix_end
+        assert prefix_end('u6b') == 'u6c'
+        assert prefix_end('u69') == 'u6b'
+        assert prefix_end('u6zz') == 'u7'
+        assert prefix_end('zz') is None
+
+        def unicode_ci(value):
+            # Like utf8mb4_uca1400_ai_ci: punctuation first, then digits, then letters
+            return [(char.isalnum(), char.isalpha(), char.casefold()) for char in value]
+        geohashes = [''.join(chars) for chars in itertools.product('09bhuz', repeat=3)]
+        for cell in ('u', 'u9', 'uz', 'zz', 'bz9'):
+            end = prefix_end(cell)
+            assert set(end or '') <= set(BASE32)
+            in_range = {
+                geohash for geohash in geohashes
+                if unicode_ci(cell) <= unicode_ci(geohash) and (end is None or unicode_ci(geohash) < unicode_ci(end))
+            }
+            assert in_range == {geohash for geohash in geohashes if geohash.startswith(cell)}
+
+    def test_nearby_validates_parameters(self, client):
+        """Test that missing or out of range parameters return 400"""
+        assert client.get('/api/semlor/nearby', {'lat': 58.4}).status_code == 400
+        assert client.get('/api/semlor/nearby', {'lat': 'x', 'lon': 15}).status_code == 400
+        assert client.get('/api/semlor/nearby', {'lat': 91, 'lon': 15}).status_code == 400
+        assert client.get('/api/semlor/nearby', {'lat': 58, 'lon': 15, 'radius': 500}).status_code == 400
+
+    def test_create_semla_requires_both_coordinates(self, client):
+        """Test that latitude without longitude is rejected on creation"""
+        data = {
+            'bakery': 'Half Located', 'city': 'Stockholm', 'price': '45.00',
+            'kind': 'Traditional', 'latitude': 59.3,
+        }
+        response = client.post('/api/semlor/create', data, content_type='application/json')
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestSemlaDetail:
+    """Test suite for GET /api/semlor/<pk>"""
+
+    def _rate(self, semla, value, comment=None, **kwargs):
+        return Ratings.objects.create(
+            semla=semla, rating=value, comment=comment,
+            gradde=value, mandelmassa=value, lock=value, helhet=value, bulle=value, **kwargs
+        )
+
+    def test_detail_includes_images_stats_and_recent_comments(self, client):
+        """Test that the detail payload embeds images, aggregates, histogram and newest comments"""
+        import datetime
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        SemlaImage.objects.create(semla=semla, image_url='https://example.com/a.jpg')
+        self._rate(semla, 5, 'Old', date=datetime.date(2026, 2, 1))
+        self._rate(semla, 3, 'New', date=datetime.date(2026, 2, 10))
+        self._rate(semla, 3)
+
+        response = client.get(f'/api/semlor/{semla.id}', {'comments': 1})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['bakery'] == 'Melins'
+        assert len(data['images']) == 1
+        assert data['rating_count'] == 3
+        assert data['category_averages']['gradde'] == pytest.approx(3.67)
+        assert data['histogram'] == {'1': 0, '2': 0, '3': 2, '4': 0, '5': 1}
+        assert [c['comment'] for c in data['recent_comments']] == ['New']
+
+    def test_detail_uses_fixed_number_of_queries(self, client, django_assert_num_queries):
+        """Test that query count does not grow with images or comments"""
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        for i in range(10):
+            SemlaImage.objects.create(semla=semla, image_url=f'https://example.com/{i}.jpg')
+            self._rate(semla, 4, f'Comment {i}')
+
+        # version lookup, semla, images, recent comments, aggregates
+        with django_assert_num_queries(5):
+            response = client.get(f'/api/semlor/{semla.id}')
+        assert len(response.json()['recent_comments']) == 5
+
+    def test_detail_cached_per_version(self, client, django_assert_num_queries):
+        """Test that repeated reads are served from cache until the semla changes"""
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        client.get(f'/api/semlor/{semla.id}')
+
+        with django_assert_num_queries(1):
+            response = client.get(f'/api/semlor/{semla.id}')
+        assert response.json()['rating_count'] == 0
+
+        self._rate(semla, 4, 'Nice')
+        response = client.get(f'/api/semlor/{semla.id}')
+        assert response.json()['rating_count'] == 1
+
+    def test_detail_etag_not_modified(self, client):
+        """Test that a matching If-None-Match returns 304 and a change invalidates it"""
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        etag = client.get(f'/api/semlor/{semla.id}')['ETag']
+
+        response = client.get(f'/api/semlor/{semla.id}', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+        SemlaImage.objects.create(semla=semla, image_url='https://example.com/a.jpg')
+        response = client.get(f'/api/semlor/{semla.id}', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+
+    def test_detail_not_found(self, client):
+        """Test that an unknown semla returns 404"""
+        assert client.get('/api/semlor/999999').status_code == 404
+
+
+@pytest.mark.django_db
+class TestSemlaRatingStats:
+    """Test suite for daily rating rollups and GET /api/semlor/<pk>/stats"""
+
+    def _rate(self, semla, date, gradde=4, mandelmassa=4, lock=4, helhet=4, bulle=4):
+        scores = [gradde, mandelmassa, lock, helhet, bulle]
+        return Ratings.objects.create(
+            semla=semla, rating=round(sum(scores) / 5), date=date,
+            gradde=gradde, mandelmassa=mandelmassa, lock=lock, helhet=helhet, bulle=bulle,
+        )
+
+    def test_rollup_updated_incrementally(self):
+        """Test that each rating write adds to its day's rollup"""
+        import datetime
+        from semelVoter.models import SemlaDailyRating
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        day = datetime.date(2026, 2, 17)
+        self._rate(semla, day, gradde=5)
+        self._rate(semla, day, gradde=3)
+        Ratings.objects.create(semla=semla, rating=2, date=day)  # Legacy rating
+
+        rollup = SemlaDailyRating.objects.get(semla=semla, date=day)
+        assert rollup.count == 3
+        assert rollup.category_count == 2
+        assert rollup.sum_gradde == 8
+        assert rollup.legacy_rating_sum == 2
+        assert (rollup.histogram_2, rollup.histogram_4) == (1, 2)
+
+    def test_rollup_matches_rebuild_after_delete(self):
+        """Test that deleting a rating leaves the same rollup as a full rebuild"""
+        import datetime
+        from semelVoter.models import SemlaDailyRating
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        day = datetime.date(2026, 2, 17)
+        self._rate(semla, day, gradde=5)
+        self._rate(semla, day, gradde=1, bulle=2).delete()
+
+        incremental = SemlaDailyRating.objects.values().get(semla=semla, date=day)
+        SemlaDailyRating.rebuild(semla.id)
+        rebuilt = SemlaDailyRating.objects.values().get(semla=semla, date=day)
+        incremental.pop('id'), rebuilt.pop('id')
+        assert incremental == rebuilt
+
+    def test_rate_endpoint_updates_rollup(self, client):
+        """Test that POST /api/rate/<pk> feeds the rollup"""
+        from semelVoter.models import SemlaDailyRating
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        scores = {'gradde': 5, 'mandelmassa': 4, 'lock': 4, 'helhet': 5, 'bulle': 4}
+        response = client.post(f'/api/rate/{semla.id}', scores, content_type='application/json')
+
+        assert response.status_code == 200
+        assert SemlaDailyRating.objects.get(semla=semla).count == 1
+
+    def test_stats_daily_and_weekly_series(self, client):
+        """Test daily and weekly series and the histogram"""
+        import datetime
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        self._rate(semla, datetime.date(2026, 2, 16), gradde=5, bulle=5)  # Monday
+        self._rate(semla, datetime.date(2026, 2, 18))  # Wednesday, same week
+        self._rate(semla, datetime.date(2026, 2, 23), gradde=1, mandelmassa=1, lock=1)  # Next Monday
+
+        daily = client.get(f'/api/semlor/{semla.id}/stats').json()
+        assert [point['date'] for point in daily['series']] == ['2026-02-16', '2026-02-18', '2026-02-23']
+        assert daily['series'][0]['average'] == 4.4
+        assert daily['histogram'] == {'1': 0, '2': 1, '3': 0, '4': 2, '5': 0}
+        assert daily['rating_count'] == 3
+
+        weekly = client.get(f'/api/semlor/{semla.id}/stats', {'interval': 'week'}).json()
+        assert [point['date'] for point in weekly['series']] == ['2026-02-16', '2026-02-23']
+        assert weekly['series'][0]['count'] == 2
+        assert weekly['series'][0]['category_averages']['gradde'] == 4.5
+
+    def test_stats_does_not_scan_ratings(self, client):
+        """Test that the stats endpoint reads rollups only"""
+        import datetime
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        for _ in range(20):
+            self._rate(semla, datetime.date(2026, 2, 16))
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            client.get(f'/api/semlor/{semla.id}/stats')
+        assert not any('semelvoter_ratings' in q['sql'].lower() for q in queries.captured_queries)
+
+    def test_stats_invalid_interval_and_missing_semla(self, client):
+        """Test that an unknown interval returns 400 and an unknown semla 404"""
+        semla = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        assert client.get(f'/api/semlor/{semla.id}/stats', {'interval': 'year'}).status_code == 400
+        assert client.get('/api/semlor/999999/stats').status_code == 404
+
+
+@pytest.mark.django_db
+class TestBulkCreateSemla:
+    """Test suite for POST /api/semlor/bulk"""
+
+    @pytest.fixture
+    def staff_client(self, client, django_user_model):
+        user = django_user_model.objects.create_user('onboarding', password='secret')
+        client.force_login(user)
+        return client
+
+    def test_requires_authentication(self, client):
+        """Test that anonymous bulk creation is rejected"""
+        response = client.post('/api/semlor/bulk', [], content_type='application/json')
+        assert response.status_code == 403
+
+    def test_bulk_create_json_array(self, staff_client):
+        """Test that valid items are created, duplicates and invalid items reported per item"""
+        Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        items = [
+            {'bakery': 'Lanemos', 'city': 'Linköping', 'price': '54.00', 'kind': 'Classic'},
+            {'bakery': 'Melins', 'city': 'Linköping', 'price': '43.00', 'kind': 'Classic'},
+            {'bakery': 'Linds', 'city': 'Linköping', 'price': '-1', 'kind': 'Classic'},
+            {'bakery': ' Lanemos ', 'city': 'Linköping', 'price': '54.00', 'kind': 'Classic'},
+        ]
+
+        response = staff_client.post('/api/semlor/bulk', items, content_type='application/json')
+
+        assert response.status_code == 201
+        data = response.json()
+        assert (data['created'], data['duplicate'], data['invalid']) == (1, 2, 1)
+        statuses = [result['status'] for result in data['results']]
+        assert statuses == ['created', 'duplicate', 'invalid', 'duplicate']
+        assert 'price' in data['results'][2]['errors']
+        assert data['results'][3]['id'] == data['results'][0]['id']
+        assert Semla.objects.filter(bakery='Lanemos').count() == 1
+
+    def test_bulk_create_ndjson_stream(self, staff_client):
+        """Test that NDJSON input is accepted and created semlor are searchable"""
+        body = (
+            '{"bakery": "Petrus", "city": "Malmö", "price": "55.00", "kind": "Vegan", "vegan": true}\n'
+            '\n'
+            '{"bakery": "Hollandia", "city": "Malmö", "price": "49.00", "kind": "Classic",'
+            ' "latitude": 55.6, "longitude": 13.0}\n'
+        )
+        response = staff_client.post('/api/semlor/bulk', body, content_type='application/x-ndjson')
+
+        assert response.status_code == 201
+        assert response.json()['created'] == 2
+        assert Semla.objects.get(bakery='Hollandia').geohash != ''
+        assert client_search(staff_client, 'malmo') == {'Petrus', 'Hollandia'}
+
+    def test_bulk_create_inserts_in_batches(self, staff_client, django_assert_max_num_queries):
+        """Test that items are inserted in batches rather than one query per item"""
+        items = [
+            {'bakery': f'Bageri {i}', 'city': 'Umeå', 'price': '45.00', 'kind': 'Classic'}
+            for i in range(200)
+        ]
+        with django_assert_max_num_queries(30):
+            response = staff_client.post('/api/semlor/bulk', items, content_type='application/json')
+        assert response.json()['created'] == 200
+
+    def test_bulk_create_rejects_bad_payloads(self, staff_client):
+        """Test that non-list payloads and malformed NDJSON return 400"""
+        response = staff_client.post('/api/semlor/bulk', {'bakery': 'x'}, content_type='application/json')
+        assert response.status_code == 400
+        response = staff_client.post('/api/semlor/bulk', '{"bakery": \n', content_type='application/x-ndjson')
+        assert response.status_code == 400
+
+
+def client_search(client, query):
+    """Return the set of bakeries found by the search endpoint"""
+    return {result['bakery'] for result in client.get('/api/semlor/search', {'q': query}).json()}
+
+
+@pytest.mark.django_db
+class TestSemlaNaturalKey:
+    """Test suite for the (bakery, city, kind) natural key"""
+
+    def test_natural_key_is_normalized(self):
+        """Test that case and surrounding/inner whitespace do not change the key"""
+        from semelVoter.models import make_natural_key
+        assert make_natural_key('Melins Café', 'Linköping', 'Classic') == \
+            make_natural_key('  melins   CAFÉ ', 'LINKÖPING', 'classic ')
+        assert make_natural_key('Melins', 'Linköping', 'Classic') != \
+            make_natural_key('Melins', 'Linköping', 'Vegan')
+
+    def test_unique_constraint(self):
+        """Test that the database rejects a second semla with the same normalized key"""
+        from django.db import IntegrityError
+        Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        with pytest.raises(IntegrityError):
+            Semla.objects.create(bakery='MELINS ', city='linköping', price='50.00', kind='classic')
+
+    def test_create_or_get_returns_existing(self, django_assert_num_queries):
+        """Test the insert-or-return-existing fast path"""
+        semla, created = Semla.create_or_get(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        assert created
+
+        with django_assert_num_queries(1):
+            again, created = Semla.create_or_get(bakery='melins', city='Linköping', price='43.00', kind='Classic')
+        assert not created
+        assert again.pk == semla.pk
+
+    def test_create_endpoint_returns_existing_semla(self, client):
+        """Test that creating a duplicate returns the existing semla with 200"""
+        data = {'bakery': 'Melins', 'city': 'Linköping', 'price': '43.00', 'kind': 'Classic'}
+        first = client.post('/api/semlor/create', data, content_type='application/json')
+        second = client.post(
+            '/api/semlor/create', {**data, 'bakery': ' melins '}, content_type='application/json'
+        )
+
+        assert first.status_code == 201
+        assert second.status_code == 200
+        assert second.json()['id'] == first.json()['id']
+        assert 'natural_key' not in second.json()
+        assert Semla.objects.count() == 1
+
+    def test_migration_merges_duplicates(self):
+        """Test that the data migration folds duplicates into the oldest semla"""
+        import datetime
+        from importlib import import_module
+        from django.apps import apps
+        from semelVoter.models import SemlaDailyRating
+        merge_duplicates = import_module('semelVoter.migrations.0022_semla_natural_key').merge_duplicates
+
+        keep = Semla.objects.create(bakery='Melins', city='Linköping', price='43.00', kind='Classic')
+        duplicate = Semla.objects.create(bakery='Melins2', city='Linköping', price='43.00', kind='Classic')
+        # Simulate rows inserted before the unique index existed
+        Semla.objects.filter(pk=duplicate.pk).update(bakery='melins ', natural_key='legacy')
+        day = datetime.date(2026, 2, 17)
+        Ratings.objects.create(semla=keep, rating=5, date=day)
+        Ratings.objects.create(semla=duplicate, rating=3, date=day)
+        SemlaImage.objects.create(semla=duplicate, image_url='https://example.com/a.jpg')
+
+        merge_duplicates(apps, None)
+
+        assert list(Semla.objects.values_list('pk', flat=True)) == [keep.pk]
+        keep.refresh_from_db()
+        assert keep.ratings.count() == 2
+        assert keep.images.count() == 1
+        assert keep.rating == Decimal('4.00')
+        assert SemlaDailyRating.objects.get(semla=keep, date=day).count == 2
+
+
+@pytest.mark.django_db
+class TestFastReadSerializers:
+    """Test suite ensuring the hand-written read path matches the DRF serializers"""
+
+    @pytest.fixture
+    def catalogue(self):
+        import datetime
+        first = Semla.objects.create(
+            bakery='Melins Café', city='Linköping', price='39.9', kind='Classic',
+            rating=Decimal('4.33'), latitude=58.41, longitude=15.62,
+        )
+        Semla.objects.create(bakery='Petrus', city='Malmö', price='55', kind='Vegan', vegan=True)
+        SemlaImage.objects.create(semla=first, image_url='https://example.com/1.jpg')
+        SemlaImage.objects.create(semla=first, image_url='https://example.com/2.jpg')
+        Ratings.objects.create(semla=first, rating=4, comment='Gott', name='Anna',
+                               date=datetime.date(2026, 2, 17),
+                               gradde=4, mandelmassa=5, lock=3, helhet=4, bulle=4)
+        Ratings.objects.create(semla=first, rating=2, comment='Legacy', date=datetime.date(2026, 2, 1))
+        return first
+
+    def _render(self, data):
+        from rest_framework.renderers import JSONRenderer
+        return JSONRenderer().render(data)
+
+    def test_semla_list_payload_matches_serializer(self, catalogue):
+        """Test that the fast list payload is identical to SemlaSerializer output"""
+        from semelVoter.serializers import SemlaSerializer, semla_list_payload
+        semlor = Semla.objects.all()
+        expected = SemlaSerializer(semlor, many=True).data
+        actual = semla_list_payload(semlor)
+
+        assert actual == expected
+        assert [list(row) for row in actual] == [list(row) for row in expected]
+        assert self._render(actual) == self._render(expected)
+
+    def test_comment_list_payload_matches_serializer(self, catalogue):
+        """Test that the fast comment payload is identical to CommentSerializer output"""
+        from semelVoter.serializers import CommentSerializer, comment_list_payload
+        comments = Ratings.get_semel_rating(catalogue.id)
+        expected = CommentSerializer(comments, many=True).data
+        actual = comment_list_payload(comments)
+
+        assert actual == expected
+        assert self._render(actual) == self._render(expected)
+
+    def test_list_endpoint_uses_three_queries(self, client, catalogue, django_assert_num_queries):
+        """Test that the list endpoint no longer issues a query per semla for images"""
+        for i in range(10):
+            Semla.objects.create(bakery=f'Bageri {i}', city='Umeå', price='45.00', kind='Classic')
+        # Catalogue version, semlor and their images
+        with django_assert_num_queries(3):
+            response = client.get('/api/semlor')
+        assert len(response.json()) == 12
+
+
+@pytest.mark.django_db
+class TestCatalogueSnapshot:
+    """Test suite for the pre-rendered catalogue snapshot"""
+
+    @pytest.fixture
+    def semla(self):
+        return Semla.objects.create(bakery='Tössebageriet', city='Stockholm', price='62.00', kind='Classic')
+
+    def test_snapshot_matches_list_endpoint(self, client, semla, snapshot_root):
+        """Test that the snapshot and its variants contain exactly what /api/semlor returns"""
+        import gzip
+        import brotli
+        from semelVoter.snapshot import write_snapshot
+        manifest = write_snapshot()
+        body = client.get('/api/semlor').content
+
+        versioned = snapshot_root / f"semlor.{manifest['version']}.json"
+        assert versioned.read_bytes() == body
+        assert gzip.decompress((snapshot_root / 'semlor.json.gz').read_bytes()) == body
+        assert brotli.decompress(versioned.with_name(versioned.name + '.br').read_bytes()) == body
+        assert manifest['count'] == 1
+        assert manifest['url'] == f"/snapshots/semlor.{manifest['version']}.json"
+
+    def test_version_only_changes_with_catalogue(self, semla, django_capture_on_commit_callbacks):
+        """Test that saving a semla rewrites the snapshot and an unchanged catalogue keeps its version"""
+        from semelVoter.snapshot import write_snapshot, read_manifest
+        first = write_snapshot()
+        assert write_snapshot() == first
+
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            semla.price = '65.00'
+            semla.save()
+            SemlaImage.objects.create(semla=semla, image_url='https://example.com/1.jpg')
+        assert len(callbacks) == 2
+        assert read_manifest()['version'] != first['version']
+        assert read_manifest()['count'] == 1
+
+    def test_bulk_create_refreshes_snapshot(self, client, django_user_model, django_capture_on_commit_callbacks):
+        """Test that bulk-created semlor, which send no signals, end up in the snapshot"""
+        from semelVoter.snapshot import read_manifest
+        client.force_login(django_user_model.objects.create_user('onboarding'))
+        items = [{'bakery': f'Bageri {i}', 'city': 'Luleå', 'price': '50', 'kind': 'Classic'} for i in range(3)]
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post('/api/semlor/bulk', items, content_type='application/json')
+        assert response.status_code == 201
+        assert read_manifest()['count'] == 3
+
+    @pytest.mark.django_db(transaction=True)
+    def test_background_writer_coalesces_changes(self, settings):
+        """Test that with a delay many commits are rendered once by the background writer"""
+        import time
+        from unittest import mock
+        from semelVoter import snapshot
+        settings.SNAPSHOT_DELAY = 0.2
+        with mock.patch.object(snapshot, 'write_snapshot', wraps=snapshot.write_snapshot) as write:
+            for i in range(5):
+                Semla.objects.create(bakery=f'Bageri {i}', city='Kiruna', price='45.00', kind='Classic')
+            assert write.call_count == 0
+            deadline = time.monotonic() + 5
+            while snapshot._writer is not None and time.monotonic() < deadline:
+                time.sleep(0.05)
+        assert write.call_count == 1
+        assert snapshot.read_manifest()['count'] == 5
+
+    @pytest.mark.django_db(transaction=True)
+    def test_list_current_before_background_write(self, client, settings):
+        """Test that with the shipped delay the list shows changes before the snapshot is rewritten"""
+        import time
+        from semelVoter import snapshot
+        settings.SNAPSHOT_DELAY = 1
+        semla = Semla.objects.create(bakery='Tössebageriet', city='Stockholm', price='62.00', kind='Classic')
+        snapshot.write_snapshot()
+        assert client.get('/api/semlor').json()[0]['rating'] == 0.0
+
+        scores = {'gradde': 5, 'mandelmassa': 5, 'lock': 5, 'helhet': 5, 'bulle': 5}
+        assert client.post(f'/api/rate/{semla.id}', scores, content_type='application/json').status_code == 200
+        Semla.objects.create(bakery='Nytt Bageri', city='Göteborg', price='49.00', kind='Classic')
+        assert snapshot.read_manifest()['count'] == 1
+        listing = client.get('/api/semlor').json()
+        assert sorted(row['rating'] for row in listing) == [0.0, 5.0]
+
+        deadline = time.monotonic() + 5
+        while snapshot._writer is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        manifest = snapshot.read_manifest()
+        assert manifest['catalogue'] == snapshot.catalogue_version()
+        assert snapshot.read_snapshot(manifest['version']) == client.get('/api/semlor').content
+
+    def test_lost_rewrite_is_caught_up(self, client, semla, settings):
+        """Test that a snapshot left behind by a worker that exited is rewritten when it is looked up"""
+        from semelVoter.snapshot import read_manifest, write_snapshot
+        stale = write_snapshot()
+        Semla.objects.create(bakery='Nytt Bageri', city='Göteborg', price='49.00', kind='Classic')
+        assert read_manifest() == stale
+        assert len(client.get('/api/semlor').json()) == 2
+        client.get('/api/semlor/snapshot')
+        assert read_manifest()['count'] == 2
+
+    def test_render_reads_primary(self, semla, monkeypatch):
+        """Test that the snapshot is rendered from the primary, never from a lagging replica"""
+        from semelVoter import routers, snapshot
+        pinned = []
+        monkeypatch.setattr(snapshot, 'semla_list_payload', lambda semlor: pinned.append(routers._pinned.get()) or [])
+        snapshot.write_snapshot()
+        assert pinned == [True]
+
+    def test_disabled_snapshot_not_written(self, client, semla, settings, snapshot_root):
+        """Test that the snapshot lookup neither renders nor writes when snapshots are disabled"""
+        settings.SNAPSHOT_ENABLED = False
+        assert client.get('/api/semlor/snapshot').status_code == 404
+        assert not snapshot_root.exists()
+
+    def test_served_precompressed(self, client, semla):
+        """Test that the snapshot is served with content negotiation and immutable caching"""
+        import gzip
+        response = client.get('/api/semlor/snapshot')
+        assert response.status_code == 200
+        manifest = response.json()
+
+        snapshot = client.get(manifest['url'], HTTP_ACCEPT_ENCODING='gzip')
+        assert snapshot.status_code == 200
+        assert snapshot['Content-Encoding'] == 'gzip'
+        assert 'immutable' in snapshot['Cache-Control']
+        body = gzip.decompress(b''.join(snapshot.streaming_content))
+        assert body == client.get('/api/semlor').content
+
+        latest = client.get(manifest['latest_url'])
+        assert 'Content-Encoding' not in latest
+        assert 'immutable' not in latest['Cache-Control']
+
+
+@pytest.mark.django_db
+class TestCompressedResponses:
+    """Test suite for content negotiation and the compressed response cache"""
+
+    @pytest.fixture
+    def catalogue(self):
+        from semelVoter.snapshot import write_snapshot
+        for i in range(20):
+            Semla.objects.create(bakery=f'Bageri {i}', city='Göteborg', price='49.00', kind='Classic')
+        return write_snapshot()
+
+    @pytest.mark.parametrize('header, expected', [
+        ('gzip, deflate, br', 'br'),
+        ('gzip', 'gzip'),
+        ('br;q=0.5, gzip', 'gzip'),
+        ('br;q=0, *', 'gzip'),
+        ('identity', None),
+        ('', None),
+    ])
+    def test_negotiate_encoding(self, header, expected):
+        """Test that the best supported coding is picked from Accept-Encoding"""
+        from semelVoter.compression import negotiate_encoding
+        assert negotiate_encoding(header) == expected
+
+    def test_list_served_compressed(self, client, catalogue):
+        """Test that the list endpoint returns the same JSON in every encoding"""
+        import gzip
+        import brotli
+        identity = client.get('/api/semlor')
+        gzipped = client.get('/api/semlor', HTTP_ACCEPT_ENCODING='gzip')
+        brotlied = client.get('/api/semlor', HTTP_ACCEPT_ENCODING='br, gzip')
+
+        assert 'Content-Encoding' not in identity
+        assert gzipped['Content-Encoding'] == 'gzip'
+        assert brotlied['Content-Encoding'] == 'br'
+        assert 'Accept-Encoding' in gzipped['Vary']
+        assert len(identity.json()) == 20
+        assert gzip.decompress(gzipped.content) == identity.content
+        assert brotli.decompress(brotlied.content) == identity.content
+        assert len(gzipped.content) < len(identity.content)
+
+    def test_cache_hit_skips_database_and_compression(self, client, catalogue, django_assert_num_queries, monkeypatch):
+        """Test that a cached list response is served with only the version query and no recompression"""
+        from semelVoter import compression
+        client.get('/api/semlor', HTTP_ACCEPT_ENCODING='gzip')
+
+        def fail(*args):
+            raise AssertionError('compressed again')
+        monkeypatch.setattr(compression, '_compress', fail)
+        with django_assert_num_queries(1):
+            response = client.get('/api/semlor', HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+
+    def test_new_snapshot_version_replaces_cached_list(self, client, catalogue):
+        """Test that a changed catalogue is not served from the old cache entry"""
+        from semelVoter.snapshot import write_snapshot
+        client.get('/api/semlor')
+        Semla.objects.create(bakery='Nytt Bageri', city='Göteborg', price='49.00', kind='Classic')
+        write_snapshot()
+        assert len(client.get('/api/semlor').json()) == 21
+
+    def test_comments_cache_follows_semla_version(self, client):
+        """Test that a new rating shows up in the cached comment list"""
+        semla = Semla.objects.create(bakery='Bageri', city='Visby', price='49.00', kind='Classic')
+        for i in range(3):
+            Ratings.objects.create(semla=semla, rating=4, comment=f'Kommentar {i} ' * 10)
+        assert len(client.get(f'/api/comments/{semla.id}', HTTP_ACCEPT_ENCODING='gzip').content) > 0
+        Ratings.objects.create(semla=semla, rating=5, comment='Ny')
+
+        response = client.get(f'/api/comments/{semla.id}')
+        assert len(response.json()) == 4
+
+    def test_browsable_api_not_cached(self, client, catalogue, settings):
+        """Test that HTML requests still get the browsable API"""
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }
+        response = client.get('/api/semlor', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Type'].startswith('text/html')
+        assert 'Content-Encoding' not in response
+
+
+# Rates one semla repeatedly through RateSemlaView, run as a separate process per gunicorn worker
+CONTENDED_RATER = '''
+import sys
+import django
+django.setup()
+from django.test import RequestFactory
+from semelVoter.views import RateSemlaView
+
+worker, count, pk = map(int, sys.argv[1:])
+view = RateSemlaView.as_view()
+for i in range(count):
+    value = (worker + i) % 5 + 1
+    data = {field: value for field in RateSemlaView.CATEGORY_FIELDS}
+    request = RequestFactory().post(f'/api/rate/{pk}', data, HTTP_USER_AGENT=f'worker-{worker}-{i}')
+    response = view(request, pk=pk)
+    assert response.status_code == 200, response.data
+'''
+
+
+class TestSQLiteContention:
+    """Test suite for concurrent writes against the tuned SQLite profile"""
+    WORKERS = 4
+    RATINGS_PER_WORKER = 10
+
+    def test_concurrent_ratings_from_several_processes(self, tmp_path, settings):
+        """Test that raters in separate processes neither hit 'database is locked' nor lose updates"""
+        import os
+        import sqlite3
+        import subprocess
+        import sys
+        database = tmp_path / 'db.sqlite3'
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'backend.settings',
+            'DB_ENGINE': 'django.db.backends.sqlite3',
+            'DB_NAME': str(database),
+            'SNAPSHOT_ENABLED': 'False',
+        }
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v0'], cwd=settings.BASE_DIR, env=env, check=True)
+        pk = subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-v0', '-c',
+             "from semelVoter.models import Semla; "
+             "print(Semla.objects.create(bakery='Bageri', city='Uppsala', price=45, kind='Classic').pk)"],
+            cwd=settings.BASE_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+
+        workers = [
+            subprocess.Popen(
+                [sys.executable, '-c', CONTENDED_RATER, str(worker), str(self.RATINGS_PER_WORKER), pk],
+                cwd=settings.BASE_DIR, env=env, stderr=subprocess.PIPE,
+            )
+            for worker in range(self.WORKERS)
+        ]
+        for worker in workers:
+            _, stderr = worker.communicate(timeout=60)
+            assert worker.returncode == 0, stderr.decode()
+
+        with sqlite3.connect(database) as db:
+            assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            count, average = db.execute(
+                'SELECT COUNT(*), AVG(gradde) FROM semelVoter_ratings WHERE semla_id = ?', (pk,)
+            ).fetchone()
+            rating = db.execute('SELECT rating FROM semelVoter_semla WHERE id = ?', (pk,)).fetchone()[0]
+        assert count == self.WORKERS * self.RATINGS_PER_WORKER
+        assert float(rating) == pytest.approx(average, abs=0.01)
+
+
+# Reports where reads go with a primary and a lagging replica configured
+REPLICA_ROUTING_CHECK = '''
+import json
+import django
+django.setup()
+from django.db import router, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from semelVoter.middleware import ReplicaRoutingMiddleware
+from semelVoter.models import Semla, RatingTracker
+from semelVoter.routers import use_primary
+
+client = Client(HTTP_HOST='localhost')
+results = {
+    'list': [semla['bakery'] for semla in client.get('/api/semlor').json()],
+    'semla_read': router.db_for_read(Semla),
+    'tracker_read': router.db_for_read(RatingTracker),
+}
+with use_primary():
+    results['pinned_read'] = router.db_for_read(Semla)
+with transaction.atomic():
+    results['read_in_transaction'] = router.db_for_read(Semla)
+
+def write_then_read(request):
+    semla = Semla.objects.create(bakery='Skrivet', city='Primary', price=40, kind='Classic')
+    results['read_after_write'] = Semla.objects.filter(pk=semla.pk).exists()
+    results['write_pk'] = semla.pk
+    return HttpResponse()
+
+ReplicaRoutingMiddleware(write_then_read)(RequestFactory().get('/'))
+results['next_request_read'] = Semla.objects.filter(pk=results['write_pk']).exists()
+print(json.dumps(results))
+'''
+
+
+class TestReplicaRouting:
+    """Test suite for routing reads to a read replica"""
+
+    def test_router_without_replica_uses_primary(self):
+        """Test that every query goes to the primary when no replica is configured"""
+        from django.db import router
+        assert router.db_for_read(Semla) == 'default'
+        assert router.db_for_write(Semla) == 'default'
+
+    def test_reads_go_to_replica_until_request_writes(self, tmp_path, settings):
+        """Test routing against two SQLite files, with the replica lagging behind the primary"""
+        import json
+        import os
+        import sqlite3
+        import subprocess
+        import sys
+        primary, replica = tmp_path / 'primary.sqlite3', tmp_path / 'replica.sqlite3'
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'backend.settings',
+            'DB_ENGINE': 'django.db.backends.sqlite3',
+            'DB_NAME': str(primary),
+            'SNAPSHOT_ENABLED': 'False',
+        }
+
+        def run(*args):
+            return subprocess.run(
+                [sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env,
+                check=True, capture_output=True, text=True,
+            ).stdout
+
+        def create(bakery):
+            run('shell', '-v0', '-c', "from semelVoter.models import Semla; "
+                f"Semla.objects.create(bakery='{bakery}', city='Uppsala', price=45, kind='Classic')")
+
+        run('migrate', '-v0')
+        create('Replikerad')
+        # Replicate, then write to the primary only so the replica lags behind
+        with sqlite3.connect(primary) as source, sqlite3.connect(replica) as target:
+            source.backup(target)
+        create('Bara primär')
+
+        env['DB_REPLICA_NAME'] = str(replica)
+        results = json.loads(subprocess.run(
+            [sys.executable, '-c', REPLICA_ROUTING_CHECK], cwd=settings.BASE_DIR, env=env,
+            check=True, capture_output=True, text=True,
+        ).stdout)
+
+        assert results['list'] == ['Replikerad']
+        assert results['semla_read'] == 'replica'
+        assert results['tracker_read'] == 'default'
+        assert results['pinned_read'] == 'default'
+        assert results['read_in_transaction'] == 'default'
+        assert results['read_after_write'] is True
+        assert results['next_request_read'] is False
+
+
+@pytest.mark.django_db
+class TestAsyncReadViews:
+    """Test suite for the async read endpoints served under ASGI"""
+
+    @pytest.fixture
+    def semla(self):
+        semla = Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        SemlaImage.objects.create(semla=semla, image_url='https://example.com/1.jpg')
+        for i in range(3):
+            Ratings.objects.create(semla=semla, rating=4, comment=f'Kommentar {i}', name='Anna')
+        return semla
+
+    def _get(self, view, path, headers=None, **view_kwargs):
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncRequestFactory
+        request = AsyncRequestFactory().get(path, headers=headers)
+        return async_to_sync(view.as_view())(request, **view_kwargs)
+
+    def test_async_list_matches_sync(self, client, semla):
+        """Test that the async list view returns the same bytes as SelmaViewList"""
+        from semelVoter.views import AsyncSelmaViewList
+        response = self._get(AsyncSelmaViewList, '/api/semlor')
+        assert response['Content-Type'] == 'application/json'
+        assert response.content == client.get('/api/semlor').content
+
+    def test_async_list_uses_compressed_cache(self, client, semla):
+        """Test that the async list view serves the same cache entries as the sync view"""
+        import gzip
+        from semelVoter.snapshot import write_snapshot
+        from semelVoter.views import AsyncSelmaViewList
+        write_snapshot()
+        expected = client.get('/api/semlor').content
+        response = self._get(AsyncSelmaViewList, '/api/semlor', headers={'Accept-Encoding': 'gzip'})
+        assert response['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.content) == expected
+
+    def test_async_list_reads_snapshot_off_event_loop(self, semla, monkeypatch):
+        """Test that the blocking snapshot read does not run on the event loop"""
+        import asyncio
+        from semelVoter import views
+        loops = []
+
+        def read_current_snapshot(version):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return None
+        monkeypatch.setattr(views, 'read_current_snapshot', read_current_snapshot)
+        assert self._get(views.AsyncSelmaViewList, '/api/semlor').status_code == 200
+        assert loops == [None]
+
+    def test_async_comments_match_sync(self, client, semla):
+        """Test that the async comment view returns the same bytes as SemlaCommentView"""
+        from semelVoter.views import AsyncSemlaCommentView
+        response = self._get(AsyncSemlaCommentView, f'/api/comments/{semla.id}', pk=semla.id)
+        assert len(response.content) > 2
+        assert response.content == client.get(f'/api/comments/{semla.id}').content
+        assert self._get(AsyncSemlaCommentView, '/api/comments/999999', pk=999999).content == b'[]'
+
+    def test_asgi_disables_persistent_connections(self):
+        """Test that backend.asgi turns off CONN_MAX_AGE unless it is configured"""
+        import os
+        import subprocess
+        import sys
+        code = (
+            "import backend.asgi; from django.conf import settings; "
+            "print(settings.DATABASES['default']['CONN_MAX_AGE'])"
+        )
+        env = {key: value for key, value in os.environ.items() if key != 'DB_CONN_MAX_AGE'}
+        env.pop('DJANGO_SETTINGS_MODULE', None)
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+        assert output.stdout.strip() == '0'
+        env['DB_CONN_MAX_AGE'] = '30'
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+        assert output.stdout.strip() == '30'
+
+    def test_async_middleware_chain(self, async_client, semla, snapshot_root):
+        """Test that requests pass through the async-capable middleware under ASGI"""
+        from asgiref.sync import async_to_sync
+        from semelVoter.snapshot import write_snapshot
+        manifest = write_snapshot()
+
+        async def fetch():
+            return await async_client.get('/api/semlor'), await async_client.get(manifest['url'])
+        listing, snapshot = async_to_sync(fetch)()
+        assert listing.status_code == 200
+        assert b''.join(snapshot.streaming_content) == listing.content
+
+
+@pytest.mark.django_db
+class TestServerTiming:
+    """Test suite for the Server-Timing header and per-request timing log"""
+
+    def test_header_reports_queries(self, client):
+        """Test that the header counts every query made by the request"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/semlor')
+        timing = response['Server-Timing']
+        assert f'desc="{len(queries)} queries"' in timing
+        for metric in ('db;dur=', 'storage;dur=', 'render;dur=', 'total;dur='):
+            assert metric in timing
+
+    def test_storage_time_recorded(self, monkeypatch):
+        """Test that uploads are counted as storage time, not database time"""
+        import time
+        from types import SimpleNamespace
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from semelVoter import utils
+        from semelVoter.timing import request_scope
+
+        def slow_save(path, file_obj):
+            time.sleep(0.02)
+            return path
+        storage = SimpleNamespace(save=slow_save, url=lambda path: f'https://bucket/{path}')
+        monkeypatch.setattr(utils, 'default_storage', storage)
+
+        with request_scope() as timings:
+            utils.upload_image_to_s3(SimpleUploadedFile('test.jpg', b'image-bytes', content_type='image/jpeg'))
+        assert timings.milliseconds('storage') >= 20
+        assert timings.queries == 0
+
+    def test_nested_categories_are_exclusive(self):
+        """Test that queries made while rendering count as database time only"""
+        from semelVoter.serializers import SemlaSerializer
+        from semelVoter.timing import request_scope
+        semla = Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        with request_scope() as timings:
+            SemlaSerializer(Semla.objects.filter(pk=semla.pk), many=True).data
+        assert timings.queries == 2
+        assert timings.totals['db'] > 0 and timings.totals['render'] > 0
+        assert timings.totals['db'] + timings.totals['render'] <= timings.total_milliseconds() / 1000
+
+    def test_log_line(self, client, monkeypatch):
+        """Test that one JSON line is logged per request with the timing breakdown"""
+        import json
+        from semelVoter import middleware
+        lines = []
+        monkeypatch.setattr(middleware.timing_logger, 'info', lines.append)
+        client.get('/api/semlor')
+
+        assert len(lines) == 1
+        entry = json.loads(lines[0])
+        assert entry['method'] == 'GET' and entry['path'] == '/api/semlor'
+        assert entry['status'] == 200
+        assert entry['view'] == 'get_semla_list'
+        assert set(entry) >= {'duration_ms', 'queries', 'db_ms', 'storage_ms', 'render_ms'}
+
+    def test_disabled(self, settings):
+        """Test that SERVER_TIMING=False removes the middleware"""
+        from django.test import Client
+        settings.SERVER_TIMING = False
+        assert 'Server-Timing' not in Client().get('/api/semlor')
+
+
+# Two worker processes recording metrics into a shared PROMETHEUS_MULTIPROC_DIR
+METRICS_WORKER = '''
+from semelVoter.metrics import RATE_LIMITED
+RATE_LIMITED.labels('rating').inc()
+'''
+METRICS_SCRAPE = '''
+from semelVoter.metrics import render_metrics
+print(render_metrics()[0].decode())
+'''
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    """Test suite for the Prometheus metrics and their scrape endpoint"""
+
+    def _value(self, name, **labels):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_scrape_endpoint(self, client):
+        """Test that the endpoint serves all metrics in the text exposition format"""
+        response = client.get('/api/metrics')
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain')
+        body = response.content.decode()
+        for name in ('semla_request_duration_seconds', 'semla_rate_limited_total',
+                     'semla_upload_duration_seconds', 'semla_upload_failures_total',
+                     'semla_cache_requests_total'):
+            assert f'# TYPE {name}' in body
+
+    def test_scrape_restricted(self, client, settings):
+        """Test that only allowed addresses or the bearer token may scrape"""
+        settings.METRICS_ALLOWED_IPS = ['10.0.0.0/8']
+        assert client.get('/api/metrics').status_code == 403
+        assert client.get('/api/metrics', REMOTE_ADDR='10.1.2.3').status_code == 200
+        # Forwarded addresses only count when a trusted proxy appended them
+        assert client.get('/api/metrics', REMOTE_ADDR='203.0.113.9', HTTP_X_FORWARDED_FOR='10.1.2.3').status_code == 403
+        assert client.get('/api/metrics', HTTP_X_FORWARDED_FOR='10.1.2.3, 198.51.100.1').status_code == 403
+        assert client.get('/api/metrics', HTTP_X_FORWARDED_FOR='198.51.100.1, 10.1.2.3').status_code == 200
+        settings.METRICS_TOKEN = 's3cret'
+        assert client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code == 403
+        assert client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code == 200
+
+    def test_latency_per_view(self, client):
+        """Test that request latency is labelled with the view class"""
+        before = self._value('semla_request_duration_seconds_count', view='SelmaViewList', method='GET')
+        client.get('/api/semlor')
+        client.get('/api/semlor')
+        assert self._value('semla_request_duration_seconds_count', view='SelmaViewList', method='GET') == before + 2
+
+    def test_rate_limited_counted(self, client, monkeypatch):
+        """Test that 429 responses from the rating tracker are counted"""
+        from semelVoter.models import RatingTracker
+        semla = Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        monkeypatch.setattr(RatingTracker, 'get_today_count', classmethod(lambda cls, ip, agent: 5))
+        before = self._value('semla_rate_limited_total', tracker='rating')
+        response = client.post(f'/api/rate/{semla.id}', {'rating': 4}, content_type='application/json')
+        assert response.status_code == 429
+        assert self._value('semla_rate_limited_total', tracker='rating') == before + 1
+
+    def test_upload_failures_counted(self, monkeypatch):
+        """Test that failed uploads are counted and successful ones timed"""
+        from types import SimpleNamespace
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from semelVoter import utils
+
+        def failing_save(path, file_obj):
+            raise OSError('bucket unreachable')
+        file = SimpleUploadedFile('test.jpg', b'image-bytes', content_type='image/jpeg')
+        failures = self._value('semla_upload_failures_total')
+        uploads = self._value('semla_upload_duration_seconds_count')
+
+        monkeypatch.setattr(utils, 'default_storage', SimpleNamespace(save=failing_save, url=str))
+        assert utils.upload_image_to_s3(file) is None
+        monkeypatch.setattr(utils, 'default_storage', SimpleNamespace(save=lambda path, f: path, url=str))
+        assert utils.upload_image_to_s3(file) is not None
+
+        assert self._value('semla_upload_failures_total') == failures + 1
+        assert self._value('semla_upload_duration_seconds_count') == uploads + 1
+
+    def test_cache_hits_and_misses(self, client):
+        """Test that response cache lookups are counted per cache"""
+        from semelVoter.snapshot import write_snapshot
+        Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        write_snapshot()
+        hits = self._value('semla_cache_requests_total', cache='semla-list', result='hit')
+        misses = self._value('semla_cache_requests_total', cache='semla-list', result='miss')
+        for _ in range(3):
+            client.get('/api/semlor')
+        assert self._value('semla_cache_requests_total', cache='semla-list', result='miss') == misses + 1
+        assert self._value('semla_cache_requests_total', cache='semla-list', result='hit') == hits + 2
+
+    def test_multiprocess_aggregation(self, tmp_path):
+        """Test that a scrape reports the sum over all worker processes"""
+        import os
+        import subprocess
+        import sys
+        env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path)}
+        for _ in range(2):
+            subprocess.run([sys.executable, '-c', METRICS_WORKER], env=env, check=True)
+        scrape = subprocess.run(
+            [sys.executable, '-c', METRICS_SCRAPE], env=env, check=True, capture_output=True, text=True,
+        )
+        assert 'semla_rate_limited_total{tracker="rating"} 2.0' in scrape.stdout
+
+
+@pytest.mark.django_db
+class TestSlowQueryLog:
+    """Test suite for the slow query log and its staff endpoint"""
+
+    @pytest.fixture(autouse=True)
+    def empty_log(self):
+        from semelVoter.slow_queries import reset_slow_query_stats
+        reset_slow_query_stats()
+        yield
+        reset_slow_query_stats()
+
+    @pytest.mark.parametrize('sql, expected', [
+        ('SELECT "id" FROM "t" WHERE "a" = %s AND "b" > 5 LIMIT 21',
+         'SELECT "id" FROM "t" WHERE "a" = ? AND "b" > ? LIMIT ?'),
+        ('select * from t where id in (%s, %s, %s)', 'SELECT * FROM t WHERE id IN (...)'),
+        ("SELECT   *\n FROM t WHERE name = 'Anna' -- note", 'SELECT * FROM t WHERE name = ?'),
+        ('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)', 'INSERT INTO t (a, b) VALUES (...)'),
+    ])
+    def test_fingerprint(self, sql, expected):
+        """Test that literals and value lists are stripped from statements"""
+        from semelVoter.slow_queries import fingerprint
+        assert fingerprint(sql) == expected
+
+    def test_aggregates_per_fingerprint(self, settings):
+        """Test that queries differing only in values are counted together"""
+        from semelVoter.slow_queries import slow_query_stats
+        settings.SLOW_QUERY_THRESHOLD_MS = 0
+        for pk in (1, 2, 3):
+            Semla.objects.filter(pk=pk).first()
+        entry = next(entry for entry in slow_query_stats() if '"semelVoter_semla"' in entry['fingerprint'])
+        assert entry['count'] == 3
+        assert '= ?' in entry['fingerprint']
+        assert entry['max_ms'] <= entry['total_ms']
+
+    def test_disabled(self, settings):
+        """Test that nothing is recorded without a threshold"""
+        from semelVoter.slow_queries import slow_query_stats
+        settings.SLOW_QUERY_THRESHOLD_MS = None
+        Semla.objects.count()
+        assert slow_query_stats() == []
+
+    def test_staff_endpoint(self, client, admin_client, settings):
+        """Test that only staff can read and reset the slow query log"""
+        settings.SLOW_QUERY_THRESHOLD_MS = 0
+        Semla.objects.count()
+        assert client.get('/api/slow-queries').status_code in (401, 403)
+
+        response = admin_client.get('/api/slow-queries')
+        assert response.status_code == 200
+        assert response.json()['threshold_ms'] == 0
+        assert any('COUNT(*)' in entry['fingerprint'] for entry in response.json()['queries'])
+
+        assert admin_client.delete('/api/slow-queries').status_code == 204
+        settings.SLOW_QUERY_THRESHOLD_MS = None
+        assert admin_client.get('/api/slow-queries').json()['queries'] == []
+
+
+@pytest.mark.django_db
+class TestRequestProfiler:
+    """Test suite for staff request profiling and the admin profile pages"""
+
+    @pytest.fixture(autouse=True)
+    def profile_root(self, settings, tmp_path):
+        settings.PROFILE_ROOT = tmp_path / 'profiles'
+        settings.PROFILE_KEEP = 3
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }
+        return settings.PROFILE_ROOT
+
+    def test_anonymous_requests_not_profiled(self, client, profile_root):
+        """Test that the profile parameter is ignored for non-staff users"""
+        response = client.get('/api/semlor?profile')
+        assert response.status_code == 200
+        assert 'X-Profile' not in response
+        assert not profile_root.exists()
+
+    def test_staff_request_profiled(self, admin_client, profile_root):
+        """Test that staff get the same response plus a saved profile"""
+        Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        plain = admin_client.get('/api/semlor')
+        profiled = admin_client.get('/api/semlor?profile=1')
+        by_header = admin_client.get('/api/semlor', HTTP_X_PROFILE='1')
+
+        assert 'X-Profile' not in plain
+        assert profiled.content == plain.content
+        assert (profile_root / profiled['X-Profile']).is_file()
+        assert (profile_root / by_header['X-Profile']).is_file()
+
+    def test_profiles_are_a_bounded_ring(self, admin_client, profile_root):
+        """Test that only the newest PROFILE_KEEP profiles are kept"""
+        import os
+        names = []
+        for i in range(5):
+            names.append(admin_client.get('/api/semlor?profile')['X-Profile'])
+            os.utime(profile_root / names[-1], (i, i))
+        assert sorted(os.listdir(profile_root)) == sorted(names[2:])
+
+    def test_admin_pages(self, client, admin_client):
+        """Test that staff can list, read and download profiles"""
+        name = admin_client.get('/api/semlor?profile')['X-Profile']
+
+        listing = admin_client.get('/admin/profiles/')
+        assert listing.status_code == 200
+        assert name in listing.content.decode()
+
+        detail = admin_client.get(f'/admin/profiles/{name}?sort=tottime')
+        assert detail.status_code == 200
+        assert 'function calls' in detail.content.decode()
+
+        download = admin_client.get(f'/admin/profiles/{name}?download')
+        assert b''.join(download.streaming_content)
+        assert admin_client.get('/admin/profiles/..%2Fdb.sqlite3').status_code == 404
+        assert client.get('/admin/profiles/').status_code == 302
+
+    def test_disabled(self, admin_user, settings):
+        """Test that PROFILING_ENABLED=False removes the middleware"""
+        from django.test import Client
+        settings.PROFILING_ENABLED = False
+        client = Client()
+        client.force_login(admin_user)
+        assert 'X-Profile' not in client.get('/api/semlor?profile')
+
+
+@pytest.mark.django_db
+class TestListMemoryBudget:
+    """Test suite for per-request peak memory tracing and the list endpoint's memory budget"""
+    # Semlor with an image each in the catalogue the LIST_*_MEMORY_BUDGET settings are for
+    SEMLOR = 10_000
+
+    @pytest.fixture
+    def catalogue(self):
+        semlor = []
+        for i in range(self.SEMLOR):
+            semla = Semla(bakery=f'Bageri {i}', city=f'Stad {i % 50}', kind='Classic', price='45.00')
+            semla.refresh_derived_fields()
+            semlor.append(semla)
+        semlor = Semla.objects.bulk_create(semlor, batch_size=500)
+        SemlaImage.objects.bulk_create(
+            [SemlaImage(semla=semla, image_url=f'https://bucket.example.com/{semla.pk}.jpg') for semla in semlor],
+            batch_size=500,
+        )
+
+    @pytest.fixture
+    def peaks(self, settings, monkeypatch):
+        import json
+        from semelVoter import middleware
+        settings.MEMORY_TRACED_VIEWS = ['SelmaViewList']
+        lines = []
+        monkeypatch.setattr(middleware.memory_logger, 'info', lines.append)
+        return lambda: [json.loads(line)['peak_bytes'] for line in lines]
+
+    def test_only_selected_views_traced(self, peaks):
+        """Test that only requests to MEMORY_TRACED_VIEWS are traced"""
+        import tracemalloc
+        from django.test import Client
+        client = Client()
+        client.get('/api/semlor/search?q=bageri')
+        assert peaks() == []
+        client.get('/api/semlor')
+        assert len(peaks()) == 1
+        assert not tracemalloc.is_tracing()
+
+    def test_concurrent_requests_not_recorded(self, peaks):
+        """Test that a peak is dropped when another request ran while it was traced"""
+        import tracemalloc
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from django.urls import resolve
+        from semelVoter.middleware import PeakMemoryMiddleware
+
+        def request(path):
+            request = RequestFactory().get(path)
+            request.resolver_match = resolve(path)
+            return request
+
+        def handle(request):
+            middleware.process_view(request, None, (), {})
+            if request.path == '/api/semlor' and not nested:
+                nested.append(middleware(request_during))
+            return HttpResponse()
+        middleware = PeakMemoryMiddleware(handle)
+        nested = []
+        request_during = request('/api/semlor/search')
+        middleware(request('/api/semlor'))
+        assert nested and peaks() == []
+        assert not tracemalloc.is_tracing()
+        middleware(request('/api/semlor'))
+        assert len(peaks()) == 1
+
+    def test_rendered_list_within_budget(self, catalogue, peaks, settings):
+        """Test the peak memory of rendering the list without a snapshot"""
+        from django.test import Client
+        settings.SNAPSHOT_ENABLED = False
+        response = Client().get('/api/semlor')
+        assert len(response.json()) == self.SEMLOR
+        assert 0 < peaks()[0] < settings.LIST_RENDER_MEMORY_BUDGET
+
+    def test_snapshot_list_within_budget(self, catalogue, peaks, settings):
+        """Test the peak memory of serving the list from the snapshot"""
+        from django.test import Client
+        from semelVoter.snapshot import write_snapshot
+        write_snapshot()
+        response = Client().get('/api/semlor')
+        assert response.status_code == 200
+        assert 0 < peaks()[0] < settings.LIST_SNAPSHOT_MEMORY_BUDGET
+
+
+@pytest.mark.django_db
+class TestDirectImageUploads:
+    """Test suite for presigned image uploads and their confirmation"""
+
+    @pytest.fixture(autouse=True)
+    def media_root(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path / 'media'
+        return settings.MEDIA_ROOT
+
+    @pytest.fixture
+    def semla(self):
+        return Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+
+    def _presign(self, client, semla, content_type='image/png', size=11):
+        return client.post(
+            f'/api/semlor/{semla.id}/images/presign',
+            {'content_type': content_type, 'size': size}, content_type='application/json',
+        )
+
+    def _upload(self, client, target, content=b'image-bytes', content_type='image/png'):
+        file = SimpleUploadedFile('photo.png', content, content_type=content_type)
+        return client.post(target['url'], {**target['fields'], 'file': file})
+
+    def test_upload_and_confirm(self, client, semla, media_root):
+        """Test the whole flow against the filesystem emulation of a presigned POST"""
+        target = self._presign(client, semla).json()
+        assert target['url'] == '/api/uploads'
+        assert target['fields']['key'] == f"semlor/{target['image_id']}.png"
+
+        assert self._upload(client, target).status_code == 204
+        assert (media_root / target['fields']['key']).read_bytes() == b'image-bytes'
+
+        response = client.post(f'/api/semlor/{semla.id}/images', {'upload_id': target['upload_id']},
+                               content_type='application/json')
+        assert response.status_code == 201
+        image = SemlaImage.objects.get(semla=semla)
+        assert str(image.id) == target['image_id'] == response.json()['id']
+        assert image.image_url.endswith(target['fields']['key'])
+
+        again = client.post(f'/api/semlor/{semla.id}/images', {'upload_id': target['upload_id']},
+                            content_type='application/json')
+        assert again.status_code == 200
+        assert SemlaImage.objects.count() == 1
+
+    def test_confirm_requires_uploaded_object(self, client, semla):
+        """Test that an upload cannot be confirmed before the object exists"""
+        target = self._presign(client, semla).json()
+        response = client.post(f'/api/semlor/{semla.id}/images', {'upload_id': target['upload_id']},
+                               content_type='application/json')
+        assert response.status_code == 409
+        assert not SemlaImage.objects.exists()
+
+    def test_confirm_rejects_foreign_or_forged_uploads(self, client, semla):
+        """Test that an upload_id only confirms the semla it was issued for"""
+        other = Semla.objects.create(bakery='Tössebageriet', city='Stockholm', price='60.00', kind='Classic')
+        target = self._presign(client, semla).json()
+        self._upload(client, target)
+        for pk, upload_id in ((other.id, target['upload_id']), (semla.id, target['upload_id'] + 'x')):
+            response = client.post(f'/api/semlor/{pk}/images', {'upload_id': upload_id},
+                                   content_type='application/json')
+            assert response.status_code == 400
+        assert not SemlaImage.objects.exists()
+
+    @pytest.mark.parametrize('content, content_type', [
+        (b'image-bytes-but-longer', 'image/png'),
+        (b'image-bytes', 'image/jpeg'),
+    ])
+    def test_upload_enforces_conditions(self, client, semla, media_root, content, content_type):
+        """Test that the emulated target rejects files larger or of another type than announced"""
+        target = self._presign(client, semla).json()
+        fields = {**target['fields'], 'Content-Type': content_type}
+        response = self._upload(client, {**target, 'fields': fields}, content=content, content_type=content_type)
+        assert response.status_code == 403
+        assert not (media_root / target['fields']['key']).exists()
+
+    @pytest.mark.parametrize('content_type, size', [
+        ('image/gif', 100),
+        ('image/png', 0),
+        ('image/png', 10 * 1024 * 1024 + 1),
+        ('image/png', 'large'),
+    ])
+    def test_presign_validation(self, client, semla, content_type, size):
+        """Test that only supported images within UPLOAD_MAX_BYTES get a target"""
+        assert self._presign(client, semla, content_type, size).status_code == 400
+
+    def test_presign_daily_limit(self, client, semla, settings):
+        """Test that upload targets are limited per IP and user agent and counted as rate limited"""
+        from prometheus_client import REGISTRY
+        from semelVoter.models import ImageUploadTracker
+        settings.UPLOAD_DAILY_LIMIT = 2
+        before = REGISTRY.get_sample_value('semla_rate_limited_total', {'tracker': 'upload'}) or 0
+        assert [self._presign(client, semla).status_code for _ in range(3)] == [201, 201, 429]
+        assert REGISTRY.get_sample_value('semla_rate_limited_total', {'tracker': 'upload'}) == before + 1
+        assert ImageUploadTracker.objects.get().count == 2
+        response = client.post(
+            f'/api/semlor/{semla.id}/images/presign', {'content_type': 'image/png', 'size': 11},
+            content_type='application/json', HTTP_USER_AGENT='other',
+        )
+        assert response.status_code == 201
+
+    def test_presign_unknown_semla(self, client):
+        """Test that no target is issued for a missing semla"""
+        assert self._presign(client, Semla(id=999999)).status_code == 404
+
+    def test_s3_presigned_post(self, client, semla, monkeypatch):
+        """Test that S3 storages get a presigned POST limited to key, type and size"""
+        from types import SimpleNamespace
+        from semelVoter import uploads
+        calls = []
+
+        def generate_presigned_post(**kwargs):
+            calls.append(kwargs)
+            return {'url': 'https://bucket.s3.amazonaws.com/', 'fields': {'key': kwargs['Key'], 'policy': 'p'}}
+        client_s3 = SimpleNamespace(generate_presigned_post=generate_presigned_post)
+        storage = SimpleNamespace(
+            bucket_name='bucket', connection=SimpleNamespace(meta=SimpleNamespace(client=client_s3)),
+            _normalize_name=lambda name: name,
+        )
+        monkeypatch.setattr(uploads, 'default_storage', storage)
+
+        target = self._presign(client, semla, 'image/webp', 5000).json()
+        assert target['url'] == 'https://bucket.s3.amazonaws.com/'
+        assert calls[0]['Key'] == f"semlor/{target['image_id']}.webp"
+        assert ['content-length-range', 1, 5000] in calls[0]['Conditions']
+        assert {'Content-Type': 'image/webp'} in calls[0]['Conditions']
+        assert {'Cache-Control': 'public, max-age=31536000, immutable'} in calls[0]['Conditions']
+        assert calls[0]['ExpiresIn'] == 300
+
+
+class TestS3StorageConfig:
+    """Test suite for the S3 client and transfer settings"""
+
+    @pytest.fixture
+    def storage(self, settings):
+        from semelVoter.storage import S3Storage
+        settings.AWS_S3_MAX_POOL_CONNECTIONS = 24
+        settings.AWS_S3_READ_TIMEOUT = 7
+        settings.AWS_S3_MAX_ATTEMPTS = 5
+        settings.AWS_S3_MULTIPART_THRESHOLD = 16 * 1024 * 1024
+        settings.AWS_S3_MAX_CONCURRENCY = 1
+        return S3Storage(
+            bucket_name='semlor', access_key='key', secret_key='secret',
+            region_name='eu-north-1', addressing_style='path',
+        )
+
+    def test_settings_applied(self, storage):
+        """Test that pool size, timeouts, retries and multipart settings reach boto"""
+        config = storage.connection.meta.client.meta.config
+        assert config.max_pool_connections == 24
+        assert config.read_timeout == 7
+        assert config.retries == {'total_max_attempts': 5, 'mode': 'standard'}
+        assert config.s3 == {'addressing_style': 'path'}
+        assert storage.transfer_config.multipart_threshold == 16 * 1024 * 1024
+        assert storage.transfer_config.use_threads is False
+
+    def test_explicit_config_wins(self):
+        """Test that a client_config passed to the storage is kept"""
+        from botocore.config import Config
+        from semelVoter.storage import S3Storage
+        config = Config(max_pool_connections=3)
+        assert S3Storage(bucket_name='semlor', client_config=config).client_config is config
+
+    def test_one_client_per_process(self, storage):
+        """Test that threads get their own resource, all sharing the process' client"""
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from semelVoter.storage import S3Storage
+        barrier = threading.Barrier(4)
+
+        def connect(_):
+            barrier.wait()
+            return storage.connection
+        with ThreadPoolExecutor(4) as pool:
+            resources = list(pool.map(connect, range(4)))
+        other = S3Storage(bucket_name='semlor', access_key='key', secret_key='secret', region_name='eu-north-1')
+        client = storage.connection.meta.client
+        assert len({id(resource) for resource in resources + [storage.connection]}) == 5
+        assert {resource.meta.client for resource in resources} == {client} == {other.connection.meta.client}
+        assert storage.connection is storage.connection
+        assert storage.bucket.meta.client is client
+
+
+@pytest.mark.django_db
+class TestCachingHeaders:
+    """Test suite for Cache-Control on API reads and uploaded images"""
+
+    def test_public_reads_cacheable(self, client):
+        """Test that anonymous list reads get the configured shared cache policy"""
+        response = client.get('/api/semlor')
+        directives = {part.strip() for part in response['Cache-Control'].split(',')}
+        assert directives == {'public', 'max-age=0', 's-maxage=10', 'stale-while-revalidate=60'}
+
+    def test_policy_per_view(self, settings):
+        """Test that policies are looked up by URL name"""
+        from django.test import Client
+        settings.API_CACHE_POLICIES = {'get_semla_list': {'s_maxage': 300}}
+        client = Client()
+        assert client.get('/api/semlor')['Cache-Control'] == 'public, s-maxage=300'
+        assert 'Cache-Control' not in client.get('/api/semlor/search?q=sundbergs')
+
+    def test_not_cacheable(self, client, admin_client):
+        """Test that writes, errors, HTML, authenticated and own policies are left alone"""
+        semla = Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        assert 'Cache-Control' not in client.post(f'/api/rate/{semla.id}', {}, content_type='application/json')
+        assert 'Cache-Control' not in client.get('/api/semlor/999999')
+        assert 'Cache-Control' not in admin_client.get('/api/semlor')
+        assert client.get('/api/semlor/snapshot')['Cache-Control'] == 'no-cache'
+
+    @pytest.fixture
+    def async_views(self, settings):
+        """Route the list and comments to the async views, as urls.py does with ASYNC_VIEWS"""
+        from types import ModuleType
+        from django.urls import path
+        from semelVoter.views import AsyncSelmaViewList, AsyncSemlaCommentView
+        urlconf = ModuleType('async_urls')
+        urlconf.urlpatterns = [
+            path('api/semlor', AsyncSelmaViewList.as_view(), name='get_semla_list'),
+            path('api/comments/<int:pk>', AsyncSemlaCommentView.as_view(), name='comment_list'),
+        ]
+        settings.ROOT_URLCONF = urlconf
+
+    def test_async_logged_in(self, async_client, admin_user, async_views):
+        """Test that a logged-in session under ASGI is loaded without blocking and not cached"""
+        from asgiref.sync import async_to_sync
+        async_client.force_login(admin_user)
+
+        async def fetch():
+            return await async_client.get('/api/semlor'), await async_client.get('/api/comments/1')
+        for response in async_to_sync(fetch)():
+            assert response.status_code == 200
+            assert 'Cache-Control' not in response
+
+    def test_async_anonymous(self, async_client, async_views):
+        """Test that anonymous reads under ASGI get the shared cache policy"""
+        from asgiref.sync import async_to_sync
+        response = async_to_sync(async_client.get)('/api/semlor')
+        assert 'public' in response['Cache-Control']
+
+    def test_image_object_parameters(self):
+        """Test that images are uploaded as immutable with a content type from their extension"""
+        from types import SimpleNamespace
+        from semelVoter.storage import S3Storage
+        storage = S3Storage(bucket_name='semlor')
+        params = storage._get_write_parameters('semlor/abc.webp', SimpleNamespace(content_type='text/html'))
+        assert params['CacheControl'] == 'public, max-age=31536000, immutable'
+        assert params['ContentType'] == 'image/webp'
+        assert 'CacheControl' not in storage._get_write_parameters('exports/report.csv')
+
+
+@pytest.mark.django_db
+class TestImageProxy:
+    """Test suite for resized images served through the disk cached proxy"""
+
+    @pytest.fixture(autouse=True)
+    def roots(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path / 'media'
+        settings.THUMBNAIL_CACHE_ROOT = tmp_path / 'thumbnails'
+        settings.LEGACY_PICTURE_ROOT = tmp_path / 'legacy'
+        return tmp_path
+
+    def _png(self, width=800, height=600):
+        import io
+        from PIL import Image
+        output = io.BytesIO()
+        Image.new('RGBA', (width, height), (200, 120, 40, 255)).save(output, 'PNG')
+        return output.getvalue()
+
+    def _image(self, roots):
+        import uuid
+        semla = Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        image_id = uuid.uuid4()
+        (roots / 'media' / 'semlor').mkdir(parents=True)
+        (roots / 'media' / 'semlor' / f'{image_id}.png').write_bytes(self._png())
+        return SemlaImage.objects.create(id=image_id, semla=semla, image_url=f'/media/semlor/{image_id}.png')
+
+    def _size(self, body):
+        import io
+        from PIL import Image
+        with Image.open(io.BytesIO(body)) as image:
+            return image.format, image.size
+
+    def test_resize(self, client, roots):
+        """Test that images are scaled down to the width in the asked format and cached forever"""
+        image = self._image(roots)
+        response = client.get(f'/api/images/{image.id}?width=320&format=webp')
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'image/webp'
+        assert response['Cache-Control'] == 'public, max-age=31536000, immutable'
+        assert self._size(response.content) == ('WEBP', (320, 240))
+        response = client.get(f'/api/images/{image.id}?width=160')
+        assert self._size(response.content) == ('JPEG', (160, 120))
+
+    def test_cache_hit_skips_source(self, client, roots):
+        """Test that a cached thumbnail is served without reading the original"""
+        image = self._image(roots)
+        first = client.get(f'/api/images/{image.id}?width=320')
+        (roots / 'media' / 'semlor' / f'{image.id}.png').unlink()
+        second = client.get(f'/api/images/{image.id}?width=320')
+        assert second.status_code == 200
+        assert second.content == first.content
+        assert client.get(f'/api/images/{image.id}?width=640').status_code == 404
+
+    def test_concurrent_requests_resize_once(self, roots):
+        """Test that identical concurrent requests read and resize the original once"""
+        import threading
+        import time
+        from semelVoter.thumbnails import get_thumbnail
+        original = self._png()
+        reads = []
+
+        def read_source():
+            reads.append(1)
+            time.sleep(0.05)
+            return original
+
+        barrier = threading.Barrier(8)
+        bodies = []
+
+        def request():
+            barrier.wait()
+            bodies.append(get_thumbnail('semlor/same.png', 320, 'jpeg', read_source)[0])
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(reads) == 1
+        assert len(bodies) == 8 and len(set(bodies)) == 1
+
+    def test_lru_eviction(self, settings, roots):
+        """Test that the least recently used thumbnails are evicted to stay within the byte budget"""
+        import os
+        from semelVoter.thumbnails import get_thumbnail
+        original = self._png()
+        body, _ = get_thumbnail('a', 320, 'png', lambda: original)
+        settings.THUMBNAIL_CACHE_BYTES = len(body) * 2
+        get_thumbnail('b', 320, 'png', lambda: original)
+        cache_root = roots / 'thumbnails'
+        for age, path in enumerate(sorted(cache_root.iterdir(), key=lambda path: path.stat().st_mtime)):
+            os.utime(path, (1000 + age, 1000 + age))
+        get_thumbnail('a', 320, 'png', lambda: pytest.fail('a should be cached'))
+        get_thumbnail('c', 320, 'png', lambda: original)
+        assert len(list(cache_root.iterdir())) == 2
+        get_thumbnail('a', 320, 'png', lambda: pytest.fail('a should not be evicted'))
+        reads = []
+        get_thumbnail('b', 320, 'png', lambda: reads.append(1) or original)
+        assert reads == [1]
+
+    def test_legacy_picture(self, client, roots):
+        """Test that the legacy picture file of a semla is resized from LEGACY_PICTURE_ROOT"""
+        (roots / 'legacy').mkdir()
+        (roots / 'legacy' / 'sundbergs.jpg').write_bytes(self._png(1000, 500))
+        semla = Semla.objects.create(
+            bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic', picture='sundbergs.jpg',
+        )
+        response = client.get(f'/api/semlor/{semla.id}/picture?width=640&format=png')
+        assert response.status_code == 200
+        assert response['Cache-Control'] == 'public, max-age=86400'
+        assert self._size(response.content) == ('PNG', (640, 320))
+        semla.picture = ''
+        semla.save()
+        assert client.get(f'/api/semlor/{semla.id}/picture').status_code == 404
+
+    def test_invalid_parameters(self, client, roots):
+        """Test that unknown widths, formats and images are rejected"""
+        import uuid
+        image = self._image(roots)
+        assert client.get(f'/api/images/{image.id}?width=321').status_code == 400
+        assert client.get(f'/api/images/{image.id}?width=big').status_code == 400
+        assert client.get(f'/api/images/{image.id}?format=gif').status_code == 400
+        assert client.get(f'/api/images/{uuid.uuid4()}').status_code == 404
+
+
+@pytest.mark.django_db
+class TestReconcileStorage:
+    """Test suite for deleting stored images no SemlaImage points at"""
+
+    @pytest.fixture
+    def images(self, settings, tmp_path):
+        import os
+        import time
+        import uuid
+        settings.MEDIA_ROOT = tmp_path / 'media'
+        folder = tmp_path / 'media' / 'semlor'
+        folder.mkdir(parents=True)
+        semla = Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        old = time.time() - 2 * 24 * 60 * 60
+        names = {}
+        for kind in ('kept', 'orphan', 'recent'):
+            image_id = uuid.uuid4()
+            path = folder / f'{image_id}.jpg'
+            path.write_bytes(b'jpeg')
+            if kind != 'recent':
+                os.utime(path, (old, old))
+            if kind == 'kept':
+                SemlaImage.objects.create(id=image_id, semla=semla, image_url=f'/media/semlor/{image_id}.jpg')
+            names[kind] = path
+        names['unknown'] = folder / 'README.txt'
+        names['unknown'].write_text('not an image')
+        os.utime(names['unknown'], (old, old))
+        return names
+
+    def test_deletes_old_orphans(self, images):
+        """Test that only orphans older than the grace period are deleted"""
+        import io
+        from django.core.management import call_command
+        out = io.StringIO()
+        call_command('reconcile_storage', '--page-size', '2', stdout=out)
+        assert images['kept'].exists()
+        assert not images['orphan'].exists()
+        assert images['recent'].exists()
+        assert images['unknown'].exists()
+        assert out.getvalue().count('Scanned') == 2
+        assert 'Deleted 1 of 4 objects, kept 1 recent orphans and skipped 1 unknown names' in out.getvalue()
+
+    def test_dry_run(self, images):
+        """Test that a dry run reports the orphans without deleting them"""
+        import io
+        from django.core.management import call_command
+        out = io.StringIO()
+        call_command('reconcile_storage', '--dry-run', stdout=out)
+        assert images['orphan'].exists()
+        assert 'Would delete 1 of 4 objects' in out.getvalue()
+
+    def test_grace_shorter_than_confirm_window(self, images):
+        """Test that a grace period that could delete unconfirmed uploads is refused"""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        with pytest.raises(CommandError):
+            call_command('reconcile_storage', '--grace', '60')
+        assert images['orphan'].exists()
+
+    def test_s3_batched_deletes(self):
+        """Test that S3 listings are paged and orphans deleted in batches of at most 1000 keys"""
+        import datetime
+        import uuid
+        from types import SimpleNamespace
+        from semelVoter.reconcile import reconcile_images
+        semla = Semla.objects.create(bakery='Sundbergs', city='Stockholm', price='55.00', kind='Classic')
+        kept = SemlaImage.objects.create(semla=semla, image_url='https://bucket/semlor/kept.jpg')
+        old = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        keys = [f'media/semlor/{uuid.uuid4()}.jpg' for _ in range(1500)] + [f'media/semlor/{kept.id}.jpg']
+        listed = []
+        deleted = []
+
+        def paginate(Bucket, Prefix, PaginationConfig):
+            listed.append(Prefix)
+            size = PaginationConfig['PageSize']
+            for start in range(0, len(keys), size):
+                yield {'Contents': [{'Key': key, 'LastModified': old} for key in keys[start:start + size]]}
+
+        def delete_objects(Bucket, Delete):
+            assert len(Delete['Objects']) <= 1000
+            deleted.append([item['Key'] for item in Delete['Objects']])
+            return {}
+
+        client = SimpleNamespace(
+            get_paginator=lambda name: SimpleNamespace(paginate=paginate), delete_objects=delete_objects,
+        )
+        storage = SimpleNamespace(
+            bucket_name='semlor', connection=SimpleNamespace(meta=SimpleNamespace(client=client)),
+            _normalize_name=lambda name: 'media/' + name,
+        )
+        counts = reconcile_images(datetime.timedelta(days=1), storage=storage)
+        assert listed == ['media/semlor/']
+        assert [len(batch) for batch in deleted] == [1000, 500]
+        assert counts == {'scanned': 1501, 'orphaned': 1500, 'recent': 0, 'skipped': 0, 'deleted': 1500}
+        assert f'media/semlor/{kept.id}.jpg' not in sum(deleted, [])
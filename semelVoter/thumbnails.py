@@ -0,0 +1,143 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import weakref
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from .metrics import record_cache_lookup
+from .timing import timed
+from .utils import IMAGE_PREFIX
+
+# Output formats: Pillow format name, content type and extension
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'png': ('PNG', 'image/png', 'png'),
+}
+QUALITY = 80
+
+# One lock per cache entry, so concurrent requests for the same thumbnail resize it once.
+# Other worker processes may resize it once more; the atomic rename keeps that harmless.
+_locks = weakref.WeakValueDictionary()
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key):
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.Lock()
+        return lock
+
+
+def image_source(image):
+    """Storage name of a SemlaImage, the last part of its URL under IMAGE_PREFIX."""
+    return IMAGE_PREFIX + image.image_url.rsplit('/', 1)[-1]
+
+
+def legacy_picture_path(picture):
+    """Path of a legacy Semla.picture file name in LEGACY_PICTURE_ROOT, or None if it has none."""
+    name = os.path.basename(picture or '')
+    if not name:
+        return None
+    return os.path.join(settings.LEGACY_PICTURE_ROOT, name)
+
+
+def resize(data: bytes, width: int, output_format: str) -> bytes:
+    """Scale an image down to width, keeping its aspect ratio, and encode it."""
+    pillow_format = FORMATS[output_format][0]
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.width > width:
+            image.thumbnail((width, image.height), Image.LANCZOS)
+        if pillow_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, pillow_format, quality=QUALITY, optimize=True)
+        return output.getvalue()
+
+
+def _evict(root, budget):
+    """Delete the least recently used thumbnails until the cache fits in budget bytes."""
+    entries = []
+    total = 0
+    for entry in os.scandir(root):
+        if entry.name.startswith('.tmp-') or not entry.is_file():
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= budget:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _store(path, body):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(body)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def get_thumbnail(source, width, output_format, read_source):
+    """
+    Get a resized image from the disk cache, rendering it on a miss.
+
+    Cache hits refresh the file's mtime, which orders the least recently used
+    eviction that keeps THUMBNAIL_CACHE_ROOT under THUMBNAIL_CACHE_BYTES.
+
+    Args:
+        source: Unique name of the original, part of the cache key
+        width: Maximum width in pixels
+        output_format: One of FORMATS
+        read_source: Callable returning the original image bytes, called on a miss
+
+    Returns:
+        (body, content type) tuple
+    """
+    _, content_type, extension = FORMATS[output_format]
+    root = str(settings.THUMBNAIL_CACHE_ROOT)
+    key = hashlib.sha256(f'{source}:{width}:{output_format}'.encode()).hexdigest()
+    path = os.path.join(root, f'{key}.{extension}')
+
+    with _lock_for(key):
+        try:
+            with open(path, 'rb') as cached:
+                body = cached.read()
+            os.utime(path)
+            record_cache_lookup('thumbnails', hit=True)
+            return body, content_type
+        except FileNotFoundError:
+            pass
+        record_cache_lookup('thumbnails', hit=False)
+        with timed('storage'):
+            original = read_source()
+        with timed('render'):
+            body = resize(original, width, output_format)
+        os.makedirs(root, exist_ok=True)
+        _store(path, body)
+    _evict(root, settings.THUMBNAIL_CACHE_BYTES)
+    return body, content_type
+
+
+def read_storage(name):
+    with default_storage.open(name, 'rb') as original:
+        return original.read()
+
+
+def read_file(path):
+    with open(path, 'rb') as original:
+        return original.read()
@@ -0,0 +1,122 @@
+import functools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer
+
+# Categories reported in the Server-Timing header and the request log line
+CATEGORIES = ('db', 'storage', 'render')
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Time spent per category during one request.
+
+    Categories are exclusive: time spent in a nested category, e.g. queries made while
+    serializing, is only counted for the innermost one.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.totals = defaultdict(float)
+        self.queries = 0
+        self._stack = []
+
+    @contextmanager
+    def measure(self, category):
+        now = time.perf_counter()
+        if self._stack:
+            outer, started = self._stack[-1]
+            self.totals[outer] += now - started
+        self._stack.append([category, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, started = self._stack.pop()
+            self.totals[category] += now - started
+            if self._stack:
+                self._stack[-1][1] = now
+
+    def milliseconds(self, category):
+        return round(self.totals[category] * 1000, 2)
+
+    def total_milliseconds(self):
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+
+@contextmanager
+def request_scope():
+    """Collect timings for the code inside the block, returning the RequestTimings."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(category):
+    """Count the time spent in the block for category, if a request is being timed."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.measure(category):
+        yield
+
+
+def timed_function(category):
+    """Decorator version of timed()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def query_timer(execute, sql, params, many, context):
+    """
+    Database execute_wrapper counting queries and their time for the current request.
+    Installed on every connection, it only looks up a context variable outside timed requests.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    timings.queries += 1
+    with timings.measure('db'):
+        return execute(sql, params, many, context)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver adding query_timer to new database connections."""
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that counts rendering as render time."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class TimedDataMixin:
+    """Serializer mixin counting the building of .data as render time."""
+
+    @property
+    def data(self):
+        with timed('render'):
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, ListSerializer):
+    """list_serializer_class for serializers using TimedDataMixin, so many=True is timed too."""
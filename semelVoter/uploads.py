@@ -0,0 +1,71 @@
+import uuid
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from .utils import image_key
+
+# Two-step image uploads: the client asks for an upload target, sends the file straight
+# to storage and then confirms it, so no worker streams image bytes.
+# With S3 the target is a presigned POST. Other storages get the same kind of target
+# pointing at DirectUploadView, which emulates the presigned POST on top of the storage.
+
+UPLOAD_SALT = 'semelVoter.uploads'
+
+
+def is_s3(storage):
+    return hasattr(storage, 'bucket_name') and hasattr(storage, 'connection')
+
+
+def _s3_target(key, content_type, size, expires):
+    """Presigned POST limited to this key, content type and at most size bytes."""
+    return default_storage.connection.meta.client.generate_presigned_post(
+        Bucket=default_storage.bucket_name,
+        Key=default_storage._normalize_name(key),
+        Fields={'Content-Type': content_type, 'Cache-Control': settings.IMAGE_CACHE_CONTROL},
+        Conditions=[
+            {'Content-Type': content_type},
+            {'Cache-Control': settings.IMAGE_CACHE_CONTROL},
+            ['content-length-range', 1, size],
+        ],
+        ExpiresIn=expires,
+    )
+
+
+def issue_upload(semla_id, content_type, size):
+    """
+    Reserve an image id for a semla and get a target to upload it to.
+
+    Returns:
+        Dict with the image_id, the url and form fields of the upload target, and an
+        upload_id to confirm the upload with, which binds the id to the semla
+    """
+    image_id = uuid.uuid4()
+    key = image_key(image_id, content_type)
+    expires = settings.UPLOAD_URL_EXPIRES
+    upload_id = signing.dumps(
+        {'image': str(image_id), 'semla': semla_id, 'key': key, 'type': content_type, 'size': size},
+        salt=UPLOAD_SALT,
+    )
+    if is_s3(default_storage):
+        target = _s3_target(key, content_type, size, expires)
+    else:
+        target = {
+            'url': reverse('direct_upload'),
+            'fields': {'key': key, 'Content-Type': content_type, 'upload_id': upload_id},
+        }
+    return {
+        'image_id': image_id,
+        'upload_id': upload_id,
+        'url': target['url'],
+        'fields': target['fields'],
+        'expires_in': expires,
+    }
+
+
+def read_upload(upload_id, max_age):
+    """Get the upload reserved by issue_upload, or None if upload_id is invalid or expired."""
+    try:
+        return signing.loads(upload_id, salt=UPLOAD_SALT, max_age=max_age)
+    except (signing.BadSignature, TypeError):
+        return None
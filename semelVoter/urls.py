@@ -1,9 +1,34 @@
+from django.conf import settings
 from django.urls import path
-from .views import SelmaViewList, RateSemlaView, SemlaCommentView, CreateSemlaView
+from .views import (
+    SelmaViewList, RateSemlaView, SemlaCommentView, CreateSemlaView, BulkCreateSemlaView,
+    SemlaSearchView, SemlaNearbyView, SemlaDetailView, SemlaStatsView, SemlaSnapshotView,
+    AsyncSelmaViewList, AsyncSemlaCommentView, MetricsView, SlowQueryView,
+    PresignImageView, ConfirmImageView, DirectUploadView, ImageProxyView, LegacyPictureView,
+)
+
+# ASGI deployments serve the read endpoints with async views, see backend/asgi.py
+if settings.ASYNC_VIEWS:
+    list_view, comment_view = AsyncSelmaViewList.as_view(), AsyncSemlaCommentView.as_view()
+else:
+    list_view, comment_view = SelmaViewList.as_view(), SemlaCommentView.as_view()
 
 urlpatterns = [
-    path('semlor', SelmaViewList.as_view(), name='get_semla_list'),
+    path('semlor', list_view, name='get_semla_list'),
+    path('semlor/search', SemlaSearchView.as_view(), name='search_semla'),
+    path('semlor/snapshot', SemlaSnapshotView.as_view(), name='semla_snapshot'),
+    path('semlor/nearby', SemlaNearbyView.as_view(), name='nearby_semla'),
     path('semlor/create', CreateSemlaView.as_view(), name='create_semla'),
+    path('semlor/bulk', BulkCreateSemlaView.as_view(), name='bulk_create_semla'),
+    path('semlor/<int:pk>', SemlaDetailView.as_view(), name='semla_detail'),
+    path('semlor/<int:pk>/stats', SemlaStatsView.as_view(), name='semla_stats'),
+    path('semlor/<int:pk>/images/presign', PresignImageView.as_view(), name='presign_image'),
+    path('semlor/<int:pk>/images', ConfirmImageView.as_view(), name='confirm_image'),
+    path('uploads', DirectUploadView.as_view(), name='direct_upload'),
+    path('images/<uuid:image_id>', ImageProxyView.as_view(), name='image_proxy'),
+    path('semlor/<int:pk>/picture', LegacyPictureView.as_view(), name='legacy_picture'),
     path('rate/<int:pk>', RateSemlaView.as_view(), name='rate_semla'),
-    path('comments/<int:pk>', SemlaCommentView.as_view(), name='comment_list'),
+    path('comments/<int:pk>', comment_view, name='comment_list'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('slow-queries', SlowQueryView.as_view(), name='slow_queries'),
 ]
\ No newline at end of file
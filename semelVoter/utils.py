@@ -1,10 +1,13 @@
 import csv
+import time
 import os
 import uuid
 import logging
 from django.conf import settings
 from django.core.files.storage import default_storage
 from semelVoter.models import Semla
+from semelVoter.metrics import UPLOAD_DURATION, UPLOAD_FAILURES
+from semelVoter.timing import timed
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +19,15 @@ CONTENT_TYPE_TO_EXT = {
 }
 
 
+# Storage folder of uploaded images
+IMAGE_PREFIX = 'semlor/'
+
+
+def image_key(image_id, content_type) -> str:
+    """Storage name of an image, the SemlaImage id with the extension of its content type."""
+    return f"{IMAGE_PREFIX}{image_id}.{CONTENT_TYPE_TO_EXT.get(content_type, 'jpg')}"
+
+
 def upload_image_to_s3(file) -> tuple[uuid.UUID, str] | None:
     """
     Upload image to S3 with UUID filename.
@@ -26,17 +38,19 @@ def upload_image_to_s3(file) -> tuple[uuid.UUID, str] | None:
     Returns:
         (uuid, url) tuple on success, None on failure
     """
+    started = time.perf_counter()
     try:
         image_uuid = uuid.uuid4()
-        content_type = getattr(file, 'content_type', 'image/jpeg')
-        extension = CONTENT_TYPE_TO_EXT.get(content_type, 'jpg')
-        s3_key = f"semlor/{image_uuid}.{extension}"
+        s3_key = image_key(image_uuid, getattr(file, 'content_type', 'image/jpeg'))
         
-        saved_path = default_storage.save(s3_key, file)
-        url = default_storage.url(saved_path)
+        with timed('storage'):
+            saved_path = default_storage.save(s3_key, file)
+            url = default_storage.url(saved_path)
         
+        UPLOAD_DURATION.observe(time.perf_counter() - started)
         return (image_uuid, url)
     except Exception as e:
+        UPLOAD_FAILURES.inc()
         logger.warning(f"Failed to upload image to S3: {e}")
         return None
 
@@ -59,15 +73,14 @@ def import_semlor_from_csv():
             kind = row['Kind']
 
             print(f"Processing row: {row}")
-            selma, created = Semla.objects.get_or_create(
+            selma, created = Semla.create_or_get(
                 bakery=bakery,
                 city=city,
                 kind=kind,
-                defaults={
-                    'picture': picture,
-                    'vegan': vegan,
-                    'price': price,
-                })       
+                picture=picture,
+                vegan=vegan,
+                price=price,
+            )
             if created:
                 print(f"Created new Semla: {selma}")
             else:
@@ -1,11 +1,37 @@
+import datetime
 import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
-from django.db import transaction
-from .models import Semla, Ratings, RatingTracker, SemlaCreationTracker, SemlaImage
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from .models import (
+    make_natural_key, Semla, Ratings, RatingTracker, SemlaCreationTracker, ImageUploadTracker, SemlaImage,
+    SemlaDailyRating,
+)
 from rest_framework.response import Response
-from .serializers import SemlaSerializer, CommentSerializer, CreateSemlaSerializer
+from .serializers import (
+    SemlaSerializer, CommentSerializer, CreateSemlaSerializer, semla_list_payload, comment_list_payload,
+    asemla_list_payload, acomment_list_payload,
+)
 from ipware import get_client_ip
-from .utils import upload_image_to_s3
+from .utils import CONTENT_TYPE_TO_EXT, upload_image_to_s3
+from .uploads import issue_upload, read_upload
+from .thumbnails import FORMATS, get_thumbnail, image_source, legacy_picture_path, read_file, read_storage
+from .search import search_semlor, index_new_semlor
+from .parsers import NDJSONParser
+from .snapshot import (
+    acatalogue_version, catalogue_version, read_current_snapshot, read_manifest, refresh_stale_snapshot,
+    schedule_snapshot, write_snapshot,
+)
+from .compression import acached_json_response, cached_json_response
+from .timing import TimedJSONRenderer, timed
+from .metrics import RATE_LIMITED, record_cache_lookup, render_metrics, scrape_allowed
+from .slow_queries import reset_slow_query_stats, slow_query_stats
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +40,7 @@ logger = logging.getLogger(__name__)
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
 class SelmaViewList(APIView):
     def get(self, request):
@@ -22,13 +49,237 @@ class SelmaViewList(APIView):
         """
         try:
             semlor = Semla.objects.all()
-            serializer = SemlaSerializer(semlor, many=True)
-            return Response(serializer.data)
+            if request.accepted_renderer.format != 'json':
+                return Response(semla_list_payload(semlor))
+            # The catalogue version changes as soon as a change commits and is shared by all
+            # workers; the snapshot written in the background is only used once it caught up
+            version = catalogue_version()
+            return cached_json_response(
+                request, f"semla-list:{version}",
+                lambda: read_current_snapshot(version) or TimedJSONRenderer().render(semla_list_payload(semlor)),
+            )
         except Semla.DoesNotExist:
             return Response(
                 {"error": "No Semlor where found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+
+class SemlaSnapshotView(APIView):
+    def get(self, request):
+        """
+        Get the version and URL of the pre-rendered catalogue snapshot.
+        Clients download the snapshot from the CDN-cacheable static URL instead of /api/semlor.
+        """
+        if not settings.SNAPSHOT_ENABLED:
+            return Response({"error": "Snapshots are disabled"}, status=status.HTTP_404_NOT_FOUND)
+        manifest = read_manifest()
+        if manifest is None:
+            manifest = write_snapshot()
+        else:
+            refresh_stale_snapshot(manifest)
+        return Response(manifest, headers={'Cache-Control': 'no-cache'})
+
+
+class MetricsView(View):
+    def get(self, request):
+        """
+        Prometheus scrape endpoint, aggregated over all workers in multiprocess mode.
+        Only answers scrapers allowed by METRICS_TOKEN or METRICS_ALLOWED_IPS.
+        """
+        if not scrape_allowed(request):
+            return JsonResponse({"error": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        body, content_type = render_metrics()
+        return HttpResponse(body, content_type=content_type)
+
+
+class SlowQueryView(APIView):
+    """
+    Statements slower than SLOW_QUERY_THRESHOLD_MS, grouped by fingerprint.
+    Staff only. The numbers are those of the worker process answering the request.
+    """
+    permission_classes = [IsAdminUser]
+    DEFAULT_LIMIT = 50
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+            'queries': slow_query_stats(limit),
+        })
+
+    def delete(self, request):
+        reset_slow_query_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SemlaDetailView(APIView):
+    DEFAULT_COMMENTS = 5
+    MAX_COMMENTS = 50
+
+    def get(self, request, pk):
+        """
+        Get a single Semla with images, rating stats and the newest comments.
+        Responses are cached per semla version and carry a matching ETag.
+        """
+        try:
+            comment_limit = int(request.query_params.get('comments', self.DEFAULT_COMMENTS))
+        except ValueError:
+            return Response(
+                {"error": "Invalid value for comments: must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        comment_limit = max(0, min(comment_limit, self.MAX_COMMENTS))
+
+        version = Semla.objects.filter(pk=pk).values_list('version', flat=True).first()
+        if version is None:
+            return Response(
+                {"error": "Semla not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        etag = f'"semla-{pk}-v{version}-c{comment_limit}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache_key = f"semla-detail:{pk}:{version}:{comment_limit}"
+        data = cache.get(cache_key)
+        record_cache_lookup(cache_key, hit=data is not None)
+        if data is None:
+            recent_comments = Ratings.get_semel_rating(pk).order_by('-date', '-id')[:comment_limit]
+            semla = Semla.objects.prefetch_related(
+                'images',
+                Prefetch('ratings', queryset=recent_comments, to_attr='recent_comments'),
+            ).get(pk=pk)
+            data = SemlaSerializer(semla).data
+            data.update(SemlaDailyRating.get_stats(pk))
+            data['recent_comments'] = CommentSerializer(semla.recent_comments, many=True).data
+            cache.set(cache_key, data)
+        return Response(data, headers={'ETag': etag})
+
+
+class SemlaStatsView(APIView):
+    INTERVALS = ('day', 'week')
+
+    def get(self, request, pk):
+        """
+        Get the rating time series and 1-5 histogram for a Semla.
+        Served from the daily rollups, so cost does not grow with the number of ratings.
+        """
+        interval = request.query_params.get('interval', 'day')
+        if interval not in self.INTERVALS:
+            return Response(
+                {"error": f"Invalid interval: must be one of {', '.join(self.INTERVALS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not Semla.objects.filter(pk=pk).exists():
+            return Response(
+                {"error": "Semla not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        buckets = {}
+        for rollup in SemlaDailyRating.objects.filter(semla_id=pk, count__gt=0):
+            start = rollup.date
+            if interval == 'week':
+                start -= datetime.timedelta(days=start.weekday())
+            bucket = buckets.setdefault(start, SemlaDailyRating(date=start))
+            for field in SemlaDailyRating.SUMMED_FIELDS:
+                setattr(bucket, field, getattr(bucket, field) + getattr(rollup, field))
+
+        series = []
+        for start, bucket in sorted(buckets.items()):
+            series.append({
+                'date': start.isoformat(),
+                'count': bucket.count,
+                'average': round(bucket.average(), 2),
+                'category_averages': {
+                    field: round(getattr(bucket, f'sum_{field}') / bucket.category_count, 2)
+                    if bucket.category_count else None
+                    for field in Ratings.CATEGORY_FIELDS
+                },
+            })
+
+        stats = SemlaDailyRating.get_stats(pk)
+        return Response({
+            'interval': interval,
+            'series': series,
+            'rating_count': stats['rating_count'],
+            'histogram': stats['histogram'],
+        })
+
+
+class SemlaSearchView(APIView):
+    MAX_LIMIT = 50
+
+    def get(self, request):
+        """
+        Search Semlor by bakery, city and kind.
+        Tolerates typos and Swedish diacritics, best match first.
+        """
+        query = request.query_params.get('q', '').strip()
+        if len(query) < 2:
+            return Response(
+                {"error": "Query parameter q must be at least 2 characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.MAX_LIMIT)
+        except ValueError:
+            return Response(
+                {"error": "Invalid value for limit: must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        results = []
+        for semla, score in search_semlor(query, limit=max(limit, 1)):
+            data = SemlaSerializer(semla).data
+            data['score'] = score
+            results.append(data)
+        return Response(results)
+
+
+class SemlaNearbyView(APIView):
+    DEFAULT_RADIUS_KM = 5
+    MAX_RADIUS_KM = 50
+
+    def get(self, request):
+        """
+        Get Semlor near a coordinate, closest first.
+        Query parameters: lat, lon and optional radius in kilometers.
+        """
+        try:
+            latitude = float(request.query_params['lat'])
+            longitude = float(request.query_params['lon'])
+            radius = float(request.query_params.get('radius', self.DEFAULT_RADIUS_KM))
+        except KeyError as e:
+            return Response(
+                {"error": f"Missing required parameter: {e.args[0]}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError:
+            return Response(
+                {"error": "lat, lon and radius must be numbers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return Response(
+                {"error": "lat must be between -90 and 90 and lon between -180 and 180"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < radius <= self.MAX_RADIUS_KM:
+            return Response(
+                {"error": f"radius must be between 0 and {self.MAX_RADIUS_KM} km"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        results = []
+        for semla, distance in Semla.nearby(latitude, longitude, radius):
+            data = SemlaSerializer(semla).data
+            data['distance_km'] = round(distance, 3)
+            results.append(data)
+        return Response(results)
+
+
 class RateSemlaView(APIView):
     parser_classes = [JSONParser, FormParser, MultiPartParser]
     
@@ -52,6 +303,7 @@ class RateSemlaView(APIView):
         # Check if this sender has exceeded the daily limit
         daily_count = RatingTracker.get_today_count(ip_address, user_agent)
         if daily_count >= 5:
+            RATE_LIMITED.labels('rating').inc()
             return Response(
                 {"error": "Daily rating limit reached. Please try again tomorrow."},
                 status=status.HTTP_429_TOO_MANY_REQUESTS
@@ -85,22 +337,25 @@ class RateSemlaView(APIView):
         
         # Process the rating
         try:
-            semla = Semla.objects.get(pk=pk)
             comment = request.data.get('comment')
             name = request.data.get('name')
-            semla.update_rating(average_rating)
-            rating = Ratings(
-                semla=semla,
-                rating=round(average_rating),
-                comment=comment if comment and comment != '' else None,
-                name=name if name and name != '' else None,
-                gradde=category_ratings['gradde'],
-                mandelmassa=category_ratings['mandelmassa'],
-                lock=category_ratings['lock'],
-                helhet=category_ratings['helhet'],
-                bulle=category_ratings['bulle'],
-                )
-            rating.save()
+            # The new average is computed from the ratings read in the same write transaction,
+            # so concurrent raters cannot overwrite each other's update
+            with transaction.atomic():
+                semla = Semla.objects.select_for_update().get(pk=pk)
+                semla.update_rating(average_rating)
+                rating = Ratings(
+                    semla=semla,
+                    rating=round(average_rating),
+                    comment=comment if comment and comment != '' else None,
+                    name=name if name and name != '' else None,
+                    gradde=category_ratings['gradde'],
+                    mandelmassa=category_ratings['mandelmassa'],
+                    lock=category_ratings['lock'],
+                    helhet=category_ratings['helhet'],
+                    bulle=category_ratings['bulle'],
+                    )
+                rating.save()
             
             # Handle optional image upload
             image_file = request.FILES.get('image')
@@ -135,8 +390,14 @@ class SemlaCommentView(APIView):
         """
         try:
             comments = Ratings.get_semel_rating(pk)
-            serializer = CommentSerializer(comments, many=True)
-            return Response(serializer.data)
+            version = Semla.objects.filter(pk=pk).values_list('version', flat=True).first()
+            if version is None or request.accepted_renderer.format != 'json':
+                return Response(comment_list_payload(comments))
+            # Rating changes bump the semla version, which retires the cached entry
+            return cached_json_response(
+                request, f"semla-comments:{pk}:{version}",
+                lambda: TimedJSONRenderer().render(comment_list_payload(comments)),
+            )
         except Semla.DoesNotExist:
             return Response(
                 {"error": f"No comments for Semla {pk} where found"}, 
@@ -165,6 +426,7 @@ class CreateSemlaView(APIView):
         # Check if this sender has exceeded the daily limit
         daily_count = SemlaCreationTracker.get_today_count(ip_address, user_agent)
         if daily_count >= 5:
+            RATE_LIMITED.labels('creation').inc()
             return Response(
                 {"error": "Daily creation limit reached. Please try again tomorrow."},
                 status=status.HTTP_429_TOO_MANY_REQUESTS
@@ -175,6 +437,7 @@ class CreateSemlaView(APIView):
             # Wrap creation and counter increment in a transaction
             # to ensure atomicity and prevent inconsistent state
             with transaction.atomic():
+                # Returns the existing semla if the same bakery, city and kind was already added
                 semla = serializer.save()
                 
                 # Handle multiple image uploads via pictures[]
@@ -195,9 +458,284 @@ class CreateSemlaView(APIView):
                 SemlaCreationTracker.increment_count(ip_address, user_agent)
             return Response(
                 SemlaSerializer(semla).data,
-                status=status.HTTP_201_CREATED
+                status=status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK
             )
         return Response(
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class BulkCreateSemlaView(APIView):
+    """
+    Create many Semlor in one request, e.g. when onboarding a new city.
+    Accepts a JSON array or an NDJSON stream and reports a result per item.
+    """
+    parser_classes = [JSONParser, NDJSONParser]
+    permission_classes = [IsAuthenticated]
+
+    BATCH_SIZE = 500
+    MAX_ITEMS = 1000
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "Expected a non-empty JSON array or NDJSON stream"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.MAX_ITEMS:
+            return Response(
+                {"error": f"Too many items: at most {self.MAX_ITEMS} per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = [None] * len(items)
+        serializer = CreateSemlaSerializer(data=items, many=True)
+        if serializer.is_valid():
+            valid = list(enumerate(serializer.validated_data))
+        else:
+            errors = serializer.errors
+            if isinstance(errors, list):
+                errors = {index: error for index, error in enumerate(errors) if error}
+            for index, error in errors.items():
+                results[index] = {'index': index, 'status': 'invalid', 'errors': error}
+            # Only the items without errors are validated a second time
+            valid_indexes = [index for index in range(len(items)) if index not in errors]
+            valid_serializer = CreateSemlaSerializer(data=[items[i] for i in valid_indexes], many=True)
+            valid_serializer.is_valid(raise_exception=True)
+            valid = list(zip(valid_indexes, valid_serializer.validated_data))
+
+        # Existing semlor for all items in one query on the unique natural key
+        keys = {
+            index: make_natural_key(data['bakery'], data['city'], data['kind'])
+            for index, data in valid
+        }
+        existing = dict(
+            Semla.objects.filter(natural_key__in=set(keys.values())).values_list('natural_key', 'pk')
+        )
+
+        to_create = []
+        pending = {}
+        for index, data in valid:
+            key = keys[index]
+            if key in existing:
+                results[index] = {'index': index, 'status': 'duplicate', 'id': existing[key]}
+            elif key in pending:
+                results[index] = {'index': index, 'status': 'duplicate', 'of': pending[key]}
+            else:
+                semla = Semla(**data)
+                semla.refresh_derived_fields()
+                pending[key] = index
+                to_create.append((index, semla))
+
+        try:
+            with transaction.atomic():
+                created = Semla.objects.bulk_create(
+                    [semla for _, semla in to_create], batch_size=self.BATCH_SIZE
+                )
+                index_new_semlor(created, batch_size=self.BATCH_SIZE)
+                # bulk_create sends no post_save, so the snapshot is refreshed here
+                if created:
+                    schedule_snapshot()
+        except IntegrityError:
+            return Response(
+                {"error": "Some semlor were created concurrently. Please retry the request."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        for index, semla in to_create:
+            results[index] = {'index': index, 'status': 'created', 'id': semla.pk}
+        for result in results:
+            if result.get('of') is not None:
+                result['id'] = results[result.pop('of')]['id']
+
+        summary = {state: 0 for state in ('created', 'duplicate', 'invalid')}
+        for result in results:
+            summary[result['status']] += 1
+        return Response(
+            {**summary, 'results': results},
+            status=status.HTTP_201_CREATED if summary['created'] else status.HTTP_200_OK
+        )
+
+
+class PresignImageView(APIView):
+    def post(self, request, pk):
+        """
+        Get a short-lived target to upload an image of a Semla to.
+        Requires content_type (image/jpeg, image/png or image/webp) and size in bytes.
+        The client sends the file as multipart form with the returned fields plus
+        'file' to url, then confirms it with the upload_id at /semlor/<pk>/images.
+        Limited to UPLOAD_DAILY_LIMIT targets per IP and user agent, which also limits
+        confirmations, as only issued upload_ids can be confirmed.
+        """
+        # ipware validates X-Forwarded-For against trusted proxies
+        client_ip, is_routable = get_client_ip(request)
+        if not client_ip:
+            # Reject requests where IP cannot be determined to prevent rate limit sharing
+            return Response(
+                {"error": "Unable to determine client IP address"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        if ImageUploadTracker.get_today_count(client_ip, user_agent) >= settings.UPLOAD_DAILY_LIMIT:
+            RATE_LIMITED.labels('upload').inc()
+            return Response(
+                {"error": "Daily upload limit reached. Please try again tomorrow."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        if not Semla.objects.filter(pk=pk).exists():
+            return Response({"error": "Semla not found"}, status=status.HTTP_404_NOT_FOUND)
+        content_type = request.data.get('content_type')
+        if content_type not in CONTENT_TYPE_TO_EXT:
+            return Response(
+                {"error": f"content_type must be one of {', '.join(CONTENT_TYPE_TO_EXT)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({"error": "size must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < size <= settings.UPLOAD_MAX_BYTES:
+            return Response(
+                {"error": f"size must be between 1 and {settings.UPLOAD_MAX_BYTES} bytes"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ImageUploadTracker.increment_count(client_ip, user_agent)
+        return Response(issue_upload(pk, content_type, size), status=status.HTTP_201_CREATED)
+
+
+class ConfirmImageView(APIView):
+    def post(self, request, pk):
+        """
+        Record an image uploaded to a target from PresignImageView once it is in storage.
+        Confirming the same upload again returns the existing image.
+        """
+        upload = read_upload(request.data.get('upload_id'), max_age=settings.UPLOAD_CONFIRM_WINDOW)
+        if upload is None or upload['semla'] != pk:
+            return Response({"error": "Invalid or expired upload_id"}, status=status.HTTP_400_BAD_REQUEST)
+        existing = SemlaImage.objects.filter(pk=upload['image']).first()
+        if existing is not None:
+            return Response({"id": existing.id, "image_url": existing.image_url})
+        if not default_storage.exists(upload['key']):
+            return Response({"error": "Image has not been uploaded"}, status=status.HTTP_409_CONFLICT)
+        if default_storage.size(upload['key']) > upload['size']:
+            default_storage.delete(upload['key'])
+            return Response({"error": "Image is larger than announced"}, status=status.HTTP_400_BAD_REQUEST)
+        if not Semla.objects.filter(pk=pk).exists():
+            return Response({"error": "Semla not found"}, status=status.HTTP_404_NOT_FOUND)
+        image, _ = SemlaImage.objects.get_or_create(
+            id=upload['image'],
+            defaults={'semla_id': pk, 'image_url': default_storage.url(upload['key'])},
+        )
+        return Response({"id": image.id, "image_url": image.image_url}, status=status.HTTP_201_CREATED)
+
+
+class DirectUploadView(APIView):
+    """
+    Upload target for storages without presigned URLs, e.g. local development and tests.
+    Accepts the same form as an S3 presigned POST and enforces the same conditions.
+    """
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = read_upload(request.data.get('upload_id'), max_age=settings.UPLOAD_URL_EXPIRES)
+        if upload is None or request.data.get('key') != upload['key']:
+            return Response({"error": "Invalid or expired upload"}, status=status.HTTP_403_FORBIDDEN)
+        file = request.FILES.get('file')
+        if file is None:
+            return Response({"error": "Missing file"}, status=status.HTTP_400_BAD_REQUEST)
+        if request.data.get('Content-Type') != upload['type'] or not 0 < file.size <= upload['size']:
+            return Response({"error": "File does not match the upload"}, status=status.HTTP_403_FORBIDDEN)
+        if not default_storage.exists(upload['key']):
+            with timed('storage'):
+                default_storage.save(upload['key'], file)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def thumbnail_response(request, source, read_source, cache_control):
+    """Serve the thumbnail of source asked for by the width and format query parameters."""
+    try:
+        width = int(request.GET.get('width', settings.THUMBNAIL_WIDTHS[-1]))
+    except ValueError:
+        width = None
+    if width not in settings.THUMBNAIL_WIDTHS:
+        widths = ', '.join(str(width) for width in settings.THUMBNAIL_WIDTHS)
+        return JsonResponse({"error": f"width must be one of {widths}"}, status=status.HTTP_400_BAD_REQUEST)
+    output_format = request.GET.get('format', 'jpeg')
+    if output_format not in FORMATS:
+        return JsonResponse(
+            {"error": f"format must be one of {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        body, content_type = get_thumbnail(source, width, output_format, read_source)
+    except FileNotFoundError:
+        return JsonResponse({"error": "Image not found"}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.warning(f"Failed to resize {source}: {e}")
+        return JsonResponse({"error": "Image could not be resized"}, status=status.HTTP_502_BAD_GATEWAY)
+    return HttpResponse(body, content_type=content_type, headers={'Cache-Control': cache_control})
+
+
+class ImageProxyView(View):
+    def get(self, request, image_id):
+        """
+        Get a SemlaImage scaled down to ?width= in ?format= (jpeg, webp or png).
+        Images never change, so neither do their thumbnails.
+        """
+        image = SemlaImage.objects.filter(pk=image_id).only('image_url').first()
+        if image is None:
+            return JsonResponse({"error": "Image not found"}, status=status.HTTP_404_NOT_FOUND)
+        source = image_source(image)
+        return thumbnail_response(request, source, lambda: read_storage(source), settings.IMAGE_CACHE_CONTROL)
+
+
+class LegacyPictureView(View):
+    def get(self, request, pk):
+        """
+        Get the legacy Semla.picture scaled down to ?width= in ?format= (jpeg, webp or png).
+        """
+        semla = Semla.objects.filter(pk=pk).only('picture').first()
+        path = legacy_picture_path(semla.picture) if semla else None
+        if path is None:
+            return JsonResponse({"error": "Picture not found"}, status=status.HTTP_404_NOT_FOUND)
+        return thumbnail_response(
+            request, f'legacy:{path}', lambda: read_file(path), settings.LEGACY_PICTURE_CACHE_CONTROL,
+        )
+
+
+# Async versions of the read endpoints, used when served through backend/asgi.py.
+# They return the same JSON as the views above without the browsable API.
+
+def json_response(data):
+    return HttpResponse(TimedJSONRenderer().render(data), content_type='application/json')
+
+
+class AsyncSelmaViewList(View):
+    async def get(self, request):
+        """
+        Get all Semlor.
+        """
+        semlor = Semla.objects.all()
+        version = await acatalogue_version()
+
+        async def render():
+            # Reading the snapshot file blocks, so it runs in a worker thread off the event loop
+            body = await sync_to_async(read_current_snapshot, thread_sensitive=False)(version)
+            return body or TimedJSONRenderer().render(await asemla_list_payload(semlor))
+        return await acached_json_response(request, f"semla-list:{version}", render)
+
+
+class AsyncSemlaCommentView(View):
+    async def get(self, request, pk):
+        """
+        Get all comments for a specific Semla.
+        """
+        comments = Ratings.get_semel_rating(pk)
+        version = await Semla.objects.filter(pk=pk).values_list('version', flat=True).afirst()
+        if version is None:
+            return json_response(await acomment_list_payload(comments))
+
+        async def render():
+            return TimedJSONRenderer().render(await acomment_list_payload(comments))
+        return await acached_json_response(request, f"semla-comments:{pk}:{version}", render)